@@ -0,0 +1,109 @@
+"""
+Compare the git backends of the Pull Request agent on synthetic repositories of different sizes.
+Each repository has a main branch and a feature branch; the operations of analyze_file_changes that go through the
+backend (resolving HEAD and the merge-base) are timed with a warm backend. The first page of the commit log, which is
+read by commit_log rather than by the backend, is timed on its own with a cold page cache.
+
+Usage: python -m benchmarks.git_backend [--sizes 100 1000 10000] [--iterations 20]
+"""
+import argparse
+import asyncio
+import statistics
+import subprocess
+import tempfile
+import time
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, commit_log, git_backend
+
+# Number of commits of the feature branch of each synthetic repository
+FEATURE_COMMITS = 20
+
+
+def create_repository(path: str, commits: int):
+    """
+    Create a repository with a linear main branch and a feature branch, using git fast-import
+    :param path: The directory of the repository
+    :param commits: The number of commits of the main branch
+    """
+    subprocess.run(['git', 'init', '-q', '-b', 'main', path], check=True)
+    stream = []
+    for index in range(commits + FEATURE_COMMITS):
+        branch = 'main' if index < commits else 'feature'
+        content = f'{index}\n'.encode()
+        message = f'Commit {index}\n'.encode()
+        stream.append(f'commit refs/heads/{branch}\n'.encode())
+        stream.append(f'committer Bench <bench@example.com> {1700000000 + index} +0000\n'.encode())
+        stream.append(b'data %d\n%s' % (len(message), message))
+        if index == commits:
+            stream.append(b'from refs/heads/main\n')
+        stream.append(f'M 100644 inline file{index % 100}.txt\n'.encode())
+        stream.append(b'data %d\n%s\n' % (len(content), content))
+    subprocess.run(['git', 'fast-import', '--quiet'], input=b''.join(stream), cwd=path, check=True)
+    subprocess.run(['git', 'checkout', '-q', 'feature'], cwd=path, check=True)
+
+
+async def time_backend(backend: git_backend.GitBackend, path: str, iterations: int) -> list[float]:
+    """
+    :param backend: The backend to time
+    :param path: The directory of the repository
+    :param iterations: The number of timed iterations
+    :return: The duration of each iteration, in milliseconds
+    """
+    durations = []
+    # The first iteration warms the backend up and is not timed
+    for iteration in range(iterations + 1):
+        start = time.perf_counter()
+        await backend.resolve(path, 'HEAD')
+        await backend.merge_base(path, 'main', 'HEAD')
+        if iteration:
+            durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+async def time_commit_log(path: str, iterations: int) -> list[float]:
+    """
+    :param path: The directory of the repository
+    :param iterations: The number of timed iterations
+    :return: The duration of reading the first page of the commit log of each iteration, in milliseconds
+    """
+    backend = git_backend.SubprocessBackend()
+    revision_range = f'{await backend.merge_base(path, "main", "HEAD")}..{await backend.resolve(path, "HEAD")}'
+    durations = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for iteration in range(iterations + 1):
+            # Each iteration reads the page from git, with an empty cache
+            disk_cache = analysis_cache.DiskCache(f'{cache_dir}/{iteration}.db')
+            start = time.perf_counter()
+            await commit_log.read_page(path, disk_cache, revision_range)
+            if iteration:
+                durations.append((time.perf_counter() - start) * 1000)
+            disk_cache.close()
+    return durations
+
+
+async def main(sizes: list[int], iterations: int):
+    """
+    :param sizes: The numbers of commits of the main branch of the synthetic repositories
+    :param iterations: The number of timed iterations per backend and repository
+    """
+    print(f'{"commits":>8} {"backend":>10} {"median ms":>10} {"p90 ms":>8}')
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as path:
+            create_repository(path, size)
+            for name, backend_class in git_backend.GIT_BACKENDS.items():
+                backend = backend_class()
+                durations = await time_backend(backend, path, iterations)
+                await backend.close()
+                p90 = statistics.quantiles(durations, n=10)[-1]
+                print(f'{size:>8} {name:>10} {statistics.median(durations):>10.2f} {p90:>8.2f}')
+            durations = await time_commit_log(path, iterations)
+            p90 = statistics.quantiles(durations, n=10)[-1]
+            print(f'{size:>8} {"read_page":>10} {statistics.median(durations):>10.2f} {p90:>8.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--iterations', type=int, default=20)
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.sizes, arguments.iterations))
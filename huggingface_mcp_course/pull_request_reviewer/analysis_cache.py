@@ -0,0 +1,252 @@
+"""
+Content-addressed caches of the analyses computed by the Pull Request agent.
+Entries are keyed by immutable commit SHAs, so a cached analysis never needs to be invalidated.
+Analyses are kept in memory and persisted in the repository's git directory so that they survive server restarts.
+"""
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable, Optional
+import zlib
+
+# Default size budget of the in-memory analysis cache
+ANALYSIS_CACHE_MAX_BYTES = int(os.getenv('PR_AGENT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+
+# Default size budget of the on-disk cache of each repository
+DISK_CACHE_MAX_BYTES = int(os.getenv('PR_AGENT_DISK_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Location of the on-disk cache, relative to the git common directory of the repository
+DISK_CACHE_FILE = 'pr-agent/cache.sqlite'
+
+
+class AnalysisCache:
+    """
+    Least recently used cache of analyses bounded by the size of their JSON serialization
+    """
+
+    def __init__(self, max_bytes: int = ANALYSIS_CACHE_MAX_BYTES):
+        """
+        :param max_bytes: Maximum total size of the cached analyses (default = ANALYSIS_CACHE_MAX_BYTES)
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[dict, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """
+        Retrieve an analysis and mark it as the most recently used
+        :param key: The key of the analysis
+        :return: The cached analysis, or None if it is not cached
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, analysis: dict):
+        """
+        Add an analysis to the cache, evicting the least recently used ones to stay within the size budget
+        :param key: The key of the analysis
+        :param analysis: The analysis to cache (must be JSON serializable)
+        """
+        size = len(json.dumps(analysis).encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        self.pop(key)
+        self._entries[key] = (analysis, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def pop(self, key: Hashable) -> Optional[dict]:
+        """
+        Remove an analysis from the cache
+        :param key: The key of the analysis
+        :return: The removed analysis, or None if it was not cached
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self.size -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        """
+        Remove all the analyses from the cache and reset its statistics
+        """
+        self._entries.clear()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+
+class DiskCache:
+    """
+    Persistent least recently used cache of JSON documents stored in a SQLite database.
+    Documents are compressed and grouped by namespace (e.g. "analysis", "commits").
+    """
+
+    def __init__(self, path: str, max_bytes: int = DISK_CACHE_MAX_BYTES):
+        """
+        :param path: The path to the SQLite database (created if it does not exist)
+        :param max_bytes: Maximum total size of the compressed documents (default = DISK_CACHE_MAX_BYTES)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # The cache is accessed from the worker threads of asyncio.to_thread
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )''')
+        # The index covers the sizes, so that the total size is summed without reading the documents
+        self._connection.execute('DROP INDEX IF EXISTS entries_accessed')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed_size ON entries (accessed, size)')
+        self.size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Retrieve a document and mark it as the most recently used
+        :param namespace: The namespace of the document
+        :param key: The key of the document within its namespace
+        :return: The cached document, or None if it is not cached
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value FROM entries WHERE namespace = ? AND key = ?', (namespace, key)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                'UPDATE entries SET accessed = ? WHERE namespace = ? AND key = ?', (time.time(), namespace, key)
+            )
+        return json.loads(zlib.decompress(row[0]))
+
+    def get_many(self, namespace: str, keys: list[str]) -> dict[str, Any]:
+        """
+        Retrieve several documents of a namespace at once and mark them as the most recently used
+        :param namespace: The namespace of the documents
+        :param keys: The keys of the documents within their namespace
+        :return: The cached documents by key (the keys that are not cached are left out)
+        """
+        documents = {}
+        with self._lock:
+            # Stay below the maximum number of parameters of a SQLite statement
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ', '.join('?' * len(batch))
+                rows = self._connection.execute(
+                    f'SELECT key, value FROM entries WHERE namespace = ? AND key IN ({placeholders})',
+                    (namespace, *batch)
+                ).fetchall()
+                self._connection.execute(
+                    f'UPDATE entries SET accessed = ? WHERE namespace = ? AND key IN ({placeholders})',
+                    (time.time(), namespace, *batch)
+                )
+                documents.update(rows)
+        return {key: json.loads(zlib.decompress(value)) for key, value in documents.items()}
+
+    def put(self, namespace: str, key: str, value: Any) -> bool:
+        """
+        Add a document to the cache, pruning the least recently used ones to stay within the size budget
+        :param namespace: The namespace of the document
+        :param key: The key of the document within its namespace
+        :param value: The document to cache (must be JSON serializable)
+        :return: True if the document was stored, False if it exceeds the size budget on its own
+        """
+        return bool(self.put_many(namespace, {key: value}))
+
+    def put_many(self, namespace: str, documents: dict[str, Any]) -> int:
+        """
+        Add several documents of a namespace to the cache (see put)
+        :param namespace: The namespace of the documents
+        :param documents: The documents to cache by key
+        :return: The number of documents stored (the ones exceeding the size budget on their own are left out)
+        """
+        rows = []
+        for key, value in documents.items():
+            compressed = zlib.compress(json.dumps(value).encode('utf-8'))
+            if len(compressed) <= self.max_bytes:
+                rows.append((namespace, key, compressed, len(compressed), time.time()))
+        if not rows:
+            return 0
+
+        with self._lock:
+            # Other processes share the database, the insertion and the pruning are done in a single transaction
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO entries (namespace, key, value, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+                self._prune()
+                self._connection.execute('COMMIT')
+            except BaseException:
+                self._connection.execute('ROLLBACK')
+                raise
+        return len(rows)
+
+    def _prune(self):
+        """
+        Delete the least recently used documents until the cache fits within its size budget
+        (the size is summed again, the documents stored by other processes counting in the budget)
+        """
+        self.size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if self.size <= self.max_bytes:
+            return
+        rows = self._connection.execute('SELECT namespace, key, size FROM entries ORDER BY accessed').fetchall()
+        evicted = []
+        for namespace, key, size in rows:
+            if self.size <= self.max_bytes:
+                break
+            evicted.append((namespace, key))
+            self.size -= size
+        self._connection.executemany('DELETE FROM entries WHERE namespace = ? AND key = ?', evicted)
+
+    def close(self):
+        """
+        Close the connection to the database
+        """
+        with self._lock:
+            self._connection.close()
+
+
+# On-disk caches already opened, by git directory
+_disk_caches: dict[str, DiskCache] = {}
+_disk_caches_lock = threading.Lock()
+
+
+def get_disk_cache(git_dir: str) -> DiskCache:
+    """
+    Get the on-disk cache stored in the git directory of a repository
+    :param git_dir: The absolute path to the git common directory of the repository
+    :return: The on-disk cache of the repository
+    """
+    with _disk_caches_lock:
+        disk_cache = _disk_caches.get(git_dir)
+        if disk_cache is None:
+            disk_cache = DiskCache(os.path.join(git_dir, DISK_CACHE_FILE))
+            _disk_caches[git_dir] = disk_cache
+        return disk_cache
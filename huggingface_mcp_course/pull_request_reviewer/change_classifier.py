@@ -0,0 +1,106 @@
+"""
+Deterministic classifier of the type of a change set, used to suggest a Pull Request template.
+Each changed file votes for change types from precompiled rule tables on its path (tests, docs, security and
+performance related files) or, for the other source files, from its status and numstat (new files are features,
+small edits are bug fixes, changes deleting more than they add are refactorings). Votes are weighted by the
+logarithm of the changed lines, so that a single large file does not outweigh the rest of the change set, and
+normalized into probabilities over the available types.
+"""
+import math
+import re
+
+from huggingface_mcp_course.pull_request_reviewer import diff_packer
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+# Change types, named after the templates of Pull Requests
+BUG = 'bug'
+DOCS = 'docs'
+FEATURE = 'feature'
+PERFORMANCE = 'performance'
+REFACTOR = 'refactor'
+SECURITY = 'security'
+TEST = 'test'
+CHANGE_TYPES = (BUG, DOCS, FEATURE, PERFORMANCE, REFACTOR, SECURITY, TEST)
+
+# Paths of the test files
+TEST_PATTERN = re.compile(r'(^|/)(tests?|__tests__|spec|specs|testing)/|(^|/)test_[^/]+\.py$|_test\.(py|go)$|'
+                          r'\.(test|spec)\.[jt]sx?$|(^|/)conftest\.py$')
+
+# Paths of the documentation files (plain .txt files are also requirements, build files or test data)
+DOCS_PATTERN = re.compile(r'\.(md|rst|adoc)$|(^|/)(docs?|documentation)/|'
+                          r'(^|/)(README|CHANGELOG|CONTRIBUTING|LICENSE)[^/]*$', re.IGNORECASE)
+
+# Dependency manifests
+DEPENDENCY_PATTERN = re.compile(
+    r'(^|/)(requirements[^/]*\.txt|constraints[^/]*\.txt|pyproject\.toml|setup\.py|setup\.cfg|Pipfile|package\.json|'
+    r'go\.mod|Cargo\.toml|Gemfile|pom\.xml|build\.gradle(\.kts)?)$'
+)
+
+# Rules on the path of a file, the first matching rule gives its votes
+# (keywords only match whole words of the path, so that e.g. "author.py" or "whirlpool.py" match no rule)
+PATH_RULES = [
+    (TEST_PATTERN, {TEST: 1.0}),
+    # Dependency updates mostly pick up bug fixes, security fixes or new features
+    (DEPENDENCY_PATTERN, {BUG: 0.4, SECURITY: 0.3, FEATURE: 0.3}),
+    (DOCS_PATTERN, {DOCS: 1.0}),
+    (re.compile(r'(^|[/_.-])(o?auth[nz]?|authentication|authorization|security|crypto|secrets?|permissions?|'
+                r'sanitiz[a-z]*|csrf|xss|passwords?|credentials?)([/_.-]|$)', re.IGNORECASE),
+     {SECURITY: 0.7, BUG: 0.3}),
+    (re.compile(r'(^|[/_.-])(bench|benchmarks?|perf|performance|profiling|cach[a-z]*|pool(s|ing)?|concurren[a-z]*|'
+                r'parallel[a-z]*)([/_.-]|$)', re.IGNORECASE),
+     {PERFORMANCE: 0.6, FEATURE: 0.2, REFACTOR: 0.2})
+]
+
+# Share of deleted lines above which a change is considered a refactoring
+REFACTOR_DELETION_RATIO = 0.6
+
+# Maximum number of changed lines of a modification considered a bug fix
+BUG_FIX_MAX_LINES = 20
+
+# Additive smoothing of the probabilities, so that no available type is ruled out entirely
+SMOOTHING = 0.05
+
+
+def vote(file: FileChange) -> dict[str, float]:
+    """
+    Get the votes of a changed file for the change types
+    :param file: The changed file
+    :return: The weight of each change type voted for by the file (summing to 1), or no votes for generated files,
+    lockfiles and vendored files
+    """
+    if diff_packer.categorize(file.path) != diff_packer.SOURCE:
+        return {}
+    for pattern, votes in PATH_RULES:
+        if pattern.search(file.path):
+            return votes
+
+    # Other source files vote from their status and numstat
+    if file.status == 'A':
+        return {FEATURE: 1.0}
+    if file.status == 'D' or file.status[0] == 'R':
+        return {REFACTOR: 1.0}
+    if file.changed_lines and file.deletions / file.changed_lines > REFACTOR_DELETION_RATIO:
+        return {REFACTOR: 0.8, BUG: 0.2}
+    if file.changed_lines <= BUG_FIX_MAX_LINES:
+        return {BUG: 0.6, FEATURE: 0.2, REFACTOR: 0.2}
+    return {FEATURE: 0.6, REFACTOR: 0.3, BUG: 0.1}
+
+
+def classify(files: list[FileChange], change_types: tuple[str, ...] = CHANGE_TYPES) -> list[tuple[str, float]]:
+    """
+    Classify a change set
+    :param files: The changed files with their numstat
+    :param change_types: The change types to rank, e.g. the types of the available templates (default = CHANGE_TYPES)
+    :return: The change types with their probability, the most probable first
+    """
+    scores = dict.fromkeys(change_types, SMOOTHING)
+    for file in files:
+        weight = math.log2(file.changed_lines + 2)
+        for change_type, share in vote(file).items():
+            if change_type in scores:
+                scores[change_type] += weight * share
+    total = sum(scores.values())
+    if not total:
+        return []
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return [(change_type, round(score / total, 3)) for change_type, score in ranked]
@@ -0,0 +1,79 @@
+"""
+Structured, paginated commit log of the branches analyzed by the Pull Request agent.
+Only the commits of the requested page are read from git (with --skip and --max-count), so the memory and the size of
+the response stay bounded whatever the age of the branch. The changes of each commit come from the index of
+the blob pairs of the commits (see patch_index).
+Pages of an immutable revision range never change, so they are cached on disk.
+"""
+import asyncio
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, git_runner, patch_index
+
+# Default number of commits per page
+COMMIT_PAGE_SIZE = 50
+
+# Maximum number of commits per page
+MAX_COMMIT_PAGE_SIZE = 500
+
+# Namespace of the pages in the on-disk cache
+COMMIT_PAGES_NAMESPACE = 'commit-pages'
+
+# SHA, author name, author date (ISO 8601) and subject of each commit, all NUL-terminated with -z
+LOG_FORMAT = '%H%x00%an%x00%aI%x00%s'
+LOG_FIELDS = 4
+
+
+async def read_log(cwd: str, revision_range: str, offset: int, limit: int) -> list[tuple[str, str, str, str]]:
+    """
+    Read a slice of the commit log of a revision range
+    :param cwd: The working directory of the git repository
+    :param revision_range: The revision range of the log ("<merge-base SHA>..<HEAD SHA>")
+    :param offset: The number of commits skipped, the newest first
+    :param limit: The maximum number of commits read
+    :return: The SHA, author, date and subject of the commits
+    """
+    result = await git_runner.run_git(['log', '-z', f'--format={LOG_FORMAT}', f'--skip={offset}',
+                                       f'--max-count={limit}', revision_range], cwd, check=True)
+    fields = result.stdout.split('\0')
+    return [tuple(fields[start:start + LOG_FIELDS]) for start in range(0, len(fields) - 1, LOG_FIELDS)]
+
+
+async def read_page(cwd: str, disk_cache: analysis_cache.DiskCache, revision_range: str, offset: int = 0,
+                    limit: int = COMMIT_PAGE_SIZE) -> dict:
+    """
+    Read a page of the commit log of a revision range, with the changes of each commit
+    :param cwd: The working directory of the git repository
+    :param disk_cache: The on-disk cache of the repository, in which the pages and the changes of the commits are cached
+    :param revision_range: The revision range of the log ("<merge-base SHA>..<HEAD SHA>")
+    :param offset: The number of commits skipped, the newest first (default = 0)
+    :param limit: The maximum number of commits of the page (default = COMMIT_PAGE_SIZE)
+    :return: The "commits" of the page as columns (sha, author, date, subject, and the number of changed files,
+    additions, deletions and categories of each commit) and the offset of the next page ("next_offset", None on the
+    last page)
+    """
+    limit = max(1, min(limit, MAX_COMMIT_PAGE_SIZE))
+    key = f'{revision_range}:{offset}:{limit}'
+    page = await asyncio.to_thread(disk_cache.get, COMMIT_PAGES_NAMESPACE, key)
+    if page is not None:
+        return page
+
+    # One more commit is read to know whether there is a next page
+    commits = await read_log(cwd, revision_range, offset, limit + 1)
+    has_next = len(commits) > limit
+    commits = commits[:limit]
+    changes, _ = await patch_index.analyze_commits(cwd, disk_cache, [sha for sha, _, _, _ in commits])
+    page = {
+        "commits": {
+            "sha": [sha for sha, _, _, _ in commits],
+            "author": [author for _, author, _, _ in commits],
+            "date": [date for _, _, date, _ in commits],
+            "subject": [subject for _, _, _, subject in commits],
+            "files": [len(changes[sha]["paths"]) for sha, _, _, _ in commits],
+            "additions": [changes[sha]["additions"] for sha, _, _, _ in commits],
+            "deletions": [changes[sha]["deletions"] for sha, _, _, _ in commits],
+            "categories": [changes[sha]["categories"] for sha, _, _, _ in commits]
+        },
+        "next_offset": offset + limit if has_next else None
+    }
+    await asyncio.to_thread(disk_cache.put, COMMIT_PAGES_NAMESPACE, key, page)
+    return page
@@ -0,0 +1,450 @@
+"""
+Single-pass diff engine for the Pull Request agent.
+A single `git diff --raw --numstat --patch -z` invocation provides the list of changed files, their statistics and
+the patch, which avoids having git compute the same tree diff several times.
+The output is consumed as a stream so that git is stopped as soon as the patches worth packing have been read.
+"""
+import asyncio
+from typing import Awaitable, BinaryIO, Callable, Optional
+
+from huggingface_mcp_course.pull_request_reviewer import diff_packer, git_runner
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange, Hunk
+from huggingface_mcp_course.pull_request_reviewer.diff_store import DiffStore
+
+# Arguments producing the combined raw, numstat and (optionally) patch output
+DIFF_ARGS = ['diff', '--raw', '--numstat', '-z', '--no-abbrev']
+
+# Maximum number of bytes of patch kept in memory, whatever the line and token budgets
+MAX_DIFF_BYTES = 1024 * 1024
+
+# Number of bytes requested from git's stdout at once
+CHUNK_SIZE = 64 * 1024
+
+# Fraction of the git timeout after which the patches read so far are packed as a partial diff
+PARTIAL_DIFF_RATIO = 0.8
+
+# Coroutine function receiving the changed files as soon as they are read
+FilesCallback = Callable[[list[FileChange]], Awaitable[None]]
+
+
+def build_diff_args(revision_range: str, include_patch: bool = True, paths: Optional[list[str]] = None,
+                    pathspecs: Optional[list[str]] = None) -> list[str]:
+    """
+    Build the arguments of the single-pass git diff command
+    :param revision_range: The revision range to compare (e.g. "main...HEAD")
+    :param include_patch: Include the patch in the output (default = True)
+    :param paths: Limit the diff to these paths, taken literally (default = all the paths)
+    :param pathspecs: Additional git pathspecs scoping the diff, e.g. ":(exclude,glob)**/*.lock" (optional)
+    :return: The list of arguments to pass to git
+    """
+    args = list(DIFF_ARGS)
+    if include_patch:
+        args.append('--patch')
+    args.append(revision_range)
+    if paths is not None or pathspecs:
+        args.append('--')
+        args.extend(f':(literal){path}' for path in paths or [])
+        args.extend(pathspecs or [])
+    return args
+
+
+class DiffReader:
+    """
+    Incremental reader of the combined raw, numstat and patch output of git diff
+    """
+
+    def __init__(self, stream: asyncio.StreamReader, spool: Optional[BinaryIO] = None):
+        """
+        :param stream: The stdout of the git diff process
+        :param spool: A file in which the whole patch is written as it is read (optional)
+        """
+        self.stream = stream
+        self.spool = spool
+        self.buffer = bytearray()
+        self.eof = False
+
+        # Position in the patch, and index of the byte ranges of the patch of each file and of its hunks
+        self.files = []
+        self.block_files = []
+        self.block = -1
+        self.offset = 0
+        self.index = []
+        self._entry = None
+        self._hunk = None
+        self._hunks = None
+        self._at_line_start = True
+        self.track_hunks = True
+        self.timed_out = False
+
+    async def _fill(self) -> bool:
+        """
+        Read the next chunk of the stream into the buffer
+        :return: True if data was read, False at the end of the stream
+        """
+        if self.eof:
+            return False
+        chunk = await self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer += chunk
+        return True
+
+    async def at_eof(self) -> bool:
+        """
+        :return: True if all the output has been consumed, False otherwise
+        """
+        return not self.buffer and not await self._fill()
+
+    async def read_token(self) -> Optional[bytes]:
+        """
+        Read the next NUL-terminated token of the raw/numstat header
+        :return: The token without its terminator, or None at the end of the stream
+        """
+        start = 0
+        while True:
+            end = self.buffer.find(b'\0', start)
+            if end != -1:
+                token = bytes(self.buffer[:end])
+                del self.buffer[:end + 1]
+                return token
+            start = len(self.buffer)
+            if not await self._fill():
+                return None
+
+    async def read_line(self, max_bytes: int) -> bytes:
+        """
+        Read the next line of the patch
+        :param max_bytes: Maximum number of bytes to return (longer lines are cut)
+        :return: The line including its newline, or an empty bytes object at the end of the stream
+        """
+        start = 0
+        while True:
+            end = self.buffer.find(b'\n', start, max_bytes)
+            if end != -1:
+                size = end + 1
+                break
+            if len(self.buffer) >= max_bytes:
+                size = max_bytes
+                break
+            start = len(self.buffer)
+            if not await self._fill():
+                size = len(self.buffer)
+                break
+        line = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return line
+
+    async def read_files(self) -> list[FileChange]:
+        """
+        Read the raw and numstat records describing the changed files
+        :return: The changed files, in git order (their hunks are set once their patch has been read)
+        """
+        files = []
+        numstat_index = 0
+
+        # An empty token (or the end of the stream) terminates the header, the patch follows
+        while token := await self.read_token():
+            if token.startswith(b':'):
+                # Raw record: ":<old mode> <new mode> <old sha> <new sha> <status>" followed by 1 or 2 paths
+                _, _, old_sha, new_sha, status = token[1:].decode().split(' ')
+                paths = []
+                for _ in range(2 if status[0] in 'RC' else 1):
+                    paths.append((await self.read_token()).decode('utf-8', errors='replace'))
+                files.append(FileChange(status, paths[-1], paths[0] if len(paths) > 1 else None, old_sha, new_sha))
+            else:
+                # Numstat record: "<added>\t<deleted>\t<path>", or "<added>\t<deleted>\t" followed by 2 paths
+                added, deleted, path = token.split(b'\t', 2)
+                if path == b'':
+                    await self.read_token()
+                    await self.read_token()
+                if numstat_index < len(files):
+                    file = files[numstat_index]
+                    if added == b'-':
+                        file.binary = True
+                    else:
+                        file.additions = int(added)
+                        file.deletions = int(deleted)
+                numstat_index += 1
+
+        # Map each "diff --git" block to its file (type changes are split into a deletion and a creation block)
+        self.files = files
+        self.block_files = [index for index, file in enumerate(files) for _ in range(2 if file.status == 'T' else 1)]
+        return files
+
+    async def read_patch_line(self) -> tuple[bytes, bool]:
+        """
+        Read the next line of the patch, keeping track of the file and hunk it belongs to
+        :return: The line (cut at CHUNK_SIZE bytes), and whether it is the start of a line
+        """
+        line = await self.read_line(CHUNK_SIZE)
+        at_line_start = self._at_line_start
+        if not line:
+            self._complete_file()
+            return line, at_line_start
+
+        if at_line_start and line.startswith(b'diff --git '):
+            self.block += 1
+            index = self.block_files[self.block] if self.block < len(self.block_files) else None
+            if index is None:
+                self._complete_file()
+                self._entry = None
+            elif self._entry is None or self._entry["file"] != index:
+                self._complete_file()
+                self._entry = {"file": index, "path": self.files[index].path, "offset": self.offset, "length": 0,
+                               "hunks": []}
+                self._hunks = [] if self.track_hunks else None
+                self.index.append(self._entry)
+            self._hunk = None
+        elif at_line_start and line.startswith(b'@@') and self._entry is not None:
+            self._hunk = [self.offset, 0]
+            self._entry["hunks"].append(self._hunk)
+            hunk = Hunk.parse(line) if self._hunks is not None else None
+            if hunk is not None:
+                self._hunks.append(hunk)
+
+        if self.spool is not None:
+            self.spool.write(line)
+        self.offset += len(line)
+        if self._entry is not None:
+            self._entry["length"] = self.offset - self._entry["offset"]
+        if self._hunk is not None:
+            self._hunk[1] = self.offset - self._hunk[0]
+        self._at_line_start = line.endswith(b'\n')
+        return line, at_line_start
+
+    def _complete_file(self):
+        """
+        Set the hunks of the file whose patch has been read entirely
+        """
+        if self._entry is not None and self._hunks is not None:
+            self.files[self._entry["file"]].hunks = self._hunks
+        self._hunks = None
+
+    async def drain(self):
+        """
+        Read the rest of the patch, only to index and spool it
+        (the changed files are left untouched, as they may have been returned already)
+        """
+        self.track_hunks = False
+        self._hunks = None
+        while (await self.read_patch_line())[0]:
+            pass
+
+    async def read_patches(self, selected: set[int], max_bytes: int = MAX_DIFF_BYTES,
+                           deadline: Optional[float] = None) -> dict:
+        """
+        Read the patches of the selected files, skipping the lines of the other files.
+        Reading stops once the patches of all the selected files have been read, or when the byte budget or the
+        deadline is reached (timed_out is then set).
+        :param selected: The indexes of the files whose patch is kept
+        :param max_bytes: Maximum number of bytes of patch to keep (default = MAX_DIFF_BYTES)
+        :param deadline: The event loop time at which reading stops (default = no deadline)
+        :return: By file index, the "header" lines and "hunks" of its patch and whether it is "complete"
+        """
+        patches = {}
+        try:
+            async with asyncio.timeout_at(deadline):
+                await self._read_patches(selected, max_bytes, patches)
+        except TimeoutError:
+            # The hunk being read is incomplete (reading is only interrupted between two lines)
+            self.timed_out = True
+            for patch in patches.values():
+                if not patch["complete"] and patch["hunks"]:
+                    patch["hunks"].pop()
+        return patches
+
+    async def _read_patches(self, selected: set[int], max_bytes: int, patches: dict):
+        """
+        Read the patches of the selected files into patches (see read_patches)
+        :param selected: The indexes of the files whose patch is kept
+        :param max_bytes: Maximum number of bytes of patch to keep
+        :param patches: The patches read, by file index
+        """
+        last_block = max((block for block, index in enumerate(self.block_files) if index in selected), default=-1)
+
+        patch = None
+        lines = None
+        continuation = False
+        size = 0
+        while True:
+            line, at_line_start = await self.read_patch_line()
+            if not line:
+                if patch is not None:
+                    patch["complete"] = True
+                break
+
+            if at_line_start and line.startswith(b'diff --git '):
+                index = self.block_files[self.block] if self.block < len(self.block_files) else None
+                if patch is not None and patch is not patches.get(index):
+                    patch["complete"] = True
+                if self.block > last_block:
+                    break
+                if index in selected:
+                    if index in patches:
+                        # Second block of a type change: its header is kept with the hunk that follows
+                        patch = patches[index]
+                        lines = []
+                        patch["hunks"].append(lines)
+                        continuation = True
+                    else:
+                        patch = patches[index] = {"header": [], "hunks": [], "complete": False}
+                        lines = patch["header"]
+                        continuation = False
+                else:
+                    patch = None
+            elif patch is not None and at_line_start and line.startswith(b'@@'):
+                if continuation:
+                    continuation = False
+                else:
+                    lines = []
+                    patch["hunks"].append(lines)
+
+            if patch is not None:
+                # Stop at the byte budget, dropping the hunk that could not be read entirely
+                if size + len(line) > max_bytes:
+                    if patch["hunks"]:
+                        patch["hunks"].pop()
+                    break
+                size += len(line)
+                if at_line_start:
+                    lines.append(line)
+                else:
+                    lines[-1] += line
+
+
+async def read_diff(revision_range: str, cwd: str, include_patch: bool = True, max_lines: int = 500,
+                    max_tokens: int = diff_packer.DIFF_TOKEN_BUDGET, max_bytes: int = MAX_DIFF_BYTES,
+                    store: Optional[DiffStore] = None, store_key: Optional[str] = None,
+                    paths: Optional[list[str]] = None, pathspecs: Optional[list[str]] = None,
+                    on_files: Optional[FilesCallback] = None) -> dict:
+    """
+    Run the single-pass git diff and pack the most relevant part of its patch within the given budget
+    :param revision_range: The revision range to compare (e.g. "main...HEAD")
+    :param cwd: The working directory in which git is executed
+    :param include_patch: Include the patch in the result (default = True)
+    :param max_lines: Maximum number of patch lines to include (default = 500)
+    :param max_tokens: Maximum number of patch tokens to include (default = DIFF_TOKEN_BUDGET)
+    :param max_bytes: Maximum number of patch bytes to read (default = MAX_DIFF_BYTES)
+    :param store: The store in which the whole patch is materialized in the background if the packed diff is truncated
+    or partial (optional)
+    :param store_key: The key of the patch in the store (required with store)
+    :param paths: Limit the diff to these paths (default = all the paths, the stored patch is never limited)
+    :param pathspecs: Git pathspecs scoping the diff, and the stored patch (optional)
+    :param on_files: Coroutine function called with the changed files as soon as they are read, before the patch
+    (optional)
+    :return: A dictionary with the changed "files", the "patch" text, whether it was "truncated", the manifest of
+    the "omitted" files and whether the patch is "partial" (git took too long, the patches read so far are packed)
+    """
+    if store is None or not include_patch:
+        async with git_runner.stream_git(build_diff_args(revision_range, include_patch, paths, pathspecs),
+                                         cwd) as process:
+            deadline = partial_deadline()
+            reader = DiffReader(process.stdout)
+            files = await reader.read_files()
+            if on_files is not None:
+                await on_files(files)
+            patch, omitted = '', []
+            if include_patch:
+                patches = await reader.read_patches(diff_packer.plan_files(files, max_tokens), max_bytes, deadline)
+                patch, omitted = diff_packer.pack(files, patches, max_lines, max_tokens)
+        return {"files": files, "patch": patch, "truncated": bool(omitted), "omitted": omitted,
+                "partial": reader.timed_out}
+
+    # The packed diff is returned as soon as it is ready, while the rest of the patch is materialized in the background
+    # (only if the packed diff left some of it out)
+    ready = asyncio.get_running_loop().create_future()
+    task = materialize_diff(revision_range, cwd, store, store_key, (max_lines, max_tokens, max_bytes, ready),
+                            pathspecs, on_files)
+    try:
+        return await ready
+    except asyncio.CancelledError:
+        # The request was cancelled before its diff was packed, git is stopped right away
+        task.cancel()
+        raise
+
+
+def partial_deadline() -> Optional[float]:
+    """
+    :return: The event loop time after which a diff started now is packed from the patches read so far, before git
+    times out, or None if git has no timeout
+    """
+    timeout = git_runner.resolve_timeout(None)
+    return asyncio.get_running_loop().time() + timeout * PARTIAL_DIFF_RATIO if timeout is not None else None
+
+
+def materialize_diff(revision_range: str, cwd: str, store: DiffStore, store_key: str,
+                     packing: Optional[tuple] = None, pathspecs: Optional[list[str]] = None,
+                     on_files: Optional[FilesCallback] = None) -> asyncio.Task:
+    """
+    Store the whole patch of a revision range, with its index, in the background
+    :param revision_range: The revision range to compare
+    :param cwd: The working directory in which git is executed
+    :param store: The store in which the whole patch is materialized
+    :param store_key: The key of the patch in the store
+    :param packing: The max_lines, max_tokens and max_bytes budgets of read_diff and the future receiving its result,
+    to pack the diff while it is read, the patch being only stored if the packed diff is truncated or partial
+    (optional)
+    :param pathspecs: Git pathspecs scoping the patch (optional)
+    :param on_files: Coroutine function called with the changed files as soon as they are read (optional)
+    :return: The background task, registered as pending in the store until the patch is stored
+    """
+    task = asyncio.create_task(_materialize_diff(revision_range, cwd, store, store_key, packing, pathspecs, on_files))
+    store.pending[store_key] = task
+    task.add_done_callback(lambda _: store.pending.pop(store_key, None))
+    return task
+
+
+async def _materialize_diff(revision_range: str, cwd: str, store: DiffStore, store_key: str,
+                            packing: Optional[tuple], pathspecs: Optional[list[str]] = None,
+                            on_files: Optional[FilesCallback] = None):
+    """
+    Pack the diff like read_diff (if requested), then keep reading git's output to store the whole patch with its index
+    :param revision_range: The revision range to compare
+    :param cwd: The working directory in which git is executed
+    :param store: The store in which the whole patch is materialized
+    :param store_key: The key of the patch in the store
+    :param packing: The budgets of read_diff and the future receiving its result, or None
+    :param pathspecs: Git pathspecs scoping the patch (optional)
+    :param on_files: Coroutine function called with the changed files as soon as they are read (optional)
+    """
+    ready = packing[3] if packing is not None else None
+    spool = store.create_spool()
+    try:
+        async with git_runner.stream_git(build_diff_args(revision_range, pathspecs=pathspecs), cwd) as process:
+            deadline = partial_deadline()
+            reader = DiffReader(process.stdout, spool)
+            files = await reader.read_files()
+            if on_files is not None:
+                await on_files(files)
+            if packing is not None:
+                max_lines, max_tokens, max_bytes, _ = packing
+                patches = await reader.read_patches(diff_packer.plan_files(files, max_tokens), max_bytes, deadline)
+                patch, omitted = diff_packer.pack(files, patches, max_lines, max_tokens)
+                if not ready.done():
+                    ready.set_result({"files": files, "patch": patch, "truncated": bool(omitted),
+                                      "omitted": omitted, "partial": reader.timed_out})
+                # Nothing was left out of the packed diff, git is stopped at the budget like without a store
+                # (the patch is materialized on demand if it is ever paginated)
+                if not omitted and not reader.timed_out:
+                    store.discard(spool)
+                    return
+            await reader.drain()
+        await asyncio.to_thread(store.commit, store_key, spool, reader.index)
+    except asyncio.CancelledError:
+        store.discard(spool)
+        if ready is not None:
+            ready.cancel()
+        raise
+    except Exception as e:
+        store.discard(spool)
+        if ready is not None and not ready.done():
+            ready.set_exception(e)
+
+
+def count_changed_lines(files: list[FileChange]) -> int:
+    """
+    :param files: The changed files returned by read_diff
+    :return: The total number of added and deleted lines
+    """
+    return sum(file.changed_lines for file in files)
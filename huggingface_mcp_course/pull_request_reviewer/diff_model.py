@@ -0,0 +1,139 @@
+"""
+Parsed model of the diffs analyzed by the Pull Request agent.
+Changed files and hunks are kept in __slots__ classes, and serialized as columns (one array per attribute) so that
+responses stay compact and clients do not need to parse git's text output.
+"""
+import re
+from typing import Optional
+
+# Header of a hunk: "@@ -<old start>[,<old lines>] +<new start>[,<new lines>] @@"
+HUNK_HEADER_PATTERN = re.compile(rb'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+
+
+class Hunk:
+    """
+    Line ranges of a hunk in the old and in the new version of a file
+    """
+    __slots__ = ('old_start', 'old_lines', 'new_start', 'new_lines')
+
+    def __init__(self, old_start: int, old_lines: int, new_start: int, new_lines: int):
+        self.old_start = old_start
+        self.old_lines = old_lines
+        self.new_start = new_start
+        self.new_lines = new_lines
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Hunk) and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self) -> str:
+        return f'Hunk(-{self.old_start},{self.old_lines} +{self.new_start},{self.new_lines})'
+
+    def as_tuple(self) -> tuple[int, int, int, int]:
+        """
+        :return: The old start, old lines, new start and new lines of the hunk
+        """
+        return self.old_start, self.old_lines, self.new_start, self.new_lines
+
+    @classmethod
+    def parse(cls, header: bytes) -> Optional['Hunk']:
+        """
+        Parse the header line of a hunk
+        :param header: The line starting with "@@"
+        :return: The hunk, or None if the line is not a valid hunk header (e.g. combined diffs)
+        """
+        match = HUNK_HEADER_PATTERN.match(header)
+        if match is None:
+            return None
+        old_start, old_lines, new_start, new_lines = match.groups()
+        # An omitted number of lines means a single line
+        return cls(int(old_start), int(old_lines or 1), int(new_start), int(new_lines or 1))
+
+
+class FileChange:
+    """
+    Changed file, as described by the raw and numstat records of git diff
+    """
+    __slots__ = ('status', 'path', 'old_path', 'old_sha', 'new_sha', 'additions', 'deletions', 'binary', 'hunks')
+
+    def __init__(self, status: str, path: str, old_path: Optional[str] = None, old_sha: Optional[str] = None,
+                 new_sha: Optional[str] = None, additions: int = 0, deletions: int = 0, binary: bool = False,
+                 hunks: Optional[list[Hunk]] = None):
+        """
+        :param status: The status letter of the change, followed by the similarity score for renames and copies
+        :param path: The path of the file (the new path for renames and copies)
+        :param old_path: The old path of a renamed or copied file (optional)
+        :param old_sha: The blob SHA of the old version (optional)
+        :param new_sha: The blob SHA of the new version (optional)
+        :param additions: The number of added lines (default = 0)
+        :param deletions: The number of deleted lines (default = 0)
+        :param binary: Whether the file is binary (default = False)
+        :param hunks: The hunks of the patch, or None if the patch was not read entirely (default = None)
+        """
+        self.status = status
+        self.path = path
+        self.old_path = old_path
+        self.old_sha = old_sha
+        self.new_sha = new_sha
+        self.additions = additions
+        self.deletions = deletions
+        self.binary = binary
+        self.hunks = hunks
+
+    def __repr__(self) -> str:
+        return f'FileChange({self.status} {self.path} +{self.additions} -{self.deletions})'
+
+    @property
+    def changed_lines(self) -> int:
+        """
+        :return: The number of added and deleted lines
+        """
+        return self.additions + self.deletions
+
+
+def summarize(files: list[FileChange]) -> dict:
+    """
+    :param files: The changed files
+    :return: The number of changed "files", and their total "additions" and "deletions"
+    """
+    return {
+        "files": len(files),
+        "additions": sum(file.additions for file in files),
+        "deletions": sum(file.deletions for file in files)
+    }
+
+
+def to_columns(files: list[FileChange]) -> dict:
+    """
+    Serialize changed files as one array per attribute.
+    The hunks of a file are flattened as [old start, old lines, new start, new lines, ...], or null if unknown.
+    Blob SHAs are left out.
+    :param files: The changed files
+    :return: The columns of the changed files
+    """
+    return {
+        "path": [file.path for file in files],
+        "old_path": [file.old_path for file in files],
+        "status": [file.status for file in files],
+        "additions": [file.additions for file in files],
+        "deletions": [file.deletions for file in files],
+        "binary": [file.binary for file in files],
+        "hunks": [[value for hunk in file.hunks for value in hunk.as_tuple()] if file.hunks is not None else None
+                  for file in files]
+    }
+
+
+def from_columns(columns: dict) -> list[FileChange]:
+    """
+    Deserialize the changed files serialized by to_columns
+    :param columns: The columns of the changed files
+    :return: The changed files (without blob SHAs)
+    """
+    files = []
+    for path, old_path, status, additions, deletions, binary, hunks in zip(
+            columns["path"], columns["old_path"], columns["status"], columns["additions"], columns["deletions"],
+            columns["binary"], columns["hunks"]):
+        if hunks is not None:
+            hunks = [Hunk(*hunks[start:start + 4]) for start in range(0, len(hunks), 4)]
+        files.append(FileChange(status, path, old_path, additions=additions, deletions=deletions, binary=binary,
+                                hunks=hunks))
+    return files
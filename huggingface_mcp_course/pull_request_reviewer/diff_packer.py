@@ -0,0 +1,207 @@
+"""
+Token-budget-aware packing of the diff returned by the Pull Request agent.
+Instead of keeping the first lines of the patch in git order, hunks are ranked by relevance (source files before
+generated files, lockfiles and vendored files, smaller hunks first) and packed until the token budget is reached.
+A manifest lists what was left out.
+"""
+import math
+import re
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+# IMPORTANT: MCP tools have a 25,000 token response limit, the rest is kept for the other fields of the analysis
+DIFF_TOKEN_BUDGET = 20000
+
+# Approximate number of bytes per token of a patch
+BYTES_PER_TOKEN = 4
+
+# Approximate number of bytes per changed line, used to estimate the size of a file patch from its numstat
+BYTES_PER_CHANGED_LINE = 48
+
+# Files are read until their estimated size reaches this multiple of the token budget
+READ_BUDGET_FACTOR = 2
+
+# Minimum number of lines of a hunk worth including when the whole hunk does not fit
+MIN_PARTIAL_HUNK_LINES = 10
+
+# Maximum number of omitted files listed in the manifest
+MANIFEST_MAX_FILES = 100
+
+# Categories of files, from the most to the least relevant
+SOURCE = 'source'
+GENERATED = 'generated'
+LOCKFILE = 'lockfile'
+VENDORED = 'vendored'
+CATEGORY_RANKS = {SOURCE: 0, GENERATED: 1, LOCKFILE: 2, VENDORED: 3}
+
+VENDORED_PATTERN = re.compile(r'(^|/)(vendor|vendored|third_party|third-party|node_modules|external)/')
+LOCKFILE_PATTERN = re.compile(
+    r'(^|/)(package-lock\.json|npm-shrinkwrap\.json|yarn\.lock|pnpm-lock\.yaml|poetry\.lock|Pipfile\.lock|uv\.lock|'
+    r'Cargo\.lock|go\.sum|composer\.lock|Gemfile\.lock|packages\.lock\.json|[^/]+\.lock)$'
+)
+GENERATED_PATTERN = re.compile(
+    r'((^|/)(dist|build|generated|__generated__)/|_pb2(_grpc)?\.pyi?$|\.pb\.(go|cc|h)$|\.min\.(js|css)$|'
+    r'\.generated\.[^/]+$|\.g\.dart$|\.map$|\.snap$)'
+)
+
+
+def categorize(path: str) -> str:
+    """
+    Categorize a file by the relevance of its changes for a reviewer
+    :param path: The path of the file
+    :return: One of SOURCE, GENERATED, LOCKFILE or VENDORED
+    """
+    if VENDORED_PATTERN.search(path):
+        return VENDORED
+    if LOCKFILE_PATTERN.search(path):
+        return LOCKFILE
+    if GENERATED_PATTERN.search(path):
+        return GENERATED
+    return SOURCE
+
+
+def estimate_tokens(size: int) -> int:
+    """
+    :param size: A number of bytes of patch
+    :return: The approximate number of tokens of the patch
+    """
+    return math.ceil(size / BYTES_PER_TOKEN)
+
+
+def plan_files(files: list[FileChange], max_tokens: int = DIFF_TOKEN_BUDGET) -> set[int]:
+    """
+    Select the files whose patch is worth reading, based on their category and numstat
+    :param files: The changed files returned by DiffReader.read_files
+    :param max_tokens: The token budget of the diff (default = DIFF_TOKEN_BUDGET)
+    :return: The indexes of the selected files
+    """
+    ranked = sorted(range(len(files)), key=lambda index: (CATEGORY_RANKS[categorize(files[index].path)],
+                                                          files[index].changed_lines))
+    selected = set()
+    estimated_tokens = 0
+    for index in ranked:
+        estimated_tokens += estimate_tokens((files[index].changed_lines + 1) * BYTES_PER_CHANGED_LINE)
+        if selected and estimated_tokens > READ_BUDGET_FACTOR * max_tokens:
+            break
+        selected.add(index)
+    return selected
+
+
+def pack(files: list[FileChange], patches: dict[int, dict], max_lines: int,
+         max_tokens: int = DIFF_TOKEN_BUDGET) -> tuple[str, list[dict]]:
+    """
+    Pack the most relevant hunks within the line and token budgets
+    :param files: The changed files returned by DiffReader.read_files
+    :param patches: The patches read by DiffReader.read_patches, by file index
+    :param max_lines: Maximum number of lines of the packed diff
+    :param max_tokens: Maximum number of tokens of the packed diff (default = DIFF_TOKEN_BUDGET)
+    :return: The packed diff in git order, and the manifest of the omitted files
+    """
+    categories = [categorize(file.path) for file in files]
+
+    # Rank the hunks (or the header alone for patches without hunks, e.g. binary files)
+    candidates = []
+    for index, patch in patches.items():
+        rank = CATEGORY_RANKS[categories[index]]
+        if patch["hunks"]:
+            for hunk_index, hunk in enumerate(patch["hunks"]):
+                candidates.append((rank, sum(len(line) for line in hunk), index, hunk_index))
+        else:
+            candidates.append((rank, 0, index, None))
+    candidates.sort()
+
+    # Greedily admit the hunks, the header of a file is paid for with its first hunk
+    admitted: dict[int, set] = {}
+    tokens = 0
+    lines = 0
+    for _, size, index, hunk_index in candidates:
+        patch = patches[index]
+        cost_tokens = estimate_tokens(size)
+        cost_lines = len(patch["hunks"][hunk_index]) if hunk_index is not None else 0
+        if index not in admitted:
+            cost_tokens += estimate_tokens(sum(len(line) for line in patch["header"]))
+            cost_lines += len(patch["header"])
+        if tokens + cost_tokens > max_tokens or lines + cost_lines > max_lines:
+            continue
+        admitted.setdefault(index, set())
+        if hunk_index is not None:
+            admitted[index].add(hunk_index)
+        tokens += cost_tokens
+        lines += cost_lines
+
+    # Fill the remaining budget with the beginning of the most relevant hunk that did not fit
+    partial = {}
+    for _, size, index, hunk_index in candidates:
+        if hunk_index is None or hunk_index in admitted.get(index, ()):
+            continue
+        patch = patches[index]
+        header = patch["header"] if index not in admitted else []
+        remaining_lines = max_lines - lines - len(header)
+        remaining_bytes = (max_tokens - tokens) * BYTES_PER_TOKEN - sum(len(line) for line in header)
+        kept_lines = 0
+        for line in patch["hunks"][hunk_index]:
+            if kept_lines == remaining_lines or len(line) > remaining_bytes:
+                break
+            kept_lines += 1
+            remaining_bytes -= len(line)
+        if kept_lines >= MIN_PARTIAL_HUNK_LINES:
+            admitted.setdefault(index, set())
+            partial[index] = (hunk_index, kept_lines)
+        break
+
+    # Assemble the admitted hunks in git order
+    output = []
+    for index in sorted(admitted):
+        patch = patches[index]
+        output.extend(patch["header"])
+        for hunk_index, hunk in enumerate(patch["hunks"]):
+            if hunk_index in admitted[index]:
+                output.extend(hunk)
+            elif index in partial and partial[index][0] == hunk_index:
+                output.extend(hunk[:partial[index][1]])
+    packed = b''.join(output).decode('utf-8', errors='replace')
+
+    # List the files that are missing entirely or partially (omitted hunks are unknown for patches not read entirely)
+    manifest = []
+    for index, file in enumerate(files):
+        patch = patches.get(index)
+        included_hunks = admitted.get(index, set())
+        if patch is not None and patch["complete"] and index in admitted \
+                and len(included_hunks) == len(patch["hunks"]):
+            continue
+        manifest.append(manifest_entry(
+            file,
+            len(patch["hunks"]) - len(included_hunks) if patch is not None and patch["complete"] else None,
+            index in partial
+        ))
+    return packed, manifest
+
+
+def manifest_entry(file: FileChange, omitted_hunks: Optional[int] = None, partial: bool = False) -> dict:
+    """
+    :param file: A file missing entirely or partially from the packed diff
+    :param omitted_hunks: The number of omitted hunks, None if unknown (default = None)
+    :param partial: Whether the beginning of a hunk is included (default = False)
+    :return: The entry of the file in the manifest
+    """
+    return {
+        "path": file.path,
+        "category": categorize(file.path),
+        "changed_lines": file.changed_lines,
+        "omitted_hunks": omitted_hunks,
+        "partial": partial
+    }
+
+
+def summarize_manifest(manifest: list[dict]) -> dict:
+    """
+    Limit the manifest to the first MANIFEST_MAX_FILES omitted files, serialized as one array per attribute
+    :param manifest: The manifest returned by pack
+    :return: The columns of the listed omitted files and the total number of omitted files
+    """
+    listed = manifest[:MANIFEST_MAX_FILES]
+    summary = {key: [entry[key] for entry in listed]
+               for key in ('path', 'category', 'changed_lines', 'omitted_hunks', 'partial')}
+    summary["total"] = len(manifest)
+    return summary
@@ -0,0 +1,310 @@
+"""
+Server-side store of the materialized diffs analyzed by the Pull Request agent.
+The whole patch of a revision range is written to disk along with an index of the byte ranges of each file and hunk,
+so that any part of it can be served later by seeking into the file, without running git again.
+"""
+import asyncio
+import bisect
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+import time
+from typing import BinaryIO, Optional
+
+# Location of the stored diffs, relative to the git common directory of the repository
+DIFF_STORE_DIR = 'pr-agent/diffs'
+
+# Default size budget of the stored diffs of each repository
+DIFF_STORE_MAX_BYTES = int(os.getenv('PR_AGENT_DIFF_STORE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+# Default number of bytes of diff returned per page
+DIFF_PAGE_BYTES = 64 * 1024
+
+# Number of indexes kept in memory
+INDEX_CACHE_SIZE = 16
+
+# Age after which a spool file is considered left over by a process that stopped while writing it, in seconds
+STALE_SPOOL_SECONDS = 3600
+
+
+class DiffStore:
+    """
+    Directory of materialized patches, each stored with the index of its files and hunks
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DIFF_STORE_MAX_BYTES):
+        """
+        :param directory: The directory in which the patches are stored (created if it does not exist)
+        :param max_bytes: Maximum total size of the stored patches (default = DIFF_STORE_MAX_BYTES)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.pending: dict[str, asyncio.Task] = {}
+        # Revision range to diff, working directory and pathspecs of the patches that can be materialized on demand
+        self.sources: dict[str, tuple[str, str, Optional[list[str]]]] = {}
+        self._indexes: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        Path(directory).mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, revision_range: str) -> tuple[str, str]:
+        """
+        :param revision_range: The revision range of the patch ("<merge-base SHA>..<HEAD SHA>")
+        :return: The paths of the patch and of its index
+        """
+        name = revision_range.replace('..', '-')
+        return os.path.join(self.directory, f'{name}.patch'), os.path.join(self.directory, f'{name}.json')
+
+    def exists(self, revision_range: str) -> bool:
+        """
+        :param revision_range: The revision range of the patch
+        :return: True if the patch is stored or being stored, False otherwise
+        """
+        # A finished task stays pending until its done callback runs, it only counts if it stored the patch
+        task = self.pending.get(revision_range)
+        return (task is not None and not task.done()) or os.path.exists(self._paths(revision_range)[1])
+
+    def create_spool(self) -> BinaryIO:
+        """
+        :return: A temporary file, in the store directory, in which a patch can be written
+        """
+        return tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False)
+
+    def commit(self, revision_range: str, spool: BinaryIO, files: list[dict]):
+        """
+        Store a patch written in a spool file along with its index
+        :param revision_range: The revision range of the patch
+        :param spool: The spool file in which the patch was written
+        :param files: The byte ranges of the patch of each file and of its hunks (see DiffReader.index)
+        """
+        patch_path, index_path = self._paths(revision_range)
+        spool.close()
+        # Patches are written in git order, so the offsets of the files and of their hunks are increasing
+        index = {
+            "size": os.path.getsize(spool.name),
+            "files": files,
+            "file_offsets": [file["offset"] for file in files],
+            "paths": {file["path"]: position for position, file in enumerate(files)},
+            "boundaries": [offset for file in files
+                           for offset in [file["offset"]] + [hunk[0] for hunk in file["hunks"]]]
+        }
+        os.replace(spool.name, patch_path)
+        with open(f'{index_path}.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(f'{index_path}.tmp', index_path)
+        with self._lock:
+            self._indexes[revision_range] = index
+        self.prune()
+
+    @staticmethod
+    def discard(spool: BinaryIO):
+        """
+        Delete a spool file whose patch could not be stored
+        :param spool: The spool file
+        """
+        spool.close()
+        Path(spool.name).unlink(missing_ok=True)
+
+    def prune(self):
+        """
+        Delete the least recently used patches until the store fits within its size budget
+        (the spool files being written count in the budget, the stale ones left over by stopped processes are deleted)
+        """
+        entries = []
+        total = 0
+        stale_time = time.time() - STALE_SPOOL_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.patch'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            elif entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                if stat.st_mtime < stale_time:
+                    Path(entry.path).unlink(missing_ok=True)
+                else:
+                    total += stat.st_size
+        deleted = set()
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            Path(path).with_suffix('.json').unlink(missing_ok=True)
+            deleted.add(path)
+            total -= size
+
+        # Only forget the indexes of the deleted patches
+        with self._lock:
+            for revision_range in [key for key in self._indexes if self._paths(key)[0] in deleted]:
+                del self._indexes[revision_range]
+
+    def load_index(self, revision_range: str) -> Optional[dict]:
+        """
+        Load the index of a stored patch
+        :param revision_range: The revision range of the patch
+        :return: The index with the "size" of the patch, its "files" and their position by path ("paths"), or None if
+        the patch is not stored
+        """
+        with self._lock:
+            index = self._indexes.get(revision_range)
+            if index is not None:
+                self._indexes.move_to_end(revision_range)
+                return index
+        try:
+            with open(self._paths(revision_range)[1]) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self._indexes[revision_range] = index
+            while len(self._indexes) > INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        return index
+
+    async def wait(self, revision_range: str):
+        """
+        Wait for a patch still being written to be stored
+        :param revision_range: The revision range of the patch
+        """
+        task = self.pending.get(revision_range)
+        if task is not None:
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                # The patch was abandoned by the request that started it, only a cancellation of the caller propagates
+                if not task.cancelled():
+                    raise
+
+    def read(self, revision_range: str, offset: int, length: int) -> bytes:
+        """
+        Read a slice of a stored patch
+        :param revision_range: The revision range of the patch
+        :param offset: The offset of the slice
+        :param length: The length of the slice
+        :return: The bytes of the slice
+        """
+        patch_path = self._paths(revision_range)[0]
+        with open(patch_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        # The modification time orders the patches from the least to the most recently used
+        os.utime(patch_path)
+        return data
+
+    def read_page(self, revision_range: str, offset: int, max_bytes: int = DIFF_PAGE_BYTES) -> Optional[dict]:
+        """
+        Read a page of a stored patch, ending on a file or hunk boundary whenever possible
+        :param revision_range: The revision range of the patch
+        :param offset: The offset at which the page starts
+        :param max_bytes: Maximum size of the page (default = DIFF_PAGE_BYTES)
+        :return: The "diff" of the page, the "files" it covers and the offset of the next page ("next_offset", None on
+        the last page), or None if the patch is not stored
+        """
+        index = self.load_index(revision_range)
+        if index is None:
+            return None
+        size = index["size"]
+        offset = max(0, min(offset, size))
+
+        # Stop at the last boundary within the page, or cut the page if a single hunk is larger than the page
+        end = min(offset + max_bytes, size)
+        if end < size:
+            boundaries = index["boundaries"]
+            position = bisect.bisect_right(boundaries, end) - 1
+            if position >= 0 and boundaries[position] > offset:
+                end = boundaries[position]
+        data = self.read(revision_range, offset, end - offset)
+        if end < size and not data.endswith(b'\n') and b'\n' in data:
+            data = data[:data.rindex(b'\n') + 1]
+            end = offset + len(data)
+
+        first = max(bisect.bisect_right(index["file_offsets"], offset) - 1, 0)
+        last = bisect.bisect_left(index["file_offsets"], end)
+        return {
+            "diff": data.decode('utf-8', errors='replace'),
+            "files": [file["path"] for file in index["files"][first:last]],
+            "offset": offset,
+            "next_offset": end if end < size else None,
+            "total_bytes": size
+        }
+
+    def read_file(self, revision_range: str, path: str, max_bytes: int = DIFF_PAGE_BYTES) -> Optional[dict]:
+        """
+        Read the patch of a single file of a stored patch, by seeking to its byte range
+        :param revision_range: The revision range of the patch
+        :param path: The path of the file (its new path for renamed files)
+        :param max_bytes: Maximum number of bytes of patch to return (default = DIFF_PAGE_BYTES)
+        :return: The "diff" of the file, its "hunks" count, whether it was "truncated" and the offset at which the rest
+        of the patch starts ("next_offset", None if not truncated), or None if the patch or the file is not stored
+        """
+        index = self.load_index(revision_range)
+        if index is None or path not in index["paths"]:
+            return None
+        file = index["files"][index["paths"][path]]
+
+        # Cut a patch larger than max_bytes on a line boundary
+        data = self.read(revision_range, file["offset"], min(file["length"], max_bytes))
+        truncated = len(data) < file["length"]
+        if truncated and b'\n' in data:
+            data = data[:data.rindex(b'\n') + 1]
+        return {
+            "path": path,
+            "diff": data.decode('utf-8', errors='replace'),
+            "hunks": len(file["hunks"]),
+            "truncated": truncated,
+            "next_offset": file["offset"] + len(data) if truncated else None
+        }
+
+
+# Diff stores already opened, by git directory
+_diff_stores: dict[str, DiffStore] = {}
+_diff_stores_lock = threading.Lock()
+
+
+def get_diff_store(git_dir: str) -> DiffStore:
+    """
+    Get the diff store located in the git directory of a repository
+    :param git_dir: The absolute path to the git common directory of the repository
+    :return: The diff store of the repository
+    """
+    with _diff_stores_lock:
+        diff_store = _diff_stores.get(git_dir)
+        if diff_store is None:
+            diff_store = DiffStore(os.path.join(git_dir, DIFF_STORE_DIR))
+            _diff_stores[git_dir] = diff_store
+        return diff_store
+
+
+def format_range(merge_base_sha: str, head_sha: str, scope_key: str = '') -> str:
+    """
+    :param merge_base_sha: The SHA of the merge-base
+    :param head_sha: The SHA of the head
+    :param scope_key: The key of the path scope of the patch (see PathScope.key), empty for the whole repository
+    :return: The key of the patch in the store ("<merge-base SHA>..<HEAD SHA>", followed by "@<scope>" if scoped)
+    """
+    return f'{merge_base_sha}..{head_sha}@{scope_key}' if scope_key else f'{merge_base_sha}..{head_sha}'
+
+
+def format_cursor(revision_range: str, offset: int) -> str:
+    """
+    :param revision_range: The revision range of a stored patch
+    :param offset: An offset in the patch
+    :return: The cursor pointing at this offset of the patch
+    """
+    return f'{revision_range}:{offset}'
+
+
+def parse_cursor(cursor: str) -> tuple[str, int]:
+    """
+    :param cursor: A cursor returned by format_cursor
+    :return: The revision range and the offset the cursor points at
+    """
+    revision_range, _, offset = cursor.rpartition(':')
+    base, separator, head = revision_range.partition('..')
+    head, scoped, scope_key = head.partition('@')
+    if not separator or not base.isalnum() or not head.isalnum() or (scoped and not scope_key.isalnum()) or \
+            not offset.isdigit():
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return revision_range, int(offset)
@@ -0,0 +1,325 @@
+"""
+Pluggable access to the git repositories analyzed by the Pull Request agent.
+The subprocess backend runs one git command per operation. The batch backend keeps a long-lived
+`git cat-file --batch-command` process per working directory, whose object database and pack indexes stay warm,
+and walks the commit graph in-process to resolve revisions and merge-bases.
+Diffs are streamed from `git diff` by both backends (see diff_engine).
+The backend is selected with the PR_AGENT_GIT_BACKEND environment variable ("subprocess" or "batch").
+"""
+import asyncio
+from collections import OrderedDict
+import heapq
+import os
+import subprocess
+from typing import Optional
+import weakref
+
+from huggingface_mcp_course.pull_request_reviewer import git_runner
+
+# Name of the backend used by the tools
+GIT_BACKEND = os.getenv('PR_AGENT_GIT_BACKEND', 'subprocess')
+
+# Number of parsed commits kept in memory by the batch backend
+COMMIT_CACHE_SIZE = 65536
+
+# Number of cat-file processes kept running by the batch backend on each event loop
+CAT_FILE_PROCESSES = 8
+
+# Flags painted on the commits during the walks
+PARENT1 = 1
+PARENT2 = 2
+STALE = 4
+RESULT = 8
+
+
+class Commit:
+    """
+    Parsed commit object
+    """
+    __slots__ = ('sha', 'parents', 'timestamp', 'subject')
+
+    def __init__(self, sha: str, parents: list[str], timestamp: int, subject: str):
+        self.sha = sha
+        self.parents = parents
+        self.timestamp = timestamp
+        self.subject = subject
+
+    @classmethod
+    def parse(cls, sha: str, data: bytes) -> 'Commit':
+        """
+        Parse the content of a commit object
+        :param sha: The SHA of the commit
+        :param data: The raw content of the commit object
+        :return: The parsed commit
+        """
+        header, _, message = data.partition(b'\n\n')
+        parents = []
+        timestamp = 0
+        for line in header.split(b'\n'):
+            if line.startswith(b'parent '):
+                parents.append(line[7:].decode())
+            elif line.startswith(b'committer '):
+                timestamp = int(line.rsplit(b' ', 2)[1])
+        # Like git's %s, the subject is the first paragraph of the message joined on a single line
+        paragraph = message.lstrip(b'\n').split(b'\n\n', 1)[0]
+        subject = ' '.join(line.strip() for line in paragraph.decode('utf-8', errors='replace').splitlines())
+        return cls(sha, parents, timestamp, subject)
+
+
+class GitBackend:
+    """
+    Interface of the git operations used by the tools
+    """
+    name = None
+
+    async def repository(self, cwd: str) -> tuple[str, str, str]:
+        """
+        :param cwd: A directory of the git repository
+        :return: The absolute paths to the top-level directory of the working tree, to its git directory and to the
+        git common directory (shared by all the worktrees)
+        """
+        raise NotImplementedError
+
+    async def resolve(self, cwd: str, revision: str) -> str:
+        """
+        :param cwd: The working directory of the git repository
+        :param revision: A revision (e.g. "main")
+        :return: The SHA of the commit the revision points to
+        """
+        raise NotImplementedError
+
+    async def merge_base(self, cwd: str, first: str, second: str) -> str:
+        """
+        :param cwd: The working directory of the git repository
+        :param first: A revision (e.g. "main")
+        :param second: Another revision (e.g. "HEAD")
+        :return: The SHA of the best common ancestor of both revisions
+        """
+        raise NotImplementedError
+
+    async def close(self):
+        """
+        Release the resources held by the backend
+        """
+
+
+class SubprocessBackend(GitBackend):
+    """
+    Backend running one git process per operation
+    """
+    name = 'subprocess'
+
+    async def repository(self, cwd: str) -> tuple[str, str, str]:
+        result = await git_runner.run_git(['rev-parse', '--path-format=absolute', '--show-toplevel', '--git-dir',
+                                           '--git-common-dir'], cwd, check=True)
+        toplevel, git_dir, common_dir = result.stdout.splitlines()
+        return toplevel, git_dir, common_dir
+
+    async def resolve(self, cwd: str, revision: str) -> str:
+        result = await git_runner.run_git(['rev-parse', '--verify', '--end-of-options', f'{revision}^{{commit}}'], cwd,
+                                          check=True)
+        return result.stdout.strip()
+
+    async def merge_base(self, cwd: str, first: str, second: str) -> str:
+        result = await git_runner.run_git(['merge-base', first, second], cwd, check=True)
+        return result.stdout.strip()
+
+
+class CatFileProcess:
+    """
+    Long-lived `git cat-file --batch-command` process answering one request at a time
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        """
+        :param process: The running cat-file process
+        """
+        self.process = process
+        self.lock = asyncio.Lock()
+        self.broken = False
+
+    async def request(self, command: str, name: str) -> tuple[Optional[str], Optional[str], Optional[bytes]]:
+        """
+        Send a request to cat-file
+        :param command: "info" or "contents"
+        :param name: The name of the object (a SHA or any revision, e.g. "HEAD")
+        :return: The SHA, type and content (None for info) of the object, or Nones if it is missing or ambiguous
+        :raise CalledProcessError: If the name contains a newline or a NUL, which would break the protocol
+        :raise TimeoutExpired: If cat-file did not answer within the git timeout (the process is killed)
+        """
+        # Each request is a single line, whose answer is read by the next request if it spans several ones
+        if '\n' in name or '\0' in name:
+            raise subprocess.CalledProcessError(128, ['git', 'cat-file', command, name],
+                                                stderr=f'fatal: Not a valid object name {name!r}\n')
+        timeout = git_runner.resolve_timeout(None)
+        async with self.lock:
+            try:
+                async with asyncio.timeout(timeout):
+                    self.process.stdin.write(f'{command} {name}\n'.encode())
+                    await self.process.stdin.drain()
+                    header = (await self.process.stdout.readline()).rstrip(b'\n').split(b' ')
+                    if len(header) != 3:
+                        return None, None, None
+                    sha, object_type, size = header
+                    content = None
+                    if command == 'contents':
+                        content = await self.process.stdout.readexactly(int(size) + 1)
+                        content = content[:-1]
+            except BaseException as e:
+                # The answer of an interrupted request would be read by the next one, the process is replaced
+                self.broken = True
+                git_runner.kill(self.process)
+                if isinstance(e, TimeoutError):
+                    raise subprocess.TimeoutExpired(['git', 'cat-file', command, name], timeout)
+                raise
+        return sha.decode(), object_type.decode(), content
+
+    async def close(self):
+        """
+        Stop the process, once the request in progress is answered
+        """
+        async with self.lock:
+            if self.process.returncode is None:
+                self.process.stdin.close()
+                try:
+                    await asyncio.wait_for(self.process.wait(), timeout=1)
+                except asyncio.TimeoutError:
+                    self.process.kill()
+                    await self.process.wait()
+
+
+class BatchBackend(GitBackend):
+    """
+    Backend walking the commit graph in-process, reading objects from long-lived cat-file processes
+    """
+    name = 'batch'
+
+    def __init__(self):
+        self._subprocess = SubprocessBackend()
+        self._commits: OrderedDict[str, Commit] = OrderedDict()
+        # One set of processes per event loop (asyncio processes cannot be shared between loops), least recently used
+        # first
+        self._processes: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+    async def _process(self, cwd: str) -> CatFileProcess:
+        """
+        :param cwd: The working directory of the git repository
+        :return: The cat-file process of the working directory, started on first use (the least recently used
+        processes are stopped to keep at most CAT_FILE_PROCESSES running)
+        """
+        processes = self._processes.setdefault(asyncio.get_running_loop(), OrderedDict())
+        process = processes.get(cwd)
+        if process is None or process.broken or process.process.returncode is not None:
+            process = processes[cwd] = CatFileProcess(await git_runner.spawn(
+                ['git', 'cat-file', '--batch-command'], cwd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            ))
+        processes.move_to_end(cwd)
+        while len(processes) > CAT_FILE_PROCESSES:
+            _, evicted = processes.popitem(last=False)
+            await evicted.close()
+        return process
+
+    async def repository(self, cwd: str) -> tuple[str, str, str]:
+        return await self._subprocess.repository(cwd)
+
+    async def resolve(self, cwd: str, revision: str) -> str:
+        sha, _, _ = await (await self._process(cwd)).request('info', f'{revision}^{{commit}}')
+        if sha is None:
+            raise subprocess.CalledProcessError(128, ['git', 'cat-file', 'info', revision],
+                                                stderr=f'fatal: Not a valid object name {revision}\n')
+        return sha
+
+    async def commit(self, cwd: str, sha: str) -> Commit:
+        """
+        :param cwd: The working directory of the git repository
+        :param sha: The SHA of a commit
+        :return: The parsed commit (commits are immutable, so they are cached)
+        """
+        commit = self._commits.get(sha)
+        if commit is not None:
+            self._commits.move_to_end(sha)
+            return commit
+        _, object_type, content = await (await self._process(cwd)).request('contents', sha)
+        if object_type != 'commit':
+            raise subprocess.CalledProcessError(128, ['git', 'cat-file', 'contents', sha],
+                                                stderr=f'fatal: {sha} is not a commit\n')
+        commit = self._commits[sha] = Commit.parse(sha, content)
+        while len(self._commits) > COMMIT_CACHE_SIZE:
+            self._commits.popitem(last=False)
+        return commit
+
+    async def merge_base(self, cwd: str, first: str, second: str) -> str:
+        first_sha = await self.resolve(cwd, first)
+        second_sha = await self.resolve(cwd, second)
+        if first_sha == second_sha:
+            return first_sha
+
+        # Paint the ancestors of both commits by decreasing commit date until only stale commits are left
+        flags = {first_sha: PARENT1, second_sha: PARENT2}
+        queue = []
+        for order, sha in enumerate((first_sha, second_sha)):
+            heapq.heappush(queue, (-(await self.commit(cwd, sha)).timestamp, order, sha))
+        order = len(queue)
+        # Number of entries of each commit in the queue, and number of entries of commits that are not stale
+        queued = {first_sha: 1, second_sha: 1}
+        active = 2
+        results = []
+        while active:
+            _, _, sha = heapq.heappop(queue)
+            queued[sha] -= 1
+            if not flags[sha] & STALE:
+                active -= 1
+            painted = flags[sha] & (PARENT1 | PARENT2 | STALE)
+            if painted == PARENT1 | PARENT2:
+                if not flags[sha] & RESULT:
+                    flags[sha] |= RESULT
+                    results.append(sha)
+                painted |= STALE
+            for parent in (await self.commit(cwd, sha)).parents:
+                if flags.get(parent, 0) & painted == painted:
+                    continue
+                if painted & STALE and not flags.get(parent, 0) & STALE:
+                    # The entries of the parent already in the queue become stale
+                    active -= queued.get(parent, 0)
+                flags[parent] = flags.get(parent, 0) | painted
+                order += 1
+                heapq.heappush(queue, (-(await self.commit(cwd, parent)).timestamp, order, parent))
+                queued[parent] = queued.get(parent, 0) + 1
+                if not flags[parent] & STALE:
+                    active += 1
+
+        candidates = [sha for sha in results if not flags[sha] & STALE]
+        if not candidates:
+            raise subprocess.CalledProcessError(1, ['git', 'merge-base', first, second], stderr='')
+        if len(candidates) > 1:
+            # Criss-cross merges have several candidates, let git pick the best one
+            return await self._subprocess.merge_base(cwd, first_sha, second_sha)
+        return candidates[0]
+
+    async def close(self):
+        processes = self._processes.pop(asyncio.get_running_loop(), {})
+        for process in processes.values():
+            await process.close()
+
+
+# Backends by name
+GIT_BACKENDS = {SubprocessBackend.name: SubprocessBackend, BatchBackend.name: BatchBackend}
+
+# Backend already created
+_git_backend: Optional[GitBackend] = None
+
+
+def get_git_backend() -> GitBackend:
+    """
+    Get the backend selected by the PR_AGENT_GIT_BACKEND environment variable
+    :return: The git backend shared by the tools
+    """
+    global _git_backend
+    if _git_backend is None:
+        if GIT_BACKEND not in GIT_BACKENDS:
+            raise ValueError(f'Unknown git backend: {GIT_BACKEND} (expected one of {", ".join(GIT_BACKENDS)})')
+        _git_backend = GIT_BACKENDS[GIT_BACKEND]()
+    return _git_backend
@@ -0,0 +1,185 @@
+"""
+Asynchronous execution layer for the git commands used by the Pull Request agent.
+Git processes are started with asyncio so that the MCP event loop keeps serving other requests while they run.
+Each process runs in its own process group, which is killed when the call times out or when the request running it is
+cancelled (e.g. by an MCP cancellation notification), so that abandoned git commands never keep running.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import os
+import signal
+import subprocess
+from typing import AsyncIterator, Optional
+import weakref
+
+# Maximum number of git processes that can run at the same time
+GIT_CONCURRENCY_LIMIT = int(os.getenv('PR_AGENT_GIT_CONCURRENCY', '4'))
+
+# Default timeout of each git command in seconds (0 disables the timeout)
+GIT_TIMEOUT = float(os.getenv('PR_AGENT_GIT_TIMEOUT', '120'))
+
+# One semaphore per event loop (asyncio primitives cannot be shared between loops)
+_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_git_semaphore() -> asyncio.Semaphore:
+    """
+    Get the semaphore bounding the number of concurrent git processes for the running event loop
+    :return: The semaphore associated with the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(GIT_CONCURRENCY_LIMIT)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+def resolve_timeout(timeout: Optional[float]) -> Optional[float]:
+    """
+    :param timeout: A timeout in seconds, or None for the default timeout (GIT_TIMEOUT)
+    :return: The timeout in seconds, or None if it is disabled
+    """
+    timeout = GIT_TIMEOUT if timeout is None else timeout
+    return timeout if timeout > 0 else None
+
+
+async def spawn(command: list[str], cwd: str, **kwargs) -> asyncio.subprocess.Process:
+    """
+    Start a process in a new process group, so that it can be killed along with its children
+    :param command: The command to run
+    :param cwd: The working directory of the process
+    :param kwargs: The other arguments of asyncio.create_subprocess_exec (e.g. stdin, stdout)
+    :return: The running process
+    """
+    return await asyncio.create_subprocess_exec(*command, cwd=cwd, start_new_session=True, **kwargs)
+
+
+def kill(process: asyncio.subprocess.Process):
+    """
+    Kill the process group of a process that is still running, without waiting for it
+    :param process: A process started by spawn
+    """
+    if process.returncode is not None:
+        return
+    try:
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def run_git(args: list[str], cwd: str, check: bool = False, input: Optional[str] = None,
+                  timeout: Optional[float] = None, text: bool = True) -> subprocess.CompletedProcess:
+    """
+    Run a git command without blocking the event loop
+    :param args: The arguments passed to git (e.g. ['diff', '--stat', 'main...HEAD'])
+    :param cwd: The working directory in which git is executed
+    :param check: Raise a CalledProcessError if git exits with a non-zero code (default = False)
+    :param input: The text written to the stdin of git (default = no input)
+    :param timeout: Maximum duration of the command in seconds (default = GIT_TIMEOUT, 0 disables it)
+    :param text: Decode the stdout of git (default = True, e.g. False to read the content of blobs)
+    :return: The completed process with its stdout (decoded if text) and its decoded stderr
+    :raise TimeoutExpired: If git did not complete within the timeout (it is killed)
+    """
+    command = ['git', *args]
+    timeout = resolve_timeout(timeout)
+    async with get_git_semaphore():
+        process = await spawn(
+            command, cwd,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            async with asyncio.timeout(timeout):
+                stdout, stderr = await process.communicate(input.encode('utf-8') if input is not None else None)
+        except TimeoutError:
+            await _terminate(process)
+            raise subprocess.TimeoutExpired(command, timeout)
+        except BaseException:
+            await _terminate(process)
+            raise
+
+    result = subprocess.CompletedProcess(
+        command,
+        process.returncode,
+        stdout.decode('utf-8', errors='replace') if text else stdout,
+        stderr.decode('utf-8', errors='replace')
+    )
+    if check:
+        result.check_returncode()
+    return result
+
+
+@asynccontextmanager
+async def stream_git(args: list[str], cwd: str, timeout: Optional[float] = None,
+                     semaphore: Optional[asyncio.Semaphore] = None) -> AsyncIterator[asyncio.subprocess.Process]:
+    """
+    Run a git command whose stdout is consumed as a stream.
+    The process is terminated when leaving the context before its output has been fully read.
+    :param args: The arguments passed to git
+    :param cwd: The working directory in which git is executed
+    :param timeout: Maximum duration of the command in seconds (default = GIT_TIMEOUT, 0 disables it), after which
+    git is killed and its stdout ends
+    :param semaphore: The semaphore bounding the number of such processes (default = the semaphore of all the git
+    processes, see get_git_semaphore)
+    :return: The running git process
+    :raise TimeoutExpired: If git was killed by the timeout before its output was fully read
+    """
+    command = ['git', *args]
+    timeout = resolve_timeout(timeout)
+    async with semaphore or get_git_semaphore():
+        process = await spawn(
+            command, cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        timed_out = False
+
+        def expire():
+            nonlocal timed_out
+            timed_out = True
+            kill(process)
+
+        watchdog = asyncio.get_running_loop().call_later(timeout, expire) if timeout is not None else None
+        try:
+            try:
+                yield process
+            except Exception:
+                await _terminate(process)
+                # The output of a killed process is truncated, which is the actual cause of the error
+                if timed_out:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                raise
+            except BaseException:
+                await _terminate(process)
+                raise
+
+            # Stop git if the caller did not need the rest of its output
+            if not process.stdout.at_eof():
+                await _terminate(process)
+                return
+
+            stderr = await process.stderr.read()
+            await process.wait()
+            if timed_out:
+                raise subprocess.TimeoutExpired(command, timeout)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, command,
+                                                    stderr=stderr.decode('utf-8', errors='replace'))
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """
+    Kill the process group of a git process that is still running and reap it
+    (the group is killed before awaiting, so that it is killed even if the caller is cancelled again)
+    :param process: The git process
+    """
+    kill(process)
+    await asyncio.shield(process.wait())
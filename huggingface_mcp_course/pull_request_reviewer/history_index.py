@@ -0,0 +1,163 @@
+"""
+Persistent index of the history of the base branches analyzed by the Pull Request agent.
+The index counts, for each path, the commits of the base branch touching it and the time of the last one, which tells
+how "hot" a file is, and the commits of each author under each path prefix, which tells who owns it (see ownership),
+along with the CODEOWNERS file of the branch. It is built once from the most recent commits of the branch (a single
+`git log --numstat`), then updated with the commits added to the branch since the last indexed commit, so the whole
+log is never walked again. The most recently used indexes are also kept decoded in memory, so that they are only read
+from disk once per process, and an index too large for the on-disk cache is not rebuilt on every call.
+"""
+import asyncio
+from collections import OrderedDict
+import logging
+import os
+import subprocess
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, git_runner, ownership, repo_state
+from huggingface_mcp_course.utils import asyncutils
+
+# Namespace of the indexes in the on-disk cache, keyed by base branch
+HISTORY_NAMESPACE = 'history-v2'
+
+# Maximum number of commits indexed when an index is built from scratch
+HISTORY_MAX_COMMITS = int(os.getenv('PR_AGENT_HISTORY_MAX_COMMITS', '5000'))
+
+# Maximum number of indexes kept decoded in memory
+HISTORY_MEMORY_INDEXES = 16
+
+# Commits start with \x01, followed by their SHA, commit time, author email and author name
+LOG_FORMAT = '%x01%H %ct %aE %aN'
+
+logger = logging.getLogger(__name__)
+
+# Decoded indexes by path of their on-disk cache and base branch, the most recently used last
+_indexes: OrderedDict[tuple[str, str], dict] = OrderedDict()
+
+
+async def read_history(cwd: str, args: list[str]) -> list[dict]:
+    """
+    Read the commits of a revision range with the lines they changed in each file
+    :param cwd: The working directory of the git repository
+    :param args: The revision range and limits passed to git log (e.g. ['--max-count=10', 'main'])
+    :return: The "sha", commit "time", author "email" and "name" of each commit, the newest first, with its changed
+    "files" as [path, additions, deletions] (binary files have no lines)
+    """
+    result = await git_runner.run_git(['log', '-z', '--numstat', '--no-renames', f'--format={LOG_FORMAT}', *args],
+                                      cwd, check=True)
+    commits = []
+    for record in result.stdout.split('\x01')[1:]:
+        # The header is followed by a NUL, then by the NUL-terminated numstat records
+        header, _, body = record.partition('\0')
+        sha, time, email, name = header.split(' ', 3)
+        files = []
+        for entry in body.lstrip('\n').split('\0'):
+            if entry:
+                additions, deletions, path = entry.split('\t', 2)
+                files.append([path, int(additions) if additions.isdigit() else 0,
+                              int(deletions) if deletions.isdigit() else 0])
+        commits.append({"sha": sha, "time": int(time), "email": email, "name": name, "files": files})
+    return commits
+
+
+def apply_commits(index: dict, commits: list[dict]):
+    """
+    Add commits to an index
+    :param index: The index (see update_index)
+    :param commits: The commits read by read_history, not indexed yet
+    """
+    files = index["files"]
+    owners = index["owners"]
+    for commit in commits:
+        for path, _, _ in commit["files"]:
+            count, last_time = files.get(path, (0, 0))
+            files[path] = [count + 1, max(last_time, commit["time"])]
+
+        # Each prefix counts the commit once for its author, however many files it changed below it
+        email = commit["email"]
+        index["authors"][email] = commit["name"]
+        prefixes = {prefix for path, _, _ in commit["files"] for prefix in ownership.path_prefixes(path)}
+        for prefix in prefixes:
+            authors = owners.setdefault(prefix, {})
+            count, last_time = authors.get(email, (0, 0))
+            authors[email] = [count + 1, max(last_time, commit["time"])]
+        index["time"] = max(index["time"], commit["time"])
+    index["commits"] += len(commits)
+
+
+@asyncutils.single_flight()
+async def update_index(repository: repo_state.RepoState, disk_cache: analysis_cache.DiskCache, base_branch: str,
+                       tip_sha: str) -> dict:
+    """
+    Get the history index of a base branch, indexing the commits added to the branch since the last update
+    (concurrent updates of the same index share a single git log, and an index kept in memory is updated in place)
+    :param repository: The state of the git repository
+    :param disk_cache: The on-disk cache of the repository, in which the index is stored
+    :param base_branch: The name of the base branch
+    :param tip_sha: The SHA of the commit the base branch points to
+    :return: The index with the last indexed commit ("tip"), the number of indexed "commits", the time of the newest
+    one ("time"), for each path the number of commits touching it and the time of the last one ("files"), for each
+    path prefix the same by author email ("owners"), the name of each author ("authors") and the content of the
+    CODEOWNERS file of the branch ("codeowners", None if it has none)
+    """
+    # The index is only decoded from disk when it is not in memory
+    memory_key = (disk_cache.path, base_branch)
+    index = _indexes.get(memory_key)
+    if index is None:
+        index = await asyncio.to_thread(disk_cache.get, HISTORY_NAMESPACE, base_branch)
+    if index is not None and index["tip"] == tip_sha:
+        remember_index(memory_key, index)
+        return index
+
+    # The branch was fast-forwarded: only its new commits are read, otherwise (e.g. force-push) the index is rebuilt
+    cwd = repository.toplevel
+    args = None
+    if index is not None:
+        try:
+            if await repository.merge_base(index["tip"], tip_sha) == index["tip"]:
+                args = [f'{index["tip"]}..{tip_sha}']
+        except subprocess.CalledProcessError:
+            # The last indexed commit no longer exists
+            pass
+    if args is None:
+        index = new_index()
+        args = [f'--max-count={HISTORY_MAX_COMMITS}', tip_sha]
+    commits, index["codeowners"] = await asyncio.gather(read_history(cwd, args),
+                                                        ownership.read_codeowners(cwd, tip_sha))
+    apply_commits(index, commits)
+    index["tip"] = tip_sha
+    remember_index(memory_key, index)
+    if not await asyncio.to_thread(disk_cache.put, HISTORY_NAMESPACE, base_branch, index):
+        logger.warning('The history index of %s (%d commits) exceeds the size of the on-disk cache, it is only kept '
+                       'in memory', base_branch, index["commits"])
+    return index
+
+
+def remember_index(memory_key: tuple[str, str], index: dict):
+    """
+    Keep an index decoded in memory, forgetting the least recently used ones beyond HISTORY_MEMORY_INDEXES
+    :param memory_key: The path of the on-disk cache of the index and its base branch
+    :param index: The index
+    """
+    _indexes[memory_key] = index
+    _indexes.move_to_end(memory_key)
+    while len(_indexes) > HISTORY_MEMORY_INDEXES:
+        _indexes.popitem(last=False)
+
+
+def new_index() -> dict:
+    """
+    :return: An empty history index
+    """
+    return {"tip": None, "commits": 0, "time": 0, "files": {}, "owners": {}, "authors": {}, "codeowners": None}
+
+
+def file_history(index: dict, path: str) -> Optional[tuple[int, int]]:
+    """
+    :param index: A history index
+    :param path: The path of a file
+    :return: The number of indexed commits touching the file and the time of the last one, or None if it was never
+    touched
+    """
+    history = index["files"].get(path)
+    return tuple(history) if history is not None else None
@@ -0,0 +1,88 @@
+"""
+Incremental re-analysis of a branch that gained commits since its previous analysis.
+Only the paths touched by the new commits are diffed again against the merge-base: the other files keep their
+previous entries, since their content did not change. The cost of a re-analysis depends on the size of the push
+rather than on the size of the whole change.
+"""
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, diff_packer
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+from huggingface_mcp_course.pull_request_reviewer.path_filters import PathScope
+
+# Maximum number of paths diffed again, larger pushes are analyzed from scratch
+INCREMENTAL_MAX_PATHS = 1000
+
+
+def sort_files(files: list[FileChange]) -> list[FileChange]:
+    """
+    :param files: Changed files
+    :return: The files in the order of git diff (by path)
+    """
+    return sorted(files, key=lambda file: file.path.encode('utf-8'))
+
+
+async def update_files(cwd: str, previous_files: list[FileChange], merge_base_sha: str, old_head_sha: str,
+                       new_head_sha: str, scope: Optional[PathScope] = None) -> Optional[list[FileChange]]:
+    """
+    Update the changed files of a previous analysis with the commits added on top of it
+    :param cwd: The working directory of the git repository
+    :param previous_files: The changed files between the merge-base and the previous head
+    :param merge_base_sha: The SHA of the merge-base, shared by both analyses
+    :param old_head_sha: The SHA of the previously analyzed head, an ancestor of the new head
+    :param new_head_sha: The SHA of the new head
+    :param scope: The scope of the diff (default = the whole repository)
+    :return: The changed files between the merge-base and the new head, or None if too many paths were touched
+    """
+    scope = scope or PathScope()
+    pushed = (await diff_engine.read_diff(f'{old_head_sha}..{new_head_sha}', cwd, include_patch=False,
+                                          pathspecs=scope.pathspecs()))["files"]
+    paths = {path for file in pushed for path in (file.path, file.old_path) if path is not None}
+
+    # Renames are only detected between diffed paths: keep the previous renames together, and pair the new files
+    # with the previous deletions (and vice versa)
+    added = any(file.status == 'A' for file in pushed)
+    deleted = any(file.status == 'D' for file in pushed)
+    for file in previous_files:
+        if file.path in paths or file.old_path in paths or (added and file.status == 'D') or \
+                (deleted and file.status == 'A'):
+            paths.update(path for path in (file.path, file.old_path) if path is not None)
+    if len(paths) > INCREMENTAL_MAX_PATHS:
+        return None
+    if not paths:
+        return previous_files
+
+    # The include globs would add to the literal paths, which are already within the scope
+    refreshed = (await diff_engine.read_diff(f'{merge_base_sha}...{new_head_sha}', cwd, include_patch=False,
+                                             paths=sorted(paths), pathspecs=scope.exclude_pathspecs()))["files"]
+    kept = [file for file in previous_files if file.path not in paths and file.old_path not in paths]
+    return sort_files(kept + refreshed)
+
+
+async def pack_diff(cwd: str, files: list[FileChange], revision_range: str,
+                    max_lines: int) -> tuple[str, list[dict], bool]:
+    """
+    Pack the diff of known changed files, reading only the patches of the files worth packing
+    (the hunks of the files whose patch is read are set)
+    :param cwd: The working directory of the git repository
+    :param files: The changed files of the revision range
+    :param revision_range: The revision range to compare
+    :param max_lines: Maximum number of lines of the packed diff
+    :return: The packed diff, the manifest of the omitted files and whether the diff is partial (git took too long)
+    """
+    selected = diff_packer.plan_files(files)
+    paths = sorted({path for index in selected for path in (files[index].path, files[index].old_path)
+                    if path is not None})
+    diff = {"files": [], "patch": '', "omitted": [], "partial": False}
+    if paths:
+        diff = await diff_engine.read_diff(revision_range, cwd, max_lines=max_lines, paths=paths)
+    positions = {file.path: position for position, file in enumerate(files)}
+    for file in diff["files"]:
+        if file.hunks is not None and file.path in positions:
+            files[positions[file.path]].hunks = file.hunks
+
+    # The files that were not read are omitted as well
+    omitted = diff["omitted"] + [diff_packer.manifest_entry(file) for index, file in enumerate(files)
+                                 if index not in selected]
+    omitted.sort(key=lambda entry: positions.get(entry["path"], len(files)))
+    return diff["patch"], omitted, diff["partial"]
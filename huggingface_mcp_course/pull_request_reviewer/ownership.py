@@ -0,0 +1,155 @@
+"""
+Code ownership of the repositories analyzed by the Pull Request agent, used to suggest reviewers.
+The history index (see history_index) weighs the authors of each path prefix (the file and its nearest directories)
+by the number of commits of the base branch they made under it, decayed by their age. The CODEOWNERS file of the base
+branch is stored in the same index, so reviewers are suggested from the index alone, without running git blame.
+"""
+import functools
+import re
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import git_runner
+
+# Locations of the CODEOWNERS file, in the order GitHub looks for them
+CODEOWNERS_PATHS = ('.github/CODEOWNERS', 'CODEOWNERS', 'docs/CODEOWNERS')
+
+# Number of directories above a file whose authors are indexed
+OWNER_PREFIX_DEPTH = 3
+
+# Decay of the weight of the authors of a directory for each level above the changed file
+PREFIX_DECAY = 0.5
+
+# Age in days after which the weight of a commit is halved, relative to the newest indexed commit
+OWNERSHIP_HALF_LIFE_DAYS = 180
+
+# Weight of a CODEOWNERS owner for each changed file it owns (the history weighs at most 1 per prefix and file)
+CODEOWNER_WEIGHT = 1.0
+
+# Default number of suggested reviewers
+REVIEWERS_LIMIT = 3
+
+# Wildcards of the CODEOWNERS patterns
+WILDCARD_PATTERN = re.compile(r'(\*\*/|\*\*|\*|\?)')
+WILDCARDS = {'**/': '(.*/)?', '**': '.*', '*': '[^/]*', '?': '[^/]'}
+
+
+def path_prefixes(path: str) -> list[str]:
+    """
+    :param path: The path of a file, relative to the root of the repository
+    :return: The prefixes of the path whose authors are indexed: the path itself, then its nearest directories
+    """
+    parts = path.split('/')
+    return [path] + ['/'.join(parts[:end]) for end in range(len(parts) - 1, 0, -1)][:OWNER_PREFIX_DEPTH]
+
+
+def compile_pattern(pattern: str) -> re.Pattern:
+    """
+    Compile a CODEOWNERS pattern, which follows the rules of .gitignore patterns
+    :param pattern: The pattern, e.g. "*.js", "/build/logs/" or "docs/**/*.md"
+    :return: A regular expression matching the paths of the files covered by the pattern
+    """
+    # A pattern with a slash before its end is relative to the root, otherwise it matches at any depth
+    anchored = '/' in pattern.rstrip('/')
+    body = ''.join(WILDCARDS.get(token) or re.escape(token)
+                   for token in WILDCARD_PATTERN.split(pattern.strip('/')) if token)
+    # A pattern matches the files below the directories it matches, a trailing slash only matches directories
+    suffix = '/.*' if pattern.endswith('/') else '(/.*)?'
+    return re.compile(('' if anchored else '(.*/)?') + body + suffix)
+
+
+@functools.lru_cache(maxsize=32)
+def parse_codeowners(text: str) -> tuple[tuple[re.Pattern, tuple[str, ...]], ...]:
+    """
+    Parse a CODEOWNERS file
+    :param text: The content of the file
+    :return: The compiled pattern and the owners of each rule, in the order of the file
+    """
+    rules = []
+    for line in text.splitlines():
+        # Comments start with "#", a rule without owners removes the owners of the files it matches
+        tokens = line.split('#', 1)[0].split()
+        if tokens:
+            rules.append((compile_pattern(tokens[0]), tuple(tokens[1:])))
+    return tuple(rules)
+
+
+def owners_of(rules: tuple, path: str) -> tuple[str, ...]:
+    """
+    :param rules: The rules of a CODEOWNERS file (see parse_codeowners)
+    :param path: The path of a file, relative to the root of the repository
+    :return: The owners of the file, from the last matching rule (none if no rule matches)
+    """
+    for pattern, owners in reversed(rules):
+        if pattern.fullmatch(path):
+            return owners
+    return ()
+
+
+async def read_codeowners(cwd: str, revision: str) -> Optional[str]:
+    """
+    Read the CODEOWNERS file of a commit
+    :param cwd: The working directory of the git repository
+    :param revision: The commit
+    :return: The content of the first CODEOWNERS file found in CODEOWNERS_PATHS, or None if there is none
+    """
+    result = await git_runner.run_git(['ls-tree', '-z', revision, '--', *CODEOWNERS_PATHS], cwd, check=True)
+    # Each entry is "<mode> <type> <sha>\t<path>"
+    blobs = {}
+    for entry in result.stdout.split('\0'):
+        if entry:
+            header, path = entry.split('\t', 1)
+            blobs[path] = header.split(' ')[2]
+    for path in CODEOWNERS_PATHS:
+        if path in blobs:
+            return (await git_runner.run_git(['cat-file', 'blob', blobs[path]], cwd, check=True)).stdout
+    return None
+
+
+async def read_authors(cwd: str, revision_range: str) -> set[str]:
+    """
+    :param cwd: The working directory of the git repository
+    :param revision_range: The revision range of the changes (e.g. "<merge-base SHA>..<HEAD SHA>")
+    :return: The emails of the authors of the commits of the range
+    """
+    result = await git_runner.run_git(['log', '--format=%aE', revision_range], cwd, check=True)
+    return set(result.stdout.split())
+
+
+def suggest_reviewers(index: dict, paths: list[str], authors: set[str] = frozenset(),
+                      limit: int = REVIEWERS_LIMIT) -> list[dict]:
+    """
+    Rank the reviewers of changed files
+    :param index: The history index of the base branch (see history_index.update_index)
+    :param paths: The paths of the changed files
+    :param authors: The emails of the authors of the changes, who are not suggested
+    :param limit: The maximum number of reviewers (default = REVIEWERS_LIMIT)
+    :return: The "reviewer" (an author email, or a CODEOWNERS owner), their "name" if known, their "score", the
+    number of changed "files" they own or authored and whether they are a "codeowner", the best reviewer first
+    """
+    rules = parse_codeowners(index["codeowners"]) if index["codeowners"] else ()
+    half_life = OWNERSHIP_HALF_LIFE_DAYS * 86400
+    scores = {}
+    files = {}
+    codeowners = set()
+    for path in paths:
+        weights = {}
+        for owner in owners_of(rules, path):
+            weights[owner] = CODEOWNER_WEIGHT
+            codeowners.add(owner)
+
+        # The authors of each prefix share a weight, decayed for the directories above the file
+        for depth, prefix in enumerate(path_prefixes(path)):
+            prefix_authors = {email: count * 0.5 ** ((index["time"] - last_time) / half_life)
+                              for email, (count, last_time) in index["owners"].get(prefix, {}).items()}
+            total = sum(prefix_authors.values()) or 1
+            for email, weight in prefix_authors.items():
+                weights[email] = weights.get(email, 0) + PREFIX_DECAY ** depth * weight / total
+
+        for reviewer, weight in weights.items():
+            if reviewer not in authors:
+                scores[reviewer] = scores.get(reviewer, 0) + weight
+                files[reviewer] = files.get(reviewer, 0) + 1
+
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+    return [{"reviewer": reviewer, "name": index["authors"].get(reviewer), "score": round(score, 3),
+             "files": files[reviewer], "codeowner": reviewer in codeowners} for reviewer, score in ranked]
@@ -0,0 +1,285 @@
+"""
+Parallel diff engine for the Pull Request agent, for change sets touching thousands of files.
+A first git diff without patch lists the changed files, which are split into contiguous shards of similar size in git
+order. The patch of each shard is generated by its own git process, limited to the literal paths of the shard, and the
+outputs are reassembled in git order: the packed diff and the stored patch are the same as with the single-pass engine.
+If git pairs the renames of a shard differently than for the whole change set, the single-pass engine is used instead.
+"""
+import asyncio
+import os
+import shutil
+from typing import BinaryIO, Optional
+import weakref
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, diff_packer, git_runner
+from huggingface_mcp_course.pull_request_reviewer.diff_engine import DiffReader, FilesCallback
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+from huggingface_mcp_course.pull_request_reviewer.diff_store import DiffStore
+
+# Maximum number of git processes generating the patches of the shards, shared by all the change sets
+# (they have their own limit, so that they use all the cores without taking the slots of PR_AGENT_GIT_CONCURRENCY
+# from the other git commands)
+DIFF_WORKERS = int(os.getenv('PR_AGENT_DIFF_WORKERS', str(os.cpu_count() or 1)))
+
+# Minimum number of files per shard, below which starting another git process is not worth it
+MIN_SHARD_FILES = 64
+
+# Weight of each file when balancing the shards, in changed lines (git also has a fixed cost per file)
+FILE_WEIGHT = 20
+
+
+# One semaphore per event loop (asyncio primitives cannot be shared between loops)
+_semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_shard_semaphore() -> asyncio.Semaphore:
+    """
+    Get the semaphore bounding the number of concurrent git processes generating the patches of shards
+    :return: The semaphore associated with the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DIFF_WORKERS)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+class ShardMismatchError(Exception):
+    """
+    The files of a shard differ from the ones listed for the whole change set (renames paired differently)
+    """
+
+
+def split_shards(files: list[FileChange], workers: int = DIFF_WORKERS,
+                 min_files: int = MIN_SHARD_FILES) -> list[range]:
+    """
+    Split the changed files into contiguous shards with a similar number of changed lines
+    :param files: The changed files, in git order
+    :param workers: The maximum number of shards (default = DIFF_WORKERS)
+    :param min_files: The minimum number of files per shard (default = MIN_SHARD_FILES)
+    :return: The ranges of file indexes of the shards, in git order (none without files)
+    """
+    count = max(1, min(workers, len(files) // min_files))
+    weights = [file.changed_lines + FILE_WEIGHT for file in files]
+    total = sum(weights)
+    shards = []
+    start = 0
+    weight = 0
+    for index, file_weight in enumerate(weights):
+        weight += file_weight
+        # Close the shard once it reaches its share of the total weight
+        if len(shards) < count - 1 and weight * count >= total * (len(shards) + 1):
+            shards.append(range(start, index + 1))
+            start = index + 1
+    shards.append(range(start, len(files)))
+    return [shard for shard in shards if shard]
+
+
+async def read_diff(revision_range: str, cwd: str, max_lines: int = 500,
+                    max_tokens: int = diff_packer.DIFF_TOKEN_BUDGET, max_bytes: int = diff_engine.MAX_DIFF_BYTES,
+                    store: Optional[DiffStore] = None, store_key: Optional[str] = None,
+                    pathspecs: Optional[list[str]] = None, on_files: Optional[FilesCallback] = None,
+                    workers: int = DIFF_WORKERS) -> dict:
+    """
+    Generate the patch of a revision range with several git processes and pack its most relevant part within budget,
+    like diff_engine.read_diff
+    :param revision_range: The revision range to compare (e.g. "main...HEAD")
+    :param cwd: The working directory in which git is executed
+    :param max_lines: Maximum number of patch lines to include (default = 500)
+    :param max_tokens: Maximum number of patch tokens to include (default = DIFF_TOKEN_BUDGET)
+    :param max_bytes: Maximum number of patch bytes to read per shard (default = MAX_DIFF_BYTES)
+    :param store: The store in which the whole patch is materialized in the background if the packed diff is truncated
+    or partial (optional)
+    :param store_key: The key of the patch in the store (required with store)
+    :param pathspecs: Git pathspecs scoping the diff, and the stored patch (optional)
+    :param on_files: Coroutine function called with the changed files as soon as they are listed (optional)
+    :param workers: The maximum number of git processes generating the patch (default = DIFF_WORKERS)
+    :return: A dictionary with the changed "files", the "patch" text, whether it was "truncated", the manifest of
+    the "omitted" files and whether the patch is "partial" (git took too long, the patches read so far are packed)
+    """
+    # The packed diff is returned as soon as it is ready, while the rest of the patch is materialized in the background
+    ready = asyncio.get_running_loop().create_future()
+    task = asyncio.create_task(_read_diff(revision_range, cwd, (max_lines, max_tokens, max_bytes, ready), store,
+                                          store_key, pathspecs, on_files, workers))
+    if store is not None:
+        store.pending[store_key] = task
+        task.add_done_callback(lambda _: store.pending.pop(store_key) if store.pending.get(store_key) is task
+                               else None)
+    try:
+        return await ready
+    except asyncio.CancelledError:
+        # The request was cancelled before its diff was packed, git is stopped right away
+        task.cancel()
+        raise
+
+
+async def _read_diff(revision_range: str, cwd: str, packing: tuple, store: Optional[DiffStore],
+                     store_key: Optional[str], pathspecs: Optional[list[str]], on_files: Optional[FilesCallback],
+                     workers: int):
+    """
+    List the changed files, read the patches of their shards in parallel, pack the diff and store the whole patch
+    :param revision_range: The revision range to compare
+    :param cwd: The working directory in which git is executed
+    :param packing: The max_lines, max_tokens and max_bytes budgets of read_diff and the future receiving its result
+    :param store: The store in which the whole patch is materialized, or None
+    :param store_key: The key of the patch in the store
+    :param pathspecs: Git pathspecs scoping the diff (optional)
+    :param on_files: Coroutine function called with the changed files as soon as they are listed (optional)
+    :param workers: The maximum number of git processes generating the patch
+    """
+    max_lines, max_tokens, max_bytes, ready = packing
+    spools = []
+    tasks = []
+    try:
+        deadline = diff_engine.partial_deadline()
+        files = (await diff_engine.read_diff(revision_range, cwd, include_patch=False, pathspecs=pathspecs))["files"]
+        if on_files is not None:
+            await on_files(files)
+
+        # Each shard reads the selected patches within its range, then the rest of its patch if it is stored
+        selected = diff_packer.plan_files(files, max_tokens)
+        shards = split_shards(files, workers, MIN_SHARD_FILES)
+        loop = asyncio.get_running_loop()
+        packed = [loop.create_future() for _ in shards]
+        spools = [store.create_spool() if store is not None else None for _ in shards]
+        tasks = [asyncio.create_task(_read_shard(revision_range, cwd, files, shard, selected, max_bytes, deadline,
+                                                 spool, shard_packed))
+                 for shard, spool, shard_packed in zip(shards, spools, packed)]
+        results = await asyncio.gather(*packed, return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if any(isinstance(error, ShardMismatchError) for error in errors):
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            tasks = []
+            await _fall_back(revision_range, cwd, packing, store, store_key, pathspecs)
+            return
+        if errors:
+            raise errors[0]
+
+        patches = {}
+        for shard_patches, _ in results:
+            patches.update(shard_patches)
+        patch, omitted = diff_packer.pack(files, patches, max_lines, max_tokens)
+        partial = any(timed_out for _, timed_out in results)
+        if not ready.done():
+            ready.set_result({"files": files, "patch": patch, "truncated": bool(omitted), "omitted": omitted,
+                              "partial": partial})
+        # Nothing was left out of the packed diff, the git processes of the shards are stopped at the budget
+        if not omitted and not partial:
+            return
+
+        # Reassemble the patches of the shards in git order
+        indexes = await asyncio.gather(*tasks)
+        if store is not None:
+            await asyncio.to_thread(_commit, store, store_key, spools, shards, indexes)
+            spools = []
+    except asyncio.CancelledError:
+        ready.cancel()
+        raise
+    except Exception as e:
+        if not ready.done():
+            ready.set_exception(e)
+    finally:
+        # The git processes of the shards are stopped before their spools are deleted
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for spool in spools:
+            if spool is not None:
+                store.discard(spool)
+
+
+async def _read_shard(revision_range: str, cwd: str, files: list[FileChange], shard: range, selected: set[int],
+                      max_bytes: int, deadline: Optional[float], spool: Optional[BinaryIO],
+                      packed: asyncio.Future) -> list[dict]:
+    """
+    Read the patch of a shard with its own git process
+    :param revision_range: The revision range to compare
+    :param cwd: The working directory in which git is executed
+    :param files: The changed files of the whole change set (the hunks of the files of the shard are set)
+    :param shard: The range of the indexes of the files of the shard
+    :param selected: The indexes of the files whose patch is packed, in the whole change set
+    :param max_bytes: Maximum number of bytes of patch to keep
+    :param deadline: The event loop time at which reading stops (default = no deadline)
+    :param spool: A file in which the whole patch of the shard is written, or None to only read the selected patches
+    :param packed: The future receiving the selected patches, by index in the whole change set, and whether reading
+    them timed out
+    :return: The byte ranges of the patch of each file of the shard and of its hunks, relative to the shard
+    """
+    try:
+        paths = [path for file in files[shard.start:shard.stop] for path in (file.path, file.old_path)
+                 if path is not None]
+        async with git_runner.stream_git(diff_engine.build_diff_args(revision_range, paths=paths), cwd,
+                                         semaphore=get_shard_semaphore()) as process:
+            reader = DiffReader(process.stdout, spool)
+            shard_files = await reader.read_files()
+            expected = files[shard.start:shard.stop]
+            if [(file.status, file.path) for file in shard_files] != [(file.status, file.path) for file in expected]:
+                raise ShardMismatchError(f'Files of the shard {shard.start}-{shard.stop} differ from the change set')
+
+            # The hunks are set on the files of the whole change set
+            reader.files = expected
+            patches = await reader.read_patches({index - shard.start for index in selected if index in shard},
+                                                max_bytes, deadline)
+            packed.set_result(({shard.start + index: patch for index, patch in patches.items()}, reader.timed_out))
+            if spool is not None:
+                await reader.drain()
+        return reader.index
+    except asyncio.CancelledError:
+        if not packed.done():
+            packed.cancel()
+        raise
+    except Exception as e:
+        if not packed.done():
+            packed.set_exception(e)
+        raise
+
+
+async def _fall_back(revision_range: str, cwd: str, packing: tuple, store: Optional[DiffStore],
+                     store_key: Optional[str], pathspecs: Optional[list[str]]):
+    """
+    Pack (and store) the diff with the single-pass engine
+    :param revision_range: The revision range to compare
+    :param cwd: The working directory in which git is executed
+    :param packing: The max_lines, max_tokens and max_bytes budgets of read_diff and the future receiving its result
+    :param store: The store in which the whole patch is materialized, or None
+    :param store_key: The key of the patch in the store
+    :param pathspecs: Git pathspecs scoping the diff (optional)
+    """
+    max_lines, max_tokens, max_bytes, ready = packing
+    if store is not None:
+        # The single-pass task replaces this one as the pending patch, and resolves the packed diff
+        await diff_engine.materialize_diff(revision_range, cwd, store, store_key, packing, pathspecs)
+        return
+    ready.set_result(await diff_engine.read_diff(revision_range, cwd, max_lines=max_lines, max_tokens=max_tokens,
+                                                 max_bytes=max_bytes, pathspecs=pathspecs))
+
+
+def _commit(store: DiffStore, store_key: str, spools: list[BinaryIO], shards: list[range], indexes: list[list[dict]]):
+    """
+    Concatenate the patches of the shards and store them with their index
+    :param store: The store in which the whole patch is materialized
+    :param store_key: The key of the patch in the store
+    :param spools: The spool files of the shards, in git order
+    :param shards: The ranges of the indexes of the files of the shards
+    :param indexes: The byte ranges of the patch of each file of the shards, relative to their shard
+    """
+    spool = store.create_spool()
+    try:
+        index = []
+        for shard, shard_spool, shard_index in zip(shards, spools, indexes):
+            offset = spool.tell()
+            shard_spool.seek(0)
+            shutil.copyfileobj(shard_spool, spool)
+            for entry in shard_index:
+                index.append({**entry, "file": shard.start + entry["file"], "offset": offset + entry["offset"],
+                              "hunks": [[offset + start, length] for start, length in entry["hunks"]]})
+        store.commit(store_key, spool, index)
+    except BaseException:
+        store.discard(spool)
+        raise
+    finally:
+        for shard_spool in spools:
+            store.discard(shard_spool)
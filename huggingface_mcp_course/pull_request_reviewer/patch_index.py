@@ -0,0 +1,110 @@
+"""
+Per-commit analysis of the commits of a branch, indexed by the blob pairs of each commit.
+A rebase changes the SHAs of all the commits of a branch, but not the blobs of the files that only the branch changed:
+the modes, blob SHAs, statuses and paths printed by `git diff-tree --raw` (without running any diff) identify the
+changes of a commit, so the file statistics and categories of the rebased commits are read from the index instead of
+being computed again. Only the commits whose blob pairs were never seen are diffed (e.g. new commits, or commits
+changing files that the base branch also changed).
+"""
+import asyncio
+import hashlib
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, diff_packer, git_runner
+
+# Namespace of the per-commit analyses in the on-disk cache, keyed by the hash of the blob pairs of the commit
+CHANGES_NAMESPACE = 'commit-changes'
+
+# Namespace of the keys of the commits in the on-disk cache, keyed by commit SHA (empty for commits without changes)
+COMMIT_KEYS_NAMESPACE = 'commit-keys'
+
+
+async def compute_change_keys(cwd: str, commit_shas: list[str]) -> dict[str, str]:
+    """
+    Compute the keys of the changes of commits, from the raw records of git diff-tree (no patch is generated)
+    :param cwd: The working directory of the git repository
+    :param commit_shas: The SHAs of the commits
+    :return: The hash of the raw records of each commit by SHA (empty for commits without changes, e.g. merges)
+    """
+    if not commit_shas:
+        return {}
+    result = await git_runner.run_git(['diff-tree', '--stdin', '-r', '--root', '-M', '--raw', '-z', '--no-abbrev'],
+                                      cwd, check=True, input='\n'.join(commit_shas) + '\n')
+    # The output is the SHA of each commit followed by its raw records, all terminated by NUL
+    # (":<old mode> <new mode> <old sha> <new sha> <status>" followed by 1 or 2 paths)
+    records = {sha: [] for sha in commit_shas}
+    tokens = iter(result.stdout.split('\0'))
+    current = None
+    for token in tokens:
+        if token.startswith(':'):
+            paths = [next(tokens, '') for _ in range(2 if token.split(' ')[-1][0] in 'RC' else 1)]
+            if current is not None:
+                current.append('\0'.join([token, *paths]))
+        elif token:
+            current = records.get(token)
+    return {sha: hashlib.sha1('\0'.join(lines).encode()).hexdigest() if lines else ''
+            for sha, lines in records.items()}
+
+
+async def compute_commit_changes(cwd: str, commit_shas: list[str]) -> dict[str, dict]:
+    """
+    Compute the changed files of commits from their numstat
+    :param cwd: The working directory of the git repository
+    :param commit_shas: The SHAs of the commits
+    :return: The changes of each commit by SHA: its changed "paths", their total "additions" and "deletions", and
+    the sorted "categories" of the paths (see diff_packer.categorize)
+    """
+    changes = {sha: {"paths": [], "additions": 0, "deletions": 0} for sha in commit_shas}
+    if commit_shas:
+        result = await git_runner.run_git(['diff-tree', '--stdin', '-r', '--root', '-M', '--numstat', '-z'], cwd,
+                                          check=True, input='\n'.join(commit_shas) + '\n')
+        # The output is the SHA of each commit followed by its numstat records, all terminated by NUL
+        # (a rename record has an empty path followed by the old and the new path)
+        tokens = iter(result.stdout.split('\0'))
+        current = None
+        for token in tokens:
+            additions, tab, rest = token.partition('\t')
+            if not tab:
+                current = changes.get(token)
+                continue
+            deletions, _, path = rest.partition('\t')
+            if not path:
+                next(tokens, None)
+                path = next(tokens, '')
+            if current is not None:
+                current["paths"].append(path)
+                # Binary files have no line counts
+                current["additions"] += int(additions) if additions.isdigit() else 0
+                current["deletions"] += int(deletions) if deletions.isdigit() else 0
+    for change in changes.values():
+        change["categories"] = sorted({diff_packer.categorize(path) for path in change["paths"]})
+    return changes
+
+
+async def analyze_commits(cwd: str, disk_cache: analysis_cache.DiskCache,
+                          commit_shas: list[str]) -> tuple[dict[str, dict], int]:
+    """
+    Analyze commits, reusing the analyses of the commits whose blob pairs were already analyzed
+    :param cwd: The working directory of the git repository
+    :param disk_cache: The on-disk cache of the repository, in which the keys and the analyses of the commits are
+    indexed
+    :param commit_shas: The SHAs of the commits
+    :return: The changes of each commit by SHA (see compute_commit_changes, merge commits have no changes), and the
+    number of commits whose changes were reused
+    """
+    # The key of a commit never changes, only the raw records of new commits are read
+    keys = await asyncio.to_thread(disk_cache.get_many, COMMIT_KEYS_NAMESPACE, commit_shas)
+    unknown = [sha for sha in commit_shas if sha not in keys]
+    computed = await compute_change_keys(cwd, unknown)
+    keys.update(computed)
+    await asyncio.to_thread(disk_cache.put_many, COMMIT_KEYS_NAMESPACE, computed)
+
+    # Commits with the same blob pairs (e.g. rebased or cherry-picked) share their analysis,
+    # only the commits whose changes were never seen are diffed
+    known = await asyncio.to_thread(disk_cache.get_many, CHANGES_NAMESPACE,
+                                    sorted({key for key in keys.values() if key}))
+    missing = [sha for sha in commit_shas if keys[sha] and keys[sha] not in known]
+    changes = await compute_commit_changes(cwd, missing)
+    await asyncio.to_thread(disk_cache.put_many, CHANGES_NAMESPACE, {keys[sha]: changes[sha] for sha in missing})
+    empty = {"paths": [], "additions": 0, "deletions": 0, "categories": []}
+    return {sha: changes[sha] if sha in changes else known.get(keys[sha], empty) for sha in commit_shas}, \
+        sum(1 for sha in commit_shas if keys[sha] in known)
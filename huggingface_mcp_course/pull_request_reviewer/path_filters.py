@@ -0,0 +1,154 @@
+"""
+Scope of the diffs analyzed by the Pull Request agent.
+Include and exclude globs are passed to git as pathspecs, so that the files a reviewer does not need (lockfiles,
+generated code, vendored directories...) are never diffed nor packed. Their defaults are read from the .pr-agent.json
+file at the root of the repository, e.g. {"include": ["src"], "exclude": ["*.lock", "vendor"]}.
+Each excluded group is summarized by its number of files and changed lines, from a single numstat of all the exclude
+globs grouped in Python: the lines of the excluded files are counted once, but their patch is never generated.
+"""
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import git_runner
+from huggingface_mcp_course.utils import ioutils
+
+# Configuration file of the repository, relative to its top-level directory
+CONFIG_FILE = '.pr-agent.json'
+
+
+class PathScope:
+    """
+    Include and exclude globs scoping a diff, relative to the top-level directory of the repository.
+    Globs follow git's pathspec wildcards: "*" also matches "/", and a directory matches all the files below it.
+    """
+    __slots__ = ('include', 'exclude')
+
+    def __init__(self, include: Optional[list[str]] = None, exclude: Optional[list[str]] = None):
+        """
+        :param include: Only diff the paths matching one of these globs (default = all the paths)
+        :param exclude: Never diff the paths matching one of these globs (default = no path)
+        """
+        self.include = list(include or [])
+        self.exclude = list(exclude or [])
+
+    @classmethod
+    async def load(cls, toplevel: str, include: Optional[list[str]] = None,
+                   exclude: Optional[list[str]] = None) -> 'PathScope':
+        """
+        Build the scope of a diff, taking the globs that are not given from the configuration file of the repository
+        :param toplevel: The top-level directory of the repository
+        :param include: The include globs, or None to use the configured ones
+        :param exclude: The exclude globs, or None to use the configured ones
+        :return: The scope of the diff
+        :raise ValueError: If the configuration file is invalid
+        """
+        config_path = os.path.join(toplevel, CONFIG_FILE)
+        if (include is None or exclude is None) and ioutils.file_exists(config_path):
+            config = await ioutils.read_file_json(config_path)
+            for name in ('include', 'exclude'):
+                globs = config.get(name, []) if isinstance(config, dict) else None
+                if not isinstance(globs, list) or not all(isinstance(glob, str) for glob in globs):
+                    raise ValueError(f'{CONFIG_FILE}: "{name}" must be a list of globs')
+            include = include if include is not None else config.get('include')
+            exclude = exclude if exclude is not None else config.get('exclude')
+        return cls(include, exclude)
+
+    @property
+    def key(self) -> str:
+        """
+        :return: A short digest identifying the scope in cache keys, or an empty string for the whole repository
+        """
+        if not self.include and not self.exclude:
+            return ''
+        return hashlib.sha1(json.dumps([self.include, self.exclude]).encode('utf-8')).hexdigest()[:12]
+
+    def pathspecs(self) -> list[str]:
+        """
+        :return: The git pathspecs of the scope
+        """
+        return [f':(top){glob}' for glob in self.include] + self.exclude_pathspecs()
+
+    def exclude_pathspecs(self) -> list[str]:
+        """
+        :return: The git pathspecs of the excluded globs only, which can be combined with literal paths
+        """
+        return [f':(top,exclude){glob}' for glob in self.exclude]
+
+
+def matches_glob(path: str, glob: str) -> bool:
+    """
+    :param path: A path relative to the top-level directory
+    :param glob: A glob relative to the top-level directory
+    :return: True if the glob matches the path like a git pathspec ("*" also matches "/", and a directory matches all
+    the files below it), False otherwise
+    """
+    glob = glob.rstrip('/')
+    return path == glob or path.startswith(f'{glob}/') or fnmatch.fnmatchcase(path, glob)
+
+
+async def read_changes(cwd: str, revision_range: str, globs: list[str], include: Optional[list[str]] = None,
+                       count_lines: bool = True) -> list[tuple[str, int]]:
+    """
+    List the files changed in the paths matching any of several globs with a single git invocation, without
+    generating their patch
+    :param cwd: The working directory of the git repository
+    :param revision_range: The revision range to compare
+    :param globs: Globs relative to the top-level directory
+    :param include: Only list the paths also matching one of these globs (default = all the paths)
+    :param count_lines: Count the changed lines of each file with --numstat, otherwise only list the files with
+    --name-only, which does not diff their content (default = True)
+    :return: The path and the number of changed lines of each changed file (0 for binary files, or without
+    count_lines)
+    """
+    if not globs:
+        return []
+    result = await git_runner.run_git(['diff', '--numstat' if count_lines else '--name-only', '-z', '--no-renames',
+                                       revision_range, '--', *[f':(top){glob}' for glob in globs]], cwd, check=True)
+    changes = []
+    # Each record is "<added>\t<deleted>\t<path>" with --numstat, or the path with --name-only
+    # (git pathspecs are alternatives, so the include globs are matched here rather than passed along the globs)
+    for record in result.stdout.split('\0'):
+        if record:
+            additions, deletions, path = record.split('\t', 2) if count_lines else ('', '', record)
+            if include and not any(matches_glob(path, include_glob) for include_glob in include):
+                continue
+            changes.append((path, int(additions) + int(deletions) if additions.isdigit() else 0))
+    return changes
+
+
+async def summarize_excluded(cwd: str, revision_range: str, scope: PathScope,
+                             previous: Optional[dict] = None, pushed_range: Optional[str] = None) -> dict:
+    """
+    Summarize the changes skipped by each exclude glob, within the include globs
+    (a file matching several globs is counted in each of their groups)
+    :param cwd: The working directory of the git repository
+    :param revision_range: The revision range of the diff
+    :param scope: The scope of the diff
+    :param previous: The summary of a previous head of the same branch, reused for the globs not touched since
+    (optional)
+    :param pushed_range: The revision range between the previous head and the new one (required with previous)
+    :return: The "pattern", number of "files" and of changed "lines" of each excluded group, as columns
+    """
+    stale = list(range(len(scope.exclude)))
+    counts = [(0, 0)] * len(scope.exclude)
+    if previous is not None and previous["pattern"] == scope.exclude:
+        # The files touched by the new commits are only listed, to find the groups to count again
+        pushed = await read_changes(cwd, pushed_range, scope.exclude, scope.include, count_lines=False)
+        counts = list(zip(previous["files"], previous["lines"]))
+        stale = [index for index, glob in enumerate(scope.exclude)
+                 if any(matches_glob(path, glob) for path, _ in pushed)]
+
+    # The lines of all the stale groups are counted by a single numstat, then grouped by glob
+    changes = await read_changes(cwd, revision_range, [scope.exclude[index] for index in stale], scope.include)
+    for index in stale:
+        group = [lines for path, lines in changes if matches_glob(path, scope.exclude[index])]
+        counts[index] = (len(group), sum(group))
+    return {
+        "pattern": scope.exclude,
+        "files": [files for files, _ in counts],
+        "lines": [lines for _, lines in counts]
+    }
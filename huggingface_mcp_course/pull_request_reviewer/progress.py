@@ -0,0 +1,124 @@
+"""
+Progress notifications of the analyses run by the Pull Request agent.
+Each notification carries a partial payload as compact JSON in its message, in this order: the changed files as soon
+as git lists them (their hunks are only known in the result), their statistics, then the packed diff in pages as soon
+as it is packed, while the commit log and the excluded files are still being read.
+A client can start working on the file list while the patch is still being generated, and clients that ignore
+progress still get the whole analysis in the result.
+"""
+import json
+from typing import Optional
+
+from mcp.server.fastmcp import Context
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, diff_model
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+# Maximum number of bytes of diff per notification
+PROGRESS_PAGE_BYTES = 16 * 1024
+
+# Stages of an analysis, in the order in which they are notified
+FILES = 'files'
+STATISTICS = 'statistics'
+DIFF = 'diff'
+
+
+def split_pages(text: str, max_bytes: int = PROGRESS_PAGE_BYTES) -> list[str]:
+    """
+    Split a text into pages, on line boundaries whenever possible
+    :param text: The text to split
+    :param max_bytes: Maximum number of UTF-8 bytes per page (default = PROGRESS_PAGE_BYTES)
+    :return: The pages of the text (none for an empty text)
+    """
+    pages = []
+    page = []
+    size = 0
+    for line in text.splitlines(keepends=True):
+        length = len(line.encode('utf-8'))
+        if page and size + length > max_bytes:
+            pages.append(''.join(page))
+            page = []
+            size = 0
+        page.append(line)
+        size += length
+    if page:
+        pages.append(''.join(page))
+    return pages
+
+
+class AnalysisProgress:
+    """
+    Sender of the progress notifications of an analysis, each stage being sent once
+    """
+
+    def __init__(self, ctx: Optional[Context] = None):
+        """
+        :param ctx: The context of the MCP request, or None to send nothing
+        """
+        self.ctx = ctx
+        self.progress = 0
+        self.sent = set()
+
+    async def _notify(self, payload: dict):
+        """
+        Send a progress notification carrying a partial payload
+        (nothing is sent if the client did not ask for progress)
+        :param payload: The partial payload
+        """
+        self.progress += 1
+        await self.ctx.report_progress(self.progress, None, json.dumps(payload, separators=(',', ':')))
+
+    async def files(self, files: list[FileChange]):
+        """
+        Notify the changed files
+        :param files: The changed files, as soon as git listed them
+        """
+        if self.ctx is None or FILES in self.sent:
+            return
+        self.sent.add(FILES)
+        await self._notify({"stage": FILES, "files": diff_model.to_columns(files)})
+
+    async def statistics(self, files: list[FileChange]):
+        """
+        Notify the statistics of the changed files
+        :param files: The changed files, with their numbers of added and deleted lines
+        """
+        if self.ctx is None or STATISTICS in self.sent:
+            return
+        self.sent.add(STATISTICS)
+        await self._notify({"stage": STATISTICS, "statistics": diff_model.summarize(files),
+                            "total_diff_lines": diff_engine.count_changed_lines(files)})
+
+    async def listed(self, files: list[FileChange]):
+        """
+        Notify the changed files, then their statistics
+        (git prints the statistics in the same header as the list of the files)
+        :param files: The changed files, as soon as git listed them
+        """
+        await self.files(files)
+        await self.statistics(files)
+
+    async def diff(self, patch: str):
+        """
+        Notify the pages of the packed diff
+        :param patch: The packed diff
+        """
+        if self.ctx is None or DIFF in self.sent:
+            return
+        self.sent.add(DIFF)
+        pages = split_pages(patch)
+        for number, page in enumerate(pages):
+            await self._notify({"stage": DIFF, "page": number, "pages": len(pages), "diff": page})
+
+    async def finish(self, analysis: dict, include_diff: bool):
+        """
+        Notify the stages that were not notified yet (all of them for a cached analysis)
+        :param analysis: The complete analysis
+        :param include_diff: Whether the analysis includes the diff
+        """
+        if self.ctx is None:
+            return
+        if FILES not in self.sent or STATISTICS not in self.sent:
+            await self.listed(diff_model.from_columns(analysis["files"]))
+        if include_diff:
+            await self.diff(analysis["diff"])
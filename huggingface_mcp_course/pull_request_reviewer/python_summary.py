@@ -0,0 +1,242 @@
+"""
+Semantic summary of the changes of the Python files analyzed by the Pull Request agent.
+The old and new blobs of each changed .py file are parsed with ast, and their top-level functions and classes (and the
+methods of the classes) are compared: the definitions added, removed or modified and the changed signatures give the
+agent the key changes in a few lines instead of the whole patch. Moving a definition or reformatting it is not a
+change, as the comparison ignores positions and formatting.
+Blobs are immutable, so the summary of a file is cached on disk by the SHAs of its two blobs and never parsed twice.
+"""
+import ast
+import asyncio
+import hashlib
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, git_runner
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+# Namespace of the summaries in the on-disk cache, keyed by "<old blob SHA>:<new blob SHA>"
+SUMMARIES_NAMESPACE = 'py-summaries'
+
+# Maximum number of Python files summarized, the other ones are only counted
+MAX_SUMMARY_FILES = 500
+
+# Maximum size of a parsed blob, larger files are not summarized
+MAX_BLOB_BYTES = 1024 * 1024
+
+# SHA of a missing blob in the raw records of git diff (added or deleted file)
+NULL_SHA = '0' * 40
+
+# Nodes of the compared definitions
+FUNCTION_NODES = (ast.FunctionDef, ast.AsyncFunctionDef)
+DEFINITION_NODES = FUNCTION_NODES + (ast.ClassDef,)
+
+
+def _fingerprint(nodes: list[ast.AST]) -> str:
+    """
+    :param nodes: Nodes of a syntax tree
+    :return: A digest of the nodes, ignoring their positions and formatting
+    """
+    return hashlib.sha1('\n'.join(ast.dump(node) for node in nodes).encode('utf-8')).hexdigest()[:16]
+
+
+def _signature(node: ast.AST) -> str:
+    """
+    :param node: A function or class definition
+    :return: The signature of the definition, e.g. "async def read(path: str) -> bytes" or "class Reader(Base)"
+    """
+    if isinstance(node, ast.ClassDef):
+        bases = ', '.join(ast.unparse(base) for base in node.bases + node.keywords)
+        return f'class {node.name}({bases})' if bases else f'class {node.name}'
+    prefix = 'async def' if isinstance(node, ast.AsyncFunctionDef) else 'def'
+    returns = f' -> {ast.unparse(node.returns)}' if node.returns is not None else ''
+    return f'{prefix} {node.name}({ast.unparse(node.args)}){returns}'
+
+
+def extract_definitions(source: bytes) -> dict[str, tuple[str, str]]:
+    """
+    Extract the top-level functions and classes of a Python module, and the members of its classes
+    :param source: The source code of the module
+    :return: The signature and the fingerprint of each definition, by qualified name (e.g. "Reader.read"); the
+    fingerprint of a class only covers its bases, decorators and statements, its members being compared on their own
+    :raise SyntaxError: If the source code cannot be parsed
+    """
+    definitions = {}
+
+    def visit(body: list[ast.stmt], prefix: str):
+        for node in body:
+            if not isinstance(node, DEFINITION_NODES):
+                continue
+            name = f'{prefix}{node.name}'
+            if isinstance(node, ast.ClassDef):
+                statements = [child for child in node.body if not isinstance(child, DEFINITION_NODES)]
+                definitions[name] = (_signature(node), _fingerprint(node.bases + node.keywords +
+                                                                    node.decorator_list + statements))
+                visit(node.body, f'{name}.')
+            else:
+                definitions[name] = (_signature(node), _fingerprint([node]))
+
+    visit(ast.parse(source).body, '')
+    return definitions
+
+
+def compare_sources(old_source: Optional[bytes], new_source: Optional[bytes]) -> dict:
+    """
+    Compare the definitions of two versions of a Python module
+    :param old_source: The old source code, or None for an added file
+    :param new_source: The new source code, or None for a deleted file
+    :return: The names of the definitions "added", "removed" and "modified", and the changed "signatures" as
+    [name, old signature, new signature], or an "error" if a version cannot be parsed
+    """
+    try:
+        old = extract_definitions(old_source) if old_source is not None else {}
+        new = extract_definitions(new_source) if new_source is not None else {}
+    except (SyntaxError, ValueError, RecursionError) as e:
+        return {"error": f'{type(e).__name__}: {e}'}
+    common = [name for name in new if name in old]
+    return {
+        "added": [name for name in new if name not in old],
+        "removed": [name for name in old if name not in new],
+        "modified": [name for name in common if old[name] != new[name]],
+        "signatures": [[name, old[name][0], new[name][0]] for name in common if old[name][0] != new[name][0]]
+    }
+
+
+async def read_blob_sizes(cwd: str, shas: list[str]) -> dict[str, int]:
+    """
+    Read the size of blobs with a single `git cat-file --batch-check`, without reading their content
+    :param cwd: The working directory of the git repository
+    :param shas: The SHAs of the blobs
+    :return: The size in bytes of each blob by SHA (missing blobs are left out)
+    """
+    if not shas:
+        return {}
+    output = (await git_runner.run_git(['cat-file', '--batch-check'], cwd, check=True,
+                                       input='\n'.join(shas) + '\n')).stdout
+    sizes = {}
+    # Each object is "<sha> <type> <size>", or "<name> missing"
+    for line in output.splitlines():
+        header = line.split(' ')
+        if len(header) == 3:
+            sizes[header[0]] = int(header[2])
+    return sizes
+
+
+async def read_blobs(cwd: str, shas: list[str]) -> dict[str, bytes]:
+    """
+    Read the content of blobs with a single `git cat-file --batch`
+    :param cwd: The working directory of the git repository
+    :param shas: The SHAs of the blobs
+    :return: The content of each blob by SHA (missing blobs are left out)
+    """
+    if not shas:
+        return {}
+    output = (await git_runner.run_git(['cat-file', '--batch'], cwd, check=True, input='\n'.join(shas) + '\n',
+                                       text=False)).stdout
+    blobs = {}
+    position = 0
+    # Each object is "<sha> <type> <size>\n<content>\n", or "<name> missing\n"
+    while position < len(output):
+        end = output.index(b'\n', position)
+        header = output[position:end].split(b' ')
+        position = end + 1
+        if len(header) == 3:
+            size = int(header[2])
+            blobs[header[0].decode()] = output[position:position + size]
+            position += size + 1
+    return blobs
+
+
+def _is_python(file: FileChange) -> bool:
+    """
+    :param file: A changed file
+    :return: True if the file is a Python module whose blobs can be compared, False otherwise
+    """
+    return file.path.endswith('.py') and not file.binary and file.old_sha is not None and file.new_sha is not None
+
+
+async def summarize_files(cwd: str, disk_cache: analysis_cache.DiskCache, files: list[FileChange]) -> dict:
+    """
+    Summarize the changes of the Python files of a change set, reusing the cached summaries
+    :param cwd: The working directory of the git repository
+    :param disk_cache: The on-disk cache of the repository, in which the summaries are cached
+    :param files: The changed files, with their blob SHAs (see diff_engine.read_diff)
+    :return: The summary of each Python file whose definitions changed ("files", each with its "path"), the paths
+    that could not be parsed ("errors") and the number of Python files that were not summarized ("omitted")
+    """
+    python_files = [file for file in files if _is_python(file)]
+    omitted = max(0, len(python_files) - MAX_SUMMARY_FILES)
+    python_files = python_files[:MAX_SUMMARY_FILES]
+    keys = [f'{file.old_sha}:{file.new_sha}' for file in python_files]
+    summaries = await asyncio.to_thread(disk_cache.get_many, SUMMARIES_NAMESPACE, keys)
+
+    # Only the blobs of the files that were never summarized are read and parsed
+    # (the blobs larger than MAX_BLOB_BYTES are never read)
+    missing = [(key, file) for key, file in zip(keys, python_files) if key not in summaries]
+    shas = sorted({sha for _, file in missing for sha in (file.old_sha, file.new_sha) if sha != NULL_SHA})
+    sizes = await read_blob_sizes(cwd, shas)
+    large = {sha for sha, size in sizes.items() if size > MAX_BLOB_BYTES}
+    blobs = await read_blobs(cwd, [sha for sha in shas if sha not in large])
+
+    def parse() -> dict[str, dict]:
+        parsed = {}
+        for key, file in missing:
+            if file.old_sha in large or file.new_sha in large:
+                parsed[key] = {"error": 'File too large'}
+            else:
+                parsed[key] = compare_sources(blobs.get(file.old_sha) if file.old_sha != NULL_SHA else None,
+                                              blobs.get(file.new_sha) if file.new_sha != NULL_SHA else None)
+        return parsed
+
+    if missing:
+        parsed = await asyncio.to_thread(parse)
+        await asyncio.to_thread(disk_cache.put_many, SUMMARIES_NAMESPACE, parsed)
+        summaries.update(parsed)
+
+    result = {"files": [], "errors": [], "omitted": omitted}
+    for key, file in zip(keys, python_files):
+        summary = summaries[key]
+        if "error" in summary:
+            result["errors"].append(file.path)
+        elif any(summary.values()):
+            result["files"].append({"path": file.path, **{name: value for name, value in summary.items() if value}})
+    return result
+
+
+async def summarize_range(cwd: str, disk_cache: analysis_cache.DiskCache, revision_range: str,
+                          pathspecs: Optional[list[str]] = None) -> dict:
+    """
+    Summarize the changes of the Python files of a revision range
+    :param cwd: The working directory of the git repository
+    :param disk_cache: The on-disk cache of the repository, in which the summaries are cached
+    :param revision_range: The revision range to compare (e.g. "main...HEAD")
+    :param pathspecs: Git pathspecs scoping the diff (optional)
+    :return: The summary of the Python files (see summarize_files)
+    """
+    return await summarize_files(cwd, disk_cache, await read_python_files(cwd, revision_range, pathspecs))
+
+
+async def read_python_files(cwd: str, revision_range: str, pathspecs: Optional[list[str]] = None) -> list[FileChange]:
+    """
+    List the changed Python files of a revision range with their blob SHAs, from the raw records of git diff
+    (unlike the numstat of diff_engine.read_diff, the raw records do not diff the content of the files)
+    :param cwd: The working directory of the git repository
+    :param revision_range: The revision range to compare (e.g. "main...HEAD")
+    :param pathspecs: Git pathspecs scoping the diff (optional)
+    :return: The changed Python files, in git order (without line counts)
+    """
+    pathspecs = list(pathspecs or [])
+    # Git pathspecs are alternatives, so the Python files are only selected by git without include pathspecs
+    if all(pathspec.startswith(':(top,exclude)') for pathspec in pathspecs):
+        pathspecs.insert(0, ':(top)*.py')
+    result = await git_runner.run_git(['diff', '--raw', '-z', '--no-abbrev', revision_range, '--', *pathspecs],
+                                      cwd, check=True)
+    files = []
+    # Each record is ":<old mode> <new mode> <old sha> <new sha> <status>" followed by 1 or 2 NUL-terminated paths
+    tokens = iter(result.stdout.split('\0'))
+    for token in tokens:
+        if token.startswith(':'):
+            _, _, old_sha, new_sha, status = token[1:].split(' ')
+            paths = [next(tokens, '') for _ in range(2 if status[0] in 'RC' else 1)]
+            if paths[-1].endswith('.py'):
+                files.append(FileChange(status, paths[-1], paths[0] if len(paths) > 1 else None, old_sha, new_sha))
+    return files
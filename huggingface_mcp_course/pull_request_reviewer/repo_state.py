@@ -0,0 +1,150 @@
+"""
+Warm per-repository state of the Pull Request agent.
+A single server process can serve several workspaces: the location of each repository is resolved with git only once,
+references are resolved again only when the files storing them change, and merge-bases (which only depend on
+immutable commits) are cached.
+"""
+from collections import OrderedDict
+import os
+import re
+from typing import Optional
+
+from huggingface_mcp_course.pull_request_reviewer import git_backend
+
+# Number of merge-bases cached per repository
+MERGE_BASE_CACHE_SIZE = 1024
+
+# Revisions that name a reference (as opposed to e.g. "main~1" or "HEAD@{1}"), whose resolution can be cached
+REFERENCE_PATTERN = re.compile(r'^[A-Za-z0-9_][A-Za-z0-9_./-]*$')
+
+# Full SHA of a commit, which never needs to be resolved
+SHA_PATTERN = re.compile(r'^[0-9a-f]{40}([0-9a-f]{24})?$')
+
+# References that belong to the worktree rather than to the common directory
+WORKTREE_REFERENCES = {'HEAD', 'ORIG_HEAD', 'FETCH_HEAD', 'MERGE_HEAD', 'CHERRY_PICK_HEAD'}
+
+
+def fingerprint(paths: list[str]) -> tuple:
+    """
+    :param paths: The paths of the files storing a reference
+    :return: The inode, modification time and size of each file (None for missing files).
+    Git replaces reference files by renaming a lock file, so any update changes the fingerprint.
+    """
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stats.append(None)
+    return tuple(stats)
+
+
+class RepoState:
+    """
+    Location of a repository, with its cached references and merge-bases
+    """
+
+    def __init__(self, toplevel: str, git_dir: str, common_dir: str):
+        """
+        :param toplevel: The absolute path to the top-level directory of the working tree
+        :param git_dir: The absolute path to the git directory of the working tree
+        :param common_dir: The absolute path to the git common directory
+        """
+        self.toplevel = toplevel
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        # References are stored in a reftable instead of files since git 2.45, their changes cannot be detected
+        self.cache_references = not os.path.exists(os.path.join(common_dir, 'reftable'))
+        # Revision range of the latest analysis including the diff
+        self.latest_range: Optional[str] = None
+        self._references: dict[str, tuple[str, list[str], tuple]] = {}
+        self._merge_bases: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+    def _reference_paths(self, name: str) -> list[str]:
+        """
+        :param name: The name of a reference (e.g. "main" or "HEAD")
+        :return: The files that may store the reference, following symbolic references (e.g. HEAD to the current
+        branch), in the order in which git looks the name up
+        """
+        if name in WORKTREE_REFERENCES:
+            candidates = [os.path.join(self.git_dir, name)]
+        else:
+            candidates = [os.path.join(self.common_dir, prefix, name) if prefix else os.path.join(self.common_dir, name)
+                          for prefix in ('', 'refs', 'refs/tags', 'refs/heads', 'refs/remotes')]
+            candidates.append(os.path.join(self.common_dir, 'refs/remotes', name, 'HEAD'))
+
+        paths = []
+        while candidates:
+            path = candidates.pop(0)
+            paths.append(path)
+            try:
+                with open(path) as f:
+                    content = f.read(1024)
+            except OSError:
+                continue
+            if content.startswith('ref: '):
+                target = content[5:].strip()
+                base_dir = self.git_dir if target in WORKTREE_REFERENCES else self.common_dir
+                candidates.insert(0, os.path.join(base_dir, target))
+        paths.append(os.path.join(self.common_dir, 'packed-refs'))
+        return paths
+
+    async def resolve(self, revision: str) -> str:
+        """
+        Resolve a revision, reusing the previous resolution while the files storing the reference are unchanged
+        :param revision: A revision (e.g. "main")
+        :return: The SHA of the commit the revision points to
+        """
+        if SHA_PATTERN.match(revision):
+            return revision
+        backend = git_backend.get_git_backend()
+        if not self.cache_references or not REFERENCE_PATTERN.match(revision):
+            return await backend.resolve(self.toplevel, revision)
+
+        cached = self._references.get(revision)
+        if cached is not None and fingerprint(cached[1]) == cached[2]:
+            return cached[0]
+        # The files are fingerprinted before git reads them, so that a concurrent update is detected next time
+        paths = self._reference_paths(revision)
+        stats = fingerprint(paths)
+        sha = await backend.resolve(self.toplevel, revision)
+        self._references[revision] = (sha, paths, stats)
+        return sha
+
+    async def merge_base(self, first_sha: str, second_sha: str) -> str:
+        """
+        :param first_sha: The SHA of a commit
+        :param second_sha: The SHA of another commit
+        :return: The SHA of the best common ancestor of both commits
+        """
+        key = (first_sha, second_sha)
+        merge_base = self._merge_bases.get(key)
+        if merge_base is None:
+            merge_base = await git_backend.get_git_backend().merge_base(self.toplevel, first_sha, second_sha)
+            self._merge_bases[key] = merge_base
+            while len(self._merge_bases) > MERGE_BASE_CACHE_SIZE:
+                self._merge_bases.popitem(last=False)
+        else:
+            self._merge_bases.move_to_end(key)
+        return merge_base
+
+
+# States of the repositories already used, by directory (several directories can share a state)
+_repo_states: dict[str, RepoState] = {}
+
+
+async def get_repo_state(directory: str) -> RepoState:
+    """
+    Get the state of the repository containing a directory, locating the repository with git on first use
+    :param directory: A directory of the repository (e.g. a root of the MCP client)
+    :return: The state of the repository
+    """
+    repo_state = _repo_states.get(directory)
+    if repo_state is None:
+        toplevel, git_dir, common_dir = await git_backend.get_git_backend().repository(directory)
+        repo_state = _repo_states.get(toplevel)
+        if repo_state is None:
+            repo_state = _repo_states[toplevel] = RepoState(toplevel, git_dir, common_dir)
+        _repo_states[directory] = repo_state
+    return repo_state
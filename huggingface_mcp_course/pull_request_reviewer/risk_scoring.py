@@ -0,0 +1,152 @@
+"""
+Risk and impact scoring of the change sets analyzed by the Pull Request agent.
+The score combines four factors between 0 and 1: the churn of the change set, the hotness of the changed files
+(how often the base branch changed them, from the history index), the configuration, infrastructure and dependency
+files touched, and the lack of test changes for the changed source lines. Each factor that stands out is reported as
+a risk, so the agent gets the impact assessment without reading the diff.
+"""
+import math
+import re
+
+from huggingface_mcp_course.pull_request_reviewer import change_classifier, diff_packer
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+# Weights of the factors in the score
+WEIGHTS = {"churn": 0.3, "hotness": 0.25, "infrastructure": 0.25, "tests": 0.2}
+
+# Thresholds of the impact levels on the score
+HIGH_IMPACT = 0.6
+MEDIUM_IMPACT = 0.3
+
+# Number of changed lines giving the maximum churn (on a logarithmic scale)
+MAX_CHURN_LINES = 10000
+
+# Share of the indexed commits touching a file above which the file is hot
+HOT_FILE_RATIO = 0.05
+
+# Minimum number of indexed commits touching a file for it to be hot
+MIN_HOT_FILE_COMMITS = 5
+
+# Minimum number of indexed commits for the hotness to be scored (a young history tells nothing about its files)
+MIN_HISTORY_COMMITS = 20
+
+# Minimum number of changed test lines per changed source line
+MIN_TEST_RATIO = 0.3
+
+# Maximum number of paths listed per risk
+MAX_LISTED_PATHS = 5
+
+# CI/CD, deployment and infrastructure files
+INFRASTRUCTURE_PATTERN = re.compile(
+    r'(^|/)(\.github/workflows|\.gitlab-ci|\.circleci|terraform|k8s|kubernetes|helm|charts|deploy|deployment|'
+    r'infra|ansible)(/|\.|$)|(^|/)(Dockerfile|docker-compose[^/]*\.ya?ml|Makefile|Jenkinsfile|Procfile)$|\.tf$',
+    re.IGNORECASE
+)
+
+# Configuration files
+CONFIG_PATTERN = re.compile(r'\.(ya?ml|toml|ini|cfg|conf|env|properties)$|(^|/)\.env[^/]*$|(^|/)config/')
+
+
+def score_churn(files: list[FileChange]) -> dict:
+    """
+    :param files: The changed files
+    :return: The churn "score", number of changed "lines" and of changed "files"
+    """
+    lines = sum(file.changed_lines for file in files)
+    return {"score": min(1.0, math.log10(lines + 1) / math.log10(MAX_CHURN_LINES)), "lines": lines,
+            "files": len(files)}
+
+
+def score_hotness(files: list[FileChange], index: dict) -> dict:
+    """
+    :param files: The changed source files, without the test, documentation and dependency files
+    :param index: The history index of the base branch (see history_index.update_index)
+    :return: The hotness "score" (the share of hot files among the changed files, weighted by their frequency) and
+    the "hot" files as [path, number of indexed commits touching the file], the hottest first (none when fewer than
+    MIN_HISTORY_COMMITS commits are indexed)
+    """
+    commits = index["commits"]
+    if commits < MIN_HISTORY_COMMITS or not files:
+        return {"score": 0.0, "hot": []}
+
+    # Files touched by a few commits are not hot, whatever their share of the history
+    frequencies = [(file.path, index["files"].get(file.path, (0, 0))[0]) for file in files]
+    frequencies = [(path, count) for path, count in frequencies if count >= MIN_HOT_FILE_COMMITS]
+    hot = sorted(((path, count) for path, count in frequencies if count / commits >= HOT_FILE_RATIO),
+                 key=lambda item: -item[1])
+    score = sum(min(1.0, count / commits / HOT_FILE_RATIO) for _, count in frequencies) / len(files)
+    return {"score": score, "hot": [list(item) for item in hot[:MAX_LISTED_PATHS]]}
+
+
+def score_infrastructure(files: list[FileChange]) -> dict:
+    """
+    :param files: The changed files
+    :return: The infrastructure "score" and the "infrastructure", "dependency" and "config" files touched
+    """
+    infrastructure = [file.path for file in files if INFRASTRUCTURE_PATTERN.search(file.path)]
+    dependencies = [file.path for file in files if change_classifier.DEPENDENCY_PATTERN.search(file.path)]
+    config = [file.path for file in files if CONFIG_PATTERN.search(file.path) and file.path not in infrastructure
+              and file.path not in dependencies]
+    score = 1.0 if infrastructure else 0.6 if dependencies else 0.3 if config else 0.0
+    return {"score": score, "infrastructure": infrastructure[:MAX_LISTED_PATHS],
+            "dependency": dependencies[:MAX_LISTED_PATHS], "config": config[:MAX_LISTED_PATHS]}
+
+
+def score_tests(source_files: list[FileChange], test_files: list[FileChange]) -> dict:
+    """
+    :param source_files: The changed source files, without the test, documentation and dependency files
+    :param test_files: The changed test files
+    :return: The test "score" (1 when source lines changed without any test change) and the "ratio" of changed test
+    lines per changed source line (None without source changes)
+    """
+    source_lines = sum(file.changed_lines for file in source_files)
+    test_lines = sum(file.changed_lines for file in test_files)
+    if not source_lines:
+        return {"score": 0.0, "ratio": None}
+    ratio = test_lines / source_lines
+    return {"score": max(0.0, 1 - ratio / MIN_TEST_RATIO), "ratio": round(ratio, 3)}
+
+
+def assess(files: list[FileChange], index: dict) -> dict:
+    """
+    Score the risk and the impact of a change set
+    :param files: The changed files with their numstat
+    :param index: The history index of the base branch (see history_index.update_index)
+    :return: The "impact" level (High, Medium or Low), the "score" between 0 and 1, the "factors" of the score and
+    the "risks" worth mentioning to a reviewer
+    """
+    # Generated files, lockfiles and vendored files only count towards the churn, documentation and dependency
+    # manifests do not need tests
+    reviewed = [file for file in files if diff_packer.categorize(file.path) == diff_packer.SOURCE]
+    test_files = [file for file in reviewed if change_classifier.TEST_PATTERN.search(file.path)]
+    source_files = [file for file in reviewed if not change_classifier.TEST_PATTERN.search(file.path)
+                    and not change_classifier.DOCS_PATTERN.search(file.path)
+                    and not change_classifier.DEPENDENCY_PATTERN.search(file.path)]
+    factors = {
+        "churn": score_churn(files),
+        "hotness": score_hotness(source_files, index),
+        "infrastructure": score_infrastructure(files),
+        "tests": score_tests(source_files, test_files)
+    }
+    score = sum(WEIGHTS[name] * factor["score"] for name, factor in factors.items())
+    for factor in factors.values():
+        factor["score"] = round(factor["score"], 3)
+
+    risks = []
+    if factors["churn"]["score"] >= HIGH_IMPACT:
+        risks.append(f'Large change set: {factors["churn"]["lines"]} lines in {factors["churn"]["files"]} files')
+    if factors["hotness"]["hot"]:
+        risks.append('Frequently changed files: ' + ', '.join(path for path, _ in factors["hotness"]["hot"]))
+    for name, description in (("infrastructure", 'CI/CD or infrastructure files'),
+                              ("dependency", 'dependency manifests'), ("config", 'configuration files')):
+        if factors["infrastructure"][name]:
+            risks.append(f'Changes {description}: ' + ', '.join(factors["infrastructure"][name]))
+    if factors["tests"]["score"] >= 0.5:
+        risks.append(f'Few test changes for {sum(file.changed_lines for file in source_files)} changed source lines')
+
+    return {
+        "impact": 'High' if score >= HIGH_IMPACT else 'Medium' if score >= MEDIUM_IMPACT else 'Low',
+        "score": round(score, 3),
+        "factors": factors,
+        "risks": risks
+    }
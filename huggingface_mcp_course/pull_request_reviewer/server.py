@@ -1,15 +1,22 @@
+import asyncio
 from dotenv import load_dotenv
 import json
 import os
 import requests
 import subprocess
 import traceback
-from typing import Optional
+from typing import Awaitable, Optional
+from urllib.parse import unquote, urlparse
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import ClientCapabilities, RootsCapability
 
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, change_classifier, commit_log, diff_engine, \
+    diff_model, diff_packer, diff_store, history_index, incremental, ownership, parallel_diff, path_filters, \
+    python_summary, repo_state, risk_scoring
+from huggingface_mcp_course.pull_request_reviewer.progress import AnalysisProgress
 from huggingface_mcp_course.pull_request_reviewer.webhook_server import EVENTS_FILE
-from huggingface_mcp_course.utils import ioutils
+from huggingface_mcp_course.utils import asyncutils, cacheutils, ioutils
 
 load_dotenv()
 
@@ -19,6 +26,20 @@ PR_TEMPLATES_DIR = 'huggingface_mcp_course/pull_request_reviewer/templates'
 # Initialize the FastMCP server
 mcp = FastMCP('pr-agent')
 
+# Analyses of the changes, keyed by the SHAs of the compared commits
+ANALYSIS_CACHE = analysis_cache.AnalysisCache()
+
+# Namespace of the analyses in the on-disk cache, to be changed whenever the content of an analysis changes
+ANALYSIS_NAMESPACE = 'analysis-v7'
+
+# Separators of the compact JSON responses of the diff tools
+COMPACT_SEPARATORS = (',', ':')
+
+# Time to live in seconds of the results of the tools reading the templates and the events
+TOOL_CACHE_TTL = float(os.getenv('PR_AGENT_TOOL_CACHE_TTL', '300'))
+
+# Maximum number of repositories analyzed at the same time by analyze_many
+ANALYZE_MANY_CONCURRENCY = int(os.getenv('PR_AGENT_ANALYZE_CONCURRENCY', '4'))
 
 def generate_error_response(message: str, stacktrace:str = None, code: int = 500) -> str:
     """
@@ -37,89 +58,586 @@ def generate_error_response(message: str, stacktrace:str = None, code: int = 500
     }
     return json.dumps(error_response)
 
+async def get_working_directory(ctx: Optional[Context] = None) -> str:
+    """
+    Get the working directory of the client from its roots
+    :param ctx: The context of the MCP request (optional)
+    :return: The path of the first file root of the client, or the current directory if the client has no roots
+    """
+    if ctx is not None and ctx.session.check_client_capability(ClientCapabilities(roots=RootsCapability())):
+        result = await ctx.session.list_roots()
+        for root in result.roots:
+            uri = urlparse(str(root.uri))
+            if uri.scheme == 'file':
+                return unquote(uri.path)
+    return os.getcwd()
+
+async def notify_diff(diff_command: Awaitable[dict], progress: Optional[AnalysisProgress]) -> dict:
+    """
+    Notify the pages of a packed diff as soon as it is ready, while the rest of the analysis is still being computed
+    :param diff_command: The coroutine reading and packing the diff
+    :param progress: The sender of the progress notifications (optional)
+    :return: The diff returned by the coroutine
+    """
+    diff = await diff_command
+    if progress is not None:
+        await progress.diff(diff["patch"])
+    return diff
+
+async def compute_analysis(cwd: str, merge_base_sha: str, head_sha: str, include_diff: bool, max_diff_lines: int,
+                           disk_cache: analysis_cache.DiskCache, store: diff_store.DiffStore,
+                           scope: path_filters.PathScope, progress: Optional[AnalysisProgress] = None,
+                           parallel: bool = False) -> dict:
+    """
+    Analyze the changes between two commits with git
+    :param cwd: The working directory of the git repository
+    :param merge_base_sha: The SHA of the merge-base with the base branch
+    :param head_sha: The SHA of the analyzed commit
+    :param include_diff: Include the diff content
+    :param max_diff_lines: Maximum number of diff lines to include
+    :param disk_cache: The on-disk cache of the repository, used for the commit log
+    :param store: The diff store of the repository, in which the whole patch is materialized for pagination
+    :param scope: The include and exclude globs of the diff
+    :param progress: The sender of the progress notifications, notified of the changed files as soon as git lists
+    them, then of the packed diff (optional)
+    :param parallel: Generate the patch with several git processes, one per shard of the changed files
+    (default = False)
+    :return: The analysis of the changes (without the name of the base branch)
+    """
+    commits_key = f'{merge_base_sha}..{head_sha}'
+    diff_key = diff_store.format_range(merge_base_sha, head_sha, scope.key)
+
+    # Stream the changed files, their statistics and the patch from a single git invocation,
+    # while the first page of the commit log and the summary of the excluded files are retrieved concurrently
+    # (the patches of the excluded files are never generated, their lines are counted by a single numstat)
+    # IMPORTANT: MCP tools have a 25,000 token response limit, so the most relevant hunks are packed within budget
+    # The whole patch is materialized in the background (once per range) when parts of it are omitted, so that they
+    # can be paginated, otherwise git stops at the budget and the patch is materialized on demand (see load_diff)
+    materialize = include_diff and not store.exists(diff_key)
+    on_files = progress.listed if progress is not None else None
+    if parallel and include_diff:
+        diff_command = parallel_diff.read_diff(f'{merge_base_sha}...{head_sha}', cwd, max_lines=max_diff_lines,
+                                               store=store if materialize else None, store_key=diff_key,
+                                               pathspecs=scope.pathspecs(), on_files=on_files)
+    else:
+        diff_command = diff_engine.read_diff(f'{merge_base_sha}...{head_sha}', cwd,
+                                             include_patch=include_diff, max_lines=max_diff_lines,
+                                             store=store if materialize else None, store_key=diff_key,
+                                             pathspecs=scope.pathspecs(), on_files=on_files)
+    # The pages of the packed diff are notified without waiting for the commit log and the excluded files
+    if include_diff:
+        diff_command = notify_diff(diff_command, progress)
+    diff, commits, excluded = await asyncio.gather(
+        diff_command,
+        commit_log.read_page(cwd, disk_cache, commits_key),
+        path_filters.summarize_excluded(cwd, f'{merge_base_sha}...{head_sha}', scope)
+    )
+    return format_analysis(diff, commits, excluded, include_diff, commits_key, diff_key)
+
+async def pack_files(cwd: str, files: list[diff_model.FileChange], revision_range: str, max_diff_lines: int) -> dict:
+    """
+    Pack the diff of known changed files
+    :param cwd: The working directory of the git repository
+    :param files: The changed files of the revision range
+    :param revision_range: The revision range to compare
+    :param max_diff_lines: Maximum number of diff lines to include
+    :return: The diff, like diff_engine.read_diff
+    """
+    patch, omitted, partial = await incremental.pack_diff(cwd, files, revision_range, max_diff_lines)
+    return {"files": files, "patch": patch, "truncated": bool(omitted), "omitted": omitted, "partial": partial}
+
+async def update_analysis(repository: repo_state.RepoState, previous: dict, merge_base_sha: str, old_head_sha: str,
+                          head_sha: str, include_diff: bool, max_diff_lines: int, disk_cache: analysis_cache.DiskCache,
+                          store: diff_store.DiffStore, scope: path_filters.PathScope,
+                          progress: Optional[AnalysisProgress] = None) -> Optional[dict]:
+    """
+    Update the analysis of a previous head with the commits added on top of it
+    :param repository: The state of the git repository
+    :param previous: The analysis of the previous head, with the same merge-base and parameters
+    :param merge_base_sha: The SHA of the merge-base with the base branch
+    :param old_head_sha: The SHA of the previously analyzed commit
+    :param head_sha: The SHA of the analyzed commit
+    :param include_diff: Include the diff content
+    :param max_diff_lines: Maximum number of diff lines to include
+    :param disk_cache: The on-disk cache of the repository, used for the commit log
+    :param store: The diff store of the repository, in which the whole patch is materialized for pagination
+    :param scope: The include and exclude globs of the diff, the same as the previous analysis
+    :param progress: The sender of the progress notifications, notified of the changed files before the diff is packed,
+    then of the packed diff (optional)
+    :return: The analysis of the changes, or None if it must be computed from scratch (e.g. rewritten history)
+    """
+    # Only a branch that was fast-forwarded can reuse its previous analysis
+    if await repository.merge_base(old_head_sha, head_sha) != old_head_sha:
+        return None
+    cwd = repository.toplevel
+    files = await incremental.update_files(cwd, diff_model.from_columns(previous["files"]), merge_base_sha,
+                                           old_head_sha, head_sha, scope)
+    if files is None:
+        return None
+    if progress is not None:
+        await progress.listed(files)
+
+    # The first page of the commit log is bounded, it is read again,
+    # and only the excluded groups touched by the new commits are counted again,
+    # while the diff is packed (its pages are notified as soon as it is packed)
+    commits_key = f'{merge_base_sha}..{head_sha}'
+    diff_key = diff_store.format_range(merge_base_sha, head_sha, scope.key)
+    commands = [commit_log.read_page(cwd, disk_cache, commits_key),
+                path_filters.summarize_excluded(cwd, f'{merge_base_sha}...{head_sha}', scope,
+                                                previous.get("excluded"), f'{old_head_sha}..{head_sha}')]
+    if include_diff:
+        commands.append(notify_diff(pack_files(cwd, files, f'{merge_base_sha}...{head_sha}', max_diff_lines),
+                                    progress))
+    commits, excluded, *packed = await asyncio.gather(*commands)
+
+    diff = {"files": files, "patch": '', "truncated": False, "omitted": [], "partial": False}
+    if include_diff:
+        diff = packed[0]
+        # The whole patch is only needed for pagination, it is materialized in the background if parts are omitted
+        if (diff["truncated"] or diff["partial"]) and not store.exists(diff_key):
+            diff_engine.materialize_diff(f'{merge_base_sha}...{head_sha}', cwd, store, diff_key,
+                                         pathspecs=scope.pathspecs())
+    return format_analysis(diff, commits, excluded, include_diff, commits_key, diff_key)
+
+def format_analysis(diff: dict, commits: dict, excluded: dict, include_diff: bool, commits_key: str,
+                    diff_key: str) -> dict:
+    """
+    Format the analysis returned by analyze_file_changes
+    :param diff: The changed "files", the packed "patch", whether it was "truncated", the "omitted" files and whether
+    the patch is "partial"
+    :param commits: The first page of the commit log (see commit_log.read_page)
+    :param excluded: The summary of the excluded groups (see path_filters.summarize_excluded)
+    :param include_diff: Include the diff content
+    :param commits_key: The revision range of the analysis ("<merge-base SHA>..<HEAD SHA>")
+    :param diff_key: The key of the patch in the diff store (see diff_store.format_range)
+    :return: The analysis of the changes (without the name of the base branch)
+    """
+    total_diff_lines = diff_engine.count_changed_lines(diff["files"])
+
+    # Get the actual diff if requested
+    diff_content = diff["patch"]
+    if diff["truncated"]:
+        shown_lines = diff_content.count('\n')
+        diff_content += f"\n\n... Output truncated. Showing {shown_lines} lines of a diff with " \
+                        f"{total_diff_lines} changed lines ..."
+        diff_content += "\n... Omitted files are listed in omitted_from_diff, " \
+                        "use get_diff_page with the cursor to read the whole diff ..."
+    if diff["partial"]:
+        diff_content += "\n... Partial diff: git took too long, only the patches read in time are shown ..."
+
+    analysis = {
+        "files": diff_model.to_columns(diff["files"]),
+        "statistics": diff_model.summarize(diff["files"]),
+        "commits": commits["commits"],
+        "commits_cursor": diff_store.format_cursor(commits_key, commits["next_offset"])
+        if commits["next_offset"] is not None else None,
+        "diff": diff_content if include_diff else "Diff not included (set include_diff=true to see full diff)",
+        "truncated": diff["truncated"],
+        "total_diff_lines": total_diff_lines if include_diff else 0
+    }
+    if diff["partial"]:
+        analysis["partial"] = True
+    if excluded["pattern"]:
+        analysis["excluded"] = excluded
+    if diff["truncated"]:
+        analysis["omitted_from_diff"] = diff_packer.summarize_manifest(diff["omitted"])
+        analysis["cursor"] = diff_store.format_cursor(diff_key, 0)
+    return analysis
+
+@asyncutils.single_flight(fan_out=('progress',))
+async def analyze_repository(directory: str, base_branch: str, include_diff: bool, max_diff_lines: int,
+                             include: Optional[list[str]] = None, exclude: Optional[list[str]] = None,
+                             progress: Optional[AnalysisProgress] = None, parallel: bool = False) -> dict:
+    """
+    Analyze the changes of a repository against a base branch, reusing cached analyses
+    (concurrent calls with the same arguments share a single analysis, whose progress is sent to all the callers still
+    waiting for it)
+    :param directory: A directory of the git repository
+    :param base_branch: Base branch to compare against
+    :param include_diff: Include the diff content
+    :param max_diff_lines: Maximum number of diff lines to include
+    :param include: Only analyze the paths matching these globs (default = the configuration of the repository)
+    :param exclude: Skip the paths matching these globs (default = the configuration of the repository)
+    :param progress: The sender of the progress notifications of the files, notified while computing the analysis
+    (optional)
+    :param parallel: Generate the patch with several git processes (default = False, the analysis is the same)
+    :return: The analysis of the changes (without the name of the base branch)
+    """
+    # Locate the repository (git only runs the first time)
+    repository = await repo_state.get_repo_state(directory)
+    git_dir = repository.common_dir
+    scope = await path_filters.PathScope.load(repository.toplevel, include, exclude)
+
+    # Resolve the immutable SHAs of the compared commits, which identify the analysis along with its scope
+    base_sha, head_sha = await asyncio.gather(repository.resolve(base_branch), repository.resolve('HEAD'))
+    merge_base_sha = await repository.merge_base(base_sha, head_sha)
+    cache_key = (merge_base_sha, head_sha, include_diff, max_diff_lines, scope.key)
+    diff_key = diff_store.format_range(merge_base_sha, head_sha, scope.key)
+    store = await asyncio.to_thread(diff_store.get_diff_store, git_dir)
+
+    # Look for the analysis in memory, then on disk, before computing it
+    # (an analysis whose cursor points to a pruned patch is computed again)
+    analysis = ANALYSIS_CACHE.get(cache_key)
+    if analysis is None or ('cursor' in analysis and not store.exists(diff_key)):
+        disk_cache = await asyncio.to_thread(analysis_cache.get_disk_cache, git_dir)
+        disk_key = ':'.join(str(part) for part in cache_key)
+        analysis = await asyncio.to_thread(disk_cache.get, ANALYSIS_NAMESPACE, disk_key)
+        if analysis is None or ('cursor' in analysis and not store.exists(diff_key)):
+            # Update the analysis of the head previously analyzed against the same merge-base, if any
+            heads_key = f'{merge_base_sha}:{include_diff}:{max_diff_lines}:{scope.key}'
+            old_head_sha = await asyncio.to_thread(disk_cache.get, 'heads', heads_key)
+            analysis = None
+            if old_head_sha is not None and old_head_sha != head_sha:
+                previous_key = ':'.join(str(part) for part in (merge_base_sha, old_head_sha, include_diff,
+                                                               max_diff_lines, scope.key))
+                previous = await asyncio.to_thread(disk_cache.get, ANALYSIS_NAMESPACE, previous_key)
+                if previous is not None:
+                    analysis = await update_analysis(repository, previous, merge_base_sha, old_head_sha, head_sha,
+                                                     include_diff, max_diff_lines, disk_cache, store, scope,
+                                                     progress)
+            if analysis is None:
+                analysis = await compute_analysis(repository.toplevel, merge_base_sha, head_sha,
+                                                  include_diff, max_diff_lines, disk_cache, store, scope,
+                                                  progress, parallel)
+            # A partial analysis is returned but never cached
+            if not analysis.get("partial"):
+                await asyncio.to_thread(disk_cache.put, ANALYSIS_NAMESPACE, disk_key, analysis)
+                await asyncio.to_thread(disk_cache.put, 'heads', heads_key, head_sha)
+        if not analysis.get("partial"):
+            ANALYSIS_CACHE.put(cache_key, analysis)
+    if include_diff:
+        repository.latest_range = diff_key
+        # The patch of a diff that was not truncated is only materialized if it is read by page or by file
+        store.sources[diff_key] = (f'{merge_base_sha}...{head_sha}', repository.toplevel, scope.pathspecs())
+    return analysis
+
 # ===== Module 1 Tools =====
 @mcp.tool()
-async def analyze_file_changes(base_branch: str = 'main', include_diff: bool = True,  max_diff_lines: int = 500) -> str:
+async def analyze_file_changes(base_branch: str = 'main', include_diff: bool = True,  max_diff_lines: int = 500,
+                               include: Optional[list[str]] = None, exclude: Optional[list[str]] = None,
+                               parallel: bool = False, ctx: Context = None) -> str:
     """
-    Get the full list of diff and changed files in the current git repository
+    Get the full list of diff and changed files in the git repository of the client's workspace
     :param base_branch: Base branch to compare against (default = "main")
     :param include_diff: Include the full diff content (default = True)
     :param max_diff_lines: Maximum number of diff lines to include (default: 500)
-    :return: the full list of diff and changed files
+    :param include: Only analyze the paths matching these globs, relative to the root of the repository
+    (default: the "include" list of its .pr-agent.json file, or all the paths)
+    :param exclude: Skip the paths matching these globs, e.g. ["*.lock", "vendor"] (default: the "exclude" list of
+    the .pr-agent.json file of the repository); the files and lines skipped by each glob are listed in excluded
+    :param parallel: Generate the diff with one git process per shard of the changed files, using all the cores for
+    change sets touching thousands of files (default = False)
+    :param ctx: The context of the MCP request, providing the roots of the client and receiving the partial results
+    as progress notifications (the files, then their statistics, then the pages of the diff, as JSON messages)
+    :return: the changed files as columns (path, old_path, status, additions, deletions, binary and hunks flattened
+    as [old start, old lines, new start, new lines, ...]), their statistics, the first page of the commits as
+    columns (sha, author, date, subject, files, additions, deletions and categories) with the cursor of the next page
+    for get_commits, and the diff
     """
     try:
-        # TODO Access working directory from roots (i.e. if working_directory is None)
-        # Get current directory
-        current_working_directory = os.getcwd()
-
-        # Get list of changed files
-        files_result = subprocess.run(
-            ['git', 'diff', '--name-status', f'{base_branch}...HEAD'],
-            capture_output=True,
-            text=True,
-            check=True,
-            cwd=current_working_directory
-        )
+        progress = AnalysisProgress(ctx)
+        analysis = await analyze_repository(await get_working_directory(ctx), base_branch, include_diff,
+                                            max_diff_lines, include, exclude, progress, parallel)
+        # Stream the stages that were not notified while computing the analysis
+        # (all of them for a cached analysis, or one shared with a concurrent call)
+        await progress.finish(analysis, include_diff)
+        return json.dumps({"base_branch": base_branch, **analysis}, separators=COMPACT_SEPARATORS)
 
-        # Get diff statistics
-        stat_result = subprocess.run(
-            ["git", "diff", "--stat", f"{base_branch}...HEAD"],
-            capture_output=True,
-            text=True,
-            cwd=current_working_directory
-        )
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error analyzing the changes against the {base_branch} branch',
+                                       traceback.format_exc())
 
-        # Get the actual diff if requested
-        diff_content = ""
-        truncated = False
-        if include_diff:
-            diff_result = subprocess.run(
-                ["git", "diff", f"{base_branch}...HEAD"],
-                capture_output=True,
-                text=True,
-                cwd=current_working_directory
-            )
-            diff_lines = diff_result.stdout.split('\n')
-            
-            # IMPORTANT: MCP tools have a 25,000 token response limit!
-            # Check if we need to truncate
-            if len(diff_lines) > max_diff_lines:
-                diff_content = '\n'.join(diff_lines[:max_diff_lines])
-                diff_content += f"\n\n... Output truncated. Showing {max_diff_lines} of {len(diff_lines)} lines ..."
-                diff_content += "\n... Use max_diff_lines parameter to see more ..."
-                truncated = True
-            else:
-                diff_content = diff_result.stdout
-
-        # Get commit messages for context
-        commits_result = subprocess.run(
-            ["git", "log", "--oneline", f"{base_branch}..HEAD"],
-            capture_output=True,
-            text=True,
-            cwd=current_working_directory
-        )
+@mcp.tool()
+async def analyze_many(repos: list[dict[str, str]], ctx: Context = None) -> str:
+    """
+    Analyze the changes of several git repositories at once, without their diffs
+    :param repos: The repositories to analyze, as objects with a "path" (relative to the workspace of the client or
+    absolute) and an optional "base_branch" (default = "main")
+    :param ctx: The context of the MCP request, providing the roots of the client and receiving the progress
+    :return: The analysis (or the error) of each repository, in the order in which they finished
+    """
+    try:
+        working_directory = await get_working_directory(ctx)
+    except Exception:
+        return generate_error_response('Error resolving the workspace of the client', traceback.format_exc())
+    semaphore = asyncio.Semaphore(ANALYZE_MANY_CONCURRENCY)
+
+    async def analyze(repo: dict[str, str]) -> dict:
+        path = repo.get("path", '.')
+        base_branch = repo.get("base_branch", 'main')
+        result = {"path": path, "base_branch": base_branch}
+        try:
+            async with semaphore:
+                result.update(await analyze_repository(os.path.join(working_directory, path), base_branch,
+                                                       include_diff=False, max_diff_lines=0))
+        except subprocess.CalledProcessError as e:
+            result["error"] = f"Git error: {e.stderr}"
+        except subprocess.TimeoutExpired as e:
+            result["error"] = f"Git timeout: {e}"
+        except Exception as e:
+            result["error"] = f'Error analyzing the changes against the {base_branch} branch: {e}'
+        return result
+
+    # Report each repository as soon as it is analyzed
+    results = []
+    for finished in asyncio.as_completed([analyze(repo) for repo in repos]):
+        result = await finished
+        results.append(result)
+        if ctx is not None:
+            status = 'failed' if "error" in result else f'{result["statistics"]["files"]} files changed'
+            await ctx.report_progress(len(results), len(repos), f'{result["path"]}: {status}')
+    return json.dumps(results, separators=COMPACT_SEPARATORS)
+
+async def load_diff(store: diff_store.DiffStore, revision_range: str) -> bool:
+    """
+    Wait for a patch being materialized in the background, or materialize the patch of an analyzed diff that was not
+    truncated
+    :param store: The diff store of the repository
+    :param revision_range: The key of the patch in the store
+    :return: True if the patch is stored, False otherwise (e.g. pruned, or analyzed before a restart of the server)
+    """
+    await store.wait(revision_range)
+    source = store.sources.get(revision_range)
+    if not store.exists(revision_range) and source is not None:
+        # Concurrent reads of the same patch share its materialization
+        diff_range, cwd, pathspecs = source
+        await (store.pending.get(revision_range)
+               or diff_engine.materialize_diff(diff_range, cwd, store, revision_range, pathspecs=pathspecs))
+    return store.exists(revision_range)
 
-        analysis = {
-            "base_branch": base_branch,
-            "files_changed": files_result.stdout,
-            "statistics": stat_result.stdout,
-            "commits": commits_result.stdout,
-            "diff": diff_content if include_diff else "Diff not included (set include_diff=true to see full diff)",
-            "truncated": truncated,
-            "total_diff_lines": len(diff_lines) if include_diff else 0
-        }
+@mcp.tool()
+async def get_diff_page(cursor: str, max_bytes: int = diff_store.DIFF_PAGE_BYTES, ctx: Context = None) -> str:
+    """
+    Get the next page of a diff truncated by analyze_file_changes, without running git again
+    :param cursor: The cursor returned by analyze_file_changes, or the next_cursor of the previous page
+    :param max_bytes: Maximum number of bytes of diff in the page (default: 65536)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: The diff of the page, the files it covers and the cursor of the next page (null on the last page)
+    """
+    try:
+        revision_range, offset = diff_store.parse_cursor(cursor)
+    except ValueError as e:
+        return generate_error_response(str(e), code=400)
 
-        return json.dumps(analysis, indent=2)
+    try:
+        repository = await repo_state.get_repo_state(await get_working_directory(ctx))
+        store = await asyncio.to_thread(diff_store.get_diff_store, repository.common_dir)
+        # The patch may still be being materialized in the background, or not materialized yet
+        await load_diff(store, revision_range)
+        page = await asyncio.to_thread(store.read_page, revision_range, offset, max_bytes)
+        if page is None:
+            return generate_error_response(f'The diff of {revision_range} is not available anymore, '
+                                           'run analyze_file_changes again', code=404)
+
+        next_offset = page.pop("next_offset")
+        page["cursor"] = cursor
+        page["next_cursor"] = diff_store.format_cursor(revision_range, next_offset) if next_offset is not None \
+            else None
+        return json.dumps(page, separators=COMPACT_SEPARATORS)
 
     except subprocess.CalledProcessError as e:
         return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
     except Exception:
-        return generate_error_response(f'Error analyzing the changes against the {base_branch} branch',
+        return generate_error_response(f'Error reading the diff page at {cursor}', traceback.format_exc())
+
+@mcp.tool()
+async def get_file_diff(path: str, cursor: Optional[str] = None, max_bytes: int = diff_store.DIFF_PAGE_BYTES,
+                        ctx: Context = None) -> str:
+    """
+    Get the diff of a single file from the latest analysis, without running git again
+    :param path: The path of the file, as listed in files.path (the new path for renamed files)
+    :param cursor: A cursor returned by analyze_file_changes, to read the file from that analysis (default: the latest
+    analysis including the diff)
+    :param max_bytes: Maximum number of bytes of diff to return (default: 65536)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: The diff of the file and its number of hunks; when truncated, next_cursor continues with get_diff_page
+    """
+    revision_range = None
+    if cursor is not None:
+        try:
+            revision_range, _ = diff_store.parse_cursor(cursor)
+        except ValueError as e:
+            return generate_error_response(str(e), code=400)
+
+    try:
+        repository = await repo_state.get_repo_state(await get_working_directory(ctx))
+        revision_range = revision_range or repository.latest_range
+        if revision_range is None:
+            return generate_error_response('No diff analyzed yet, run analyze_file_changes first', code=404)
+        store = await asyncio.to_thread(diff_store.get_diff_store, repository.common_dir)
+        # The patch may still be being materialized in the background, or not materialized yet
+        if not await load_diff(store, revision_range):
+            return generate_error_response(f'The diff of {revision_range} is not available anymore, '
+                                           'run analyze_file_changes again', code=404)
+        file_diff = await asyncio.to_thread(store.read_file, revision_range, path, max_bytes)
+        if file_diff is None:
+            return generate_error_response(f'{path} is not changed in {revision_range}', code=404)
+
+        next_offset = file_diff.pop("next_offset")
+        file_diff["next_cursor"] = diff_store.format_cursor(revision_range, next_offset) \
+            if next_offset is not None else None
+        return json.dumps(file_diff, separators=COMPACT_SEPARATORS)
+
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error reading the diff of {path}', traceback.format_exc())
+
+@mcp.tool()
+async def get_commits(cursor: str, limit: int = commit_log.COMMIT_PAGE_SIZE, ctx: Context = None) -> str:
+    """
+    Get the next page of the commits listed by analyze_file_changes
+    :param cursor: The commits_cursor returned by analyze_file_changes, or the next_cursor of the previous page
+    :param limit: Maximum number of commits in the page (default: 50, at most 500)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: The commits of the page as columns (sha, author, date, subject, files, additions, deletions and
+    categories) and the cursor of the next page (null on the last page)
+    """
+    try:
+        revision_range, offset = diff_store.parse_cursor(cursor)
+    except ValueError as e:
+        return generate_error_response(str(e), code=400)
+
+    try:
+        repository = await repo_state.get_repo_state(await get_working_directory(ctx))
+        disk_cache = await asyncio.to_thread(analysis_cache.get_disk_cache, repository.common_dir)
+        # The cursor of a scoped diff lists the commits of its revision range
+        revision_range = revision_range.partition('@')[0]
+        page = await commit_log.read_page(repository.toplevel, disk_cache, revision_range, offset, limit)
+        return json.dumps({
+            "commits": page["commits"],
+            "cursor": cursor,
+            "next_cursor": diff_store.format_cursor(revision_range, page["next_offset"])
+            if page["next_offset"] is not None else None
+        }, separators=COMPACT_SEPARATORS)
+
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error reading the commits at {cursor}', traceback.format_exc())
+
+@mcp.tool()
+async def summarize_python_changes(base_branch: str = 'main', include: Optional[list[str]] = None,
+                                   exclude: Optional[list[str]] = None, ctx: Context = None) -> str:
+    """
+    Summarize the changes of the Python files against a base branch from their syntax trees, without reading the diff
+    :param base_branch: Base branch to compare against (default = "main")
+    :param include: Only summarize the paths matching these globs (default: the configuration of the repository)
+    :param exclude: Skip the paths matching these globs (default: the configuration of the repository)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: For each Python file whose definitions changed, the functions, classes and methods added, removed and
+    modified, and the changed signatures as [name, old, new]; the files that could not be parsed are listed in errors
+    """
+    try:
+        repository = await repo_state.get_repo_state(await get_working_directory(ctx))
+        scope = await path_filters.PathScope.load(repository.toplevel, include, exclude)
+        base_sha, head_sha = await asyncio.gather(repository.resolve(base_branch), repository.resolve('HEAD'))
+        merge_base_sha = await repository.merge_base(base_sha, head_sha)
+        disk_cache = await asyncio.to_thread(analysis_cache.get_disk_cache, repository.common_dir)
+        summary = await python_summary.summarize_range(repository.toplevel, disk_cache,
+                                                       f'{merge_base_sha}...{head_sha}', scope.pathspecs())
+        return json.dumps({"base_branch": base_branch, **summary}, separators=COMPACT_SEPARATORS)
+
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error summarizing the Python changes against the {base_branch} branch',
                                        traceback.format_exc())
 
+@mcp.tool()
+async def assess_risk(base_branch: str = 'main', include: Optional[list[str]] = None,
+                      exclude: Optional[list[str]] = None, ctx: Context = None) -> str:
+    """
+    Assess the risk and the impact of the changes against a base branch from their statistics and the history of the
+    base branch, without reading the diff
+    :param base_branch: Base branch to compare against (default = "main")
+    :param include: Only assess the paths matching these globs (default: the configuration of the repository)
+    :param exclude: Skip the paths matching these globs (default: the configuration of the repository)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: The impact (High, Medium or Low), the score between 0 and 1, its factors (churn, hotness of the changed
+    files in the history of the base branch, infrastructure, dependency and configuration files touched, ratio of
+    test changes) and the risks worth mentioning
+    """
+    try:
+        directory = await get_working_directory(ctx)
+        analysis = await analyze_repository(directory, base_branch, include_diff=False, max_diff_lines=0,
+                                            include=include, exclude=exclude)
+
+        # The history index of the base branch is updated with the commits added since the last assessment
+        repository = await repo_state.get_repo_state(directory)
+        base_sha = await repository.resolve(base_branch)
+        disk_cache = await asyncio.to_thread(analysis_cache.get_disk_cache, repository.common_dir)
+        index = await history_index.update_index(repository, disk_cache, base_branch, base_sha)
+        assessment = risk_scoring.assess(diff_model.from_columns(analysis["files"]), index)
+        return json.dumps({"base_branch": base_branch, **assessment}, separators=COMPACT_SEPARATORS)
 
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error assessing the risk of the changes against the {base_branch} branch',
+                                       traceback.format_exc())
 
 @mcp.tool()
+async def suggest_reviewers(base_branch: str = 'main', limit: int = ownership.REVIEWERS_LIMIT,
+                            include: Optional[list[str]] = None, exclude: Optional[list[str]] = None,
+                            ctx: Context = None) -> str:
+    """
+    Suggest reviewers for the changes against a base branch, from the CODEOWNERS file and the authors of the changed
+    files and of their directories in the history of the base branch (without running git blame)
+    :param base_branch: Base branch to compare against (default = "main")
+    :param limit: Maximum number of suggested reviewers (default = 3)
+    :param include: Only consider the paths matching these globs (default: the configuration of the repository)
+    :param exclude: Skip the paths matching these globs (default: the configuration of the repository)
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: The suggested reviewers, the best first, with their email (or CODEOWNERS owner), name, score, number of
+    changed files they own or authored and whether they are code owners; the authors of the changes are left out
+    """
+    try:
+        directory = await get_working_directory(ctx)
+        analysis = await analyze_repository(directory, base_branch, include_diff=False, max_diff_lines=0,
+                                            include=include, exclude=exclude)
+
+        # The ownership of the base branch is updated with the commits added since the last suggestion
+        repository = await repo_state.get_repo_state(directory)
+        base_sha, head_sha = await asyncio.gather(repository.resolve(base_branch), repository.resolve('HEAD'))
+        merge_base_sha = await repository.merge_base(base_sha, head_sha)
+        disk_cache = await asyncio.to_thread(analysis_cache.get_disk_cache, repository.common_dir)
+        index, authors = await asyncio.gather(
+            history_index.update_index(repository, disk_cache, base_branch, base_sha),
+            ownership.read_authors(repository.toplevel, f'{merge_base_sha}..{head_sha}')
+        )
+        paths = [path for file in diff_model.from_columns(analysis["files"]) for path in (file.path, file.old_path)
+                 if path is not None]
+        reviewers = ownership.suggest_reviewers(index, paths, authors, limit)
+        return json.dumps({"base_branch": base_branch, "reviewers": reviewers}, separators=COMPACT_SEPARATORS)
+
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
+    except Exception:
+        return generate_error_response(f'Error suggesting reviewers for the changes against the {base_branch} branch',
+                                       traceback.format_exc())
+
+
+
+@mcp.tool()
+@cacheutils.cached(ttl=TOOL_CACHE_TTL, invalidation=cacheutils.file_version(PR_TEMPLATES_DIR),
+                   cacheable=cacheutils.without_error)
 async def get_pr_templates() -> str:
     """
     List available Pull Request templates with their content
@@ -147,12 +665,17 @@ async def get_pr_templates() -> str:
                                        traceback.format_exc())
 
 @mcp.tool()
-async def suggest_pr_template(changes_summary: str, change_type: str) -> str:
+async def suggest_pr_template(changes_summary: str = '', change_type: Optional[str] = None,
+                              base_branch: str = 'main', ctx: Context = None) -> str:
     """
-    Let a LLM analyze the changes and suggest the most appropriate Pull Request template
-    :param changes_summary: Analysis of what the changes do
-    :param change_type: Type of change you've identified (e.g. bug, feature, docs, refactor, etc.)
-    :return: Suggested Pull Request template
+    Suggest the most appropriate Pull Request template, for the given type of change or, if it is not given, for the
+    type of change classified from the changed files (without reading the diff)
+    :param changes_summary: Analysis of what the changes do (optional)
+    :param change_type: Type of change you've identified (e.g. bug, feature, docs, refactor, etc.), or None to classify
+    the changes against the base branch
+    :param base_branch: Base branch to compare against when classifying the changes (default = "main")
+    :param ctx: The context of the MCP request, providing the roots of the client
+    :return: Suggested Pull Request template, with the probability of each type of change when they were classified
     """
     try:
         # Retrieve details about the available templates
@@ -160,6 +683,17 @@ async def suggest_pr_template(changes_summary: str, change_type: str) -> str:
         template_list = json.loads(template_response)
         print(template_list)
 
+        # Classify the changed files over the types of the templates if no type of change was given
+        change_types = None
+        if change_type is None:
+            analysis = await analyze_repository(await get_working_directory(ctx), base_branch, include_diff=False,
+                                                max_diff_lines=0)
+            change_types = change_classifier.classify(diff_model.from_columns(analysis["files"]),
+                                                      tuple(template["type"] for template in template_list))
+            if not change_types:
+                return generate_error_response('Not Pull Request template were found', code=404)
+            change_type = change_types[0][0]
+
         # Determine matching template
         suggested_template = {}
         for template in template_list:
@@ -169,22 +703,35 @@ async def suggest_pr_template(changes_summary: str, change_type: str) -> str:
 
         # Generate & return the suggested pull request template
         if len(suggested_template) > 0:
+            if change_types is None:
+                reasoning = f"Based on your analysis: '{changes_summary}', this appears to be a {change_type} change."
+            else:
+                reasoning = f"Based on the changed files, this appears to be a {change_type} change " \
+                            f"(probability {change_types[0][1]:.0%})."
             suggestion = {
                 "recommended_template": suggested_template,
-                "reasoning": f"Based on your analysis: '{changes_summary}', this appears to be a {change_type} change.",
+                "reasoning": reasoning,
                 "template_content": suggested_template["content"],
                 "usage_hint": "LLM can help you fill out this template based on the specific changes in your PR."
             }
+            if change_types is not None:
+                suggestion["change_types"] = change_types
             return json.dumps(suggestion, indent=2)
         else:
             return generate_error_response(f'Not Pull Request template were found for {change_type}')
 
+    except subprocess.CalledProcessError as e:
+        return json.dumps({"error": f"Git error: {e.stderr}"})
+    except subprocess.TimeoutExpired as e:
+        return json.dumps({"error": f"Git timeout: {e}"})
     except Exception:
         return generate_error_response('Error while suggesting which Pull Request template to use',
                                        traceback.format_exc())
 
 # ===== Module 2 Tools: GitHub Actions Tools =====
 @mcp.tool()
+@cacheutils.cached(ttl=TOOL_CACHE_TTL, invalidation=cacheutils.file_version(EVENTS_FILE),
+                   cacheable=cacheutils.without_error)
 async def get_recent_actions_events(limit: int = 10) -> str:
     """
     Get recent GitHub Actions events received via webhook.
@@ -196,13 +743,16 @@ async def get_recent_actions_events(limit: int = 10) -> str:
         return json.dumps([])
 
     # Open file to access events
-    events = ioutils.read_file_json(EVENTS_FILE)
+    events = await ioutils.read_file_json(EVENTS_FILE)
 
     # Return most recent events
     recent = events[-limit:]
     return json.dumps(recent, indent=2)
 
 @mcp.tool()
+@cacheutils.cached(ttl=TOOL_CACHE_TTL, invalidation=cacheutils.file_version(EVENTS_FILE),
+                   cacheable=cacheutils.without_error)
+@asyncutils.single_flight()
 async def get_workflow_status(workflow_name: Optional[str] = None) -> str:
     """
     Get the current status of GitHub Actions workflows.
@@ -213,7 +763,7 @@ async def get_workflow_status(workflow_name: Optional[str] = None) -> str:
         return generate_error_response("No GitHub Actions events received yet", code=404)
 
     # Open file to access events
-    events = ioutils.read_file_json(EVENTS_FILE)
+    events = await ioutils.read_file_json(EVENTS_FILE)
 
     # Check whether file contains any events
     if not events:
@@ -342,19 +892,22 @@ async def generate_pr_status_report() -> str:
     """
     return """Generate a comprehensive PR status report:
     1. Use analyze_file_changes() to understand what changed
-    2. Use get_workflow_status() to check CI/CD status
-    3. Use suggest_template() to recommend the appropriate PR template
-    4. Combine all information into a cohesive report
+    2. Use summarize_python_changes() to list the functions and classes changed in Python files
+    3. Use get_workflow_status() to check CI/CD status
+    4. Use suggest_pr_template() without a change_type to classify the changes and recommend the appropriate PR template
+    5. Use assess_risk() to score the impact and list the risks of the changes
+    6. Use suggest_reviewers() to find the code owners and the most active authors of the changed files
+    7. Combine all information into a cohesive report
     
     Your report must follow this Markdown format:
     ## 📋 PR Status Report
 
     ### 📝 Code Changes
     - **Files Modified**: [Count of files by extension, e.g., 5 .py, 2 .yml]
-    - **Change Type**: [Infer one: Feature, Bug Fix, Refactor, Chore, Docs, Testing]
-    - **Impact Assessment**: [High, Medium, or Low, with a brief justification]
+    - **Change Type**: [The most probable type of change classified by suggest_pr_template]
+    - **Impact Assessment**: [The impact given by assess_risk (High, Medium, or Low), justified by its main factors]
     - **Key Changes**:
-        - [Bulleted list summarizing the most important modifications]
+        - [Bulleted list summarizing the most important modifications, based on the summary of the Python changes]
 
     ### 🔄 CI/CD Status
     - **All Checks**: [Provide a single status: ✅ Passing, ❌ Failing, or ⏳ Running]
@@ -365,10 +918,10 @@ async def generate_pr_status_report() -> str:
     ### 📌 Recommendations
     - **PR Template**: [Suggest the most appropriate PR template type (e.g., Feature, Bug Fix) and explain why.]
     - **Next Steps**: [List clear, actionable steps required for this PR to be merged, e.g., "Address failing tests," "Request review from the backend team."]
-    - **Reviewers**: [Suggest 2-3 potential reviewers based on the files and code changed.]
+    - **Reviewers**: [The 2-3 reviewers suggested by suggest_reviewers, mentioning the code owners.]
 
     ### ⚠️ Risks & Considerations
-    - [Identify any potential deployment risks, performance impacts, or security concerns.]
+    - [List the risks found by assess_risk, and any other deployment risks, performance impacts, or security concerns.]
     - [Explicitly state if there are any breaking changes.]
     - [Mention any important dependencies that are added, removed, or updated.]"""
 
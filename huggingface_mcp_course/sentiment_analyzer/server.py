@@ -3,6 +3,10 @@ import json
 import gradio as gr
 from textblob import TextBlob
 
+from huggingface_mcp_course.utils import cacheutils
+
+
+@cacheutils.cached(max_entries=1024)
 def sentiment_analysis(text: str) -> str:
     """
     Analyze the sentiment of a given text
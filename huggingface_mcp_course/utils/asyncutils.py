@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import inspect
+from typing import Any, Awaitable, Callable
+
+from huggingface_mcp_course.utils.cacheutils import argument_key
+
+class FanOut:
+    """
+    Forwarder of the calls of coroutine methods to the members it groups (e.g. the progress senders of the callers of
+    a coalesced call). A member joining late first receives the calls made before it joined, in their order.
+    """
+
+    def __init__(self):
+        self.members = []
+        self.calls: list[tuple[str, tuple, dict]] = []
+
+    async def join(self, member: Any):
+        """
+        Add a member, replaying the calls made so far
+        :param member: The member, whose coroutine methods are called
+        """
+        replayed = 0
+        # Calls may be made while the previous ones are replayed
+        while replayed < len(self.calls):
+            name, args, kwargs = self.calls[replayed]
+            replayed += 1
+            await getattr(member, name)(*args, **kwargs)
+        self.members.append(member)
+
+    def leave(self, member: Any):
+        """
+        Remove a member, which receives no more calls
+        :param member: The member
+        """
+        self.members.remove(member)
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable]:
+        """
+        :param name: The name of a coroutine method of the members
+        :return: A coroutine function calling the method of every member
+        """
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        async def forward(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            for member in list(self.members):
+                await getattr(member, name)(*args, **kwargs)
+        return forward
+
+def single_flight(ignore: tuple[str, ...] = (), fan_out: tuple[str, ...] = ()) -> Callable:
+    """
+    Decorator coalescing the concurrent calls of a coroutine function made with the same arguments:
+    the first call runs the coroutine, and the calls made while it is in flight share its result (or its exception).
+    A caller that is cancelled stops waiting without cancelling the others, the coroutine being cancelled once all
+    its callers are.
+    :param ignore: The names of the parameters that are not part of the key of a call (e.g. a per-request context)
+    :param fan_out: The names of the parameters that are not part of the key of a call either, but whose values are
+    grouped: the coroutine receives a FanOut of the values given by the callers still waiting for it (None values
+    are left out)
+    :return: The decorator
+    """
+    def decorator(function: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        signature = inspect.signature(function)
+        # Calls in flight, their number of callers and the fan-outs of their grouped parameters, keyed by their
+        # arguments
+        in_flight: dict[str, list] = {}
+
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            key = argument_key(signature, args, kwargs, ignore + fan_out)
+            arguments = signature.bind(*args, **kwargs)
+            arguments.apply_defaults()
+            members = {name: arguments.arguments[name] for name in fan_out}
+            flight = in_flight.get(key)
+            if flight is None:
+                # The call in flight receives the fan-outs of the grouped parameters instead of their values
+                fan_outs = {name: FanOut() for name in fan_out}
+                arguments.arguments.update(fan_outs)
+                task = asyncio.create_task(function(*arguments.args, **arguments.kwargs))
+                flight = in_flight[key] = [task, 0, fan_outs]
+                flight[0].add_done_callback(lambda _: in_flight.pop(key) if in_flight.get(key) is flight else None)
+            task = flight[0]
+            flight[1] += 1
+            members = [(flight[2][name], member) for name, member in members.items() if member is not None]
+            joined = []
+            try:
+                for group, member in members:
+                    await group.join(member)
+                    joined.append((group, member))
+                return await asyncio.shield(task)
+            finally:
+                for group, member in joined:
+                    group.leave(member)
+                flight[1] -= 1
+                # Cancel the call abandoned by all its callers, and wait for it to clean up
+                if flight[1] == 0 and not task.done():
+                    if in_flight.get(key) is flight:
+                        del in_flight[key]
+                    task.cancel()
+                    await asyncio.wait([task])
+
+        wrapper.in_flight = in_flight
+        return wrapper
+
+    return decorator
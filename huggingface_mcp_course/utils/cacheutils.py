@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+
+def argument_key(signature: inspect.Signature, args: tuple, kwargs: dict, ignore: tuple[str, ...] = ()) -> str:
+    """
+    Build the key identifying the arguments of a call, whether they were given by position, by name or by default
+    :param signature: The signature of the called function
+    :param args: The positional arguments of the call
+    :param kwargs: The keyword arguments of the call
+    :param ignore: The names of the parameters that are not part of the key (default = none)
+    :return: The key of the call (arguments that cannot be serialized only match themselves)
+    """
+    arguments = signature.bind(*args, **kwargs)
+    arguments.apply_defaults()
+    return json.dumps([[name, value] for name, value in arguments.arguments.items() if name not in ignore],
+                      default=repr)
+
+def file_version(*paths: str) -> Callable[..., tuple]:
+    """
+    Invalidation key following the inode, modification time and size of files
+    (and of the entries of directories, so that adding, removing or editing one of their files is detected)
+    :param paths: The paths of the files or directories
+    :return: A function returning the current version of the paths, whatever the arguments of the call
+    """
+    def version(*args, **kwargs) -> tuple:
+        return tuple(_stat_version(path) for path in paths)
+    return version
+
+def _stat_version(path: str) -> Optional[tuple]:
+    """
+    :param path: The path of a file or directory
+    :return: The inode, modification time and size of the path (with the versions of the entries of a directory), or
+    None if it does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if os.path.isdir(path):
+        with os.scandir(path) as entries:
+            version += tuple(sorted((entry.name, _stat_version(entry.path)) for entry in entries))
+    return version
+
+def without_error(result: Any) -> bool:
+    """
+    Cacheability predicate of the tools returning JSON, whose errors are transient (e.g. a file that does not exist yet)
+    :param result: The result of a call
+    :return: False if the result is a JSON object with an "error" key, True otherwise
+    """
+    try:
+        value = json.loads(result) if isinstance(result, (str, bytes)) else result
+    except ValueError:
+        return True
+    return not (isinstance(value, dict) and "error" in value)
+
+class VersionCounter:
+    """
+    Invalidation key bumped explicitly whenever the cached results become stale
+    """
+
+    def __init__(self):
+        self.version = 0
+
+    def bump(self):
+        """
+        Invalidate the results cached with this counter
+        """
+        self.version += 1
+
+    def __call__(self, *args, **kwargs) -> int:
+        """
+        :return: The current version, whatever the arguments of the call
+        """
+        return self.version
+
+def cached(ttl: Optional[float] = None, max_entries: int = 128, invalidation: Optional[Callable[..., Any]] = None,
+           ignore: tuple[str, ...] = (), cacheable: Optional[Callable[[Any], bool]] = None) -> Callable:
+    """
+    Decorator caching the results of a function (or a coroutine function) by arguments, in a least recently used cache.
+    A cached result is computed again once it expires, or once the invalidation key differs from the one it was
+    computed with. Exceptions are never cached. The decorated function exposes cache_info() and cache_clear().
+    :param ttl: Time to live of the results in seconds (default = no expiration)
+    :param max_entries: Maximum number of cached results (default = 128)
+    :param invalidation: Function called with the arguments of each call and returning its invalidation key, which can
+    be awaitable for a coroutine function (e.g. file_version, VersionCounter or the SHA of a git ref; default = none)
+    :param ignore: The names of the parameters that are not part of the key of a call (e.g. a per-request context)
+    :param cacheable: Function called with each computed result, returning False for a result that must not be
+    cached (e.g. without_error; default = all the results are cached)
+    :return: The decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        signature = inspect.signature(function)
+        # Cached results with their expiration time and invalidation key, the least recently used first
+        entries: OrderedDict[str, tuple[Any, Optional[float], Hashable]] = OrderedDict()
+        info = {"hits": 0, "misses": 0}
+        # Synchronous functions may be called from several threads at once (e.g. the threadpool of Gradio)
+        lock = threading.Lock()
+
+        def lookup(key: str, version: Hashable) -> tuple[bool, Any]:
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and (entry[1] is None or entry[1] > time.monotonic()) and entry[2] == version:
+                    entries.move_to_end(key)
+                    info["hits"] += 1
+                    return True, entry[0]
+                info["misses"] += 1
+                return False, None
+
+        def store(key: str, version: Hashable, result: Any):
+            if cacheable is not None and not cacheable(result):
+                return
+            with lock:
+                entries[key] = (result, time.monotonic() + ttl if ttl is not None else None, version)
+                entries.move_to_end(key)
+                while len(entries) > max_entries:
+                    entries.popitem(last=False)
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                key = argument_key(signature, args, kwargs, ignore)
+                version = invalidation(*args, **kwargs) if invalidation is not None else None
+                if inspect.isawaitable(version):
+                    version = await version
+                hit, result = lookup(key, version)
+                if not hit:
+                    result = await function(*args, **kwargs)
+                    store(key, version, result)
+                return result
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                key = argument_key(signature, args, kwargs, ignore)
+                version = invalidation(*args, **kwargs) if invalidation is not None else None
+                hit, result = lookup(key, version)
+                if not hit:
+                    result = function(*args, **kwargs)
+                    store(key, version, result)
+                return result
+
+        def cache_info() -> dict:
+            """
+            :return: The number of "hits" and "misses" of the cache, and its number of "entries"
+            """
+            with lock:
+                return {**info, "entries": len(entries)}
+
+        def cache_clear():
+            """
+            Remove all the cached results and reset the counters
+            """
+            with lock:
+                entries.clear()
+                info.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
@@ -1,10 +1,16 @@
 from mcp.server.fastmcp import FastMCP
 
+from huggingface_mcp_course.utils import cacheutils
+
 # create a new FastMCP server
 mcp = FastMCP("Weather Service")
 
+# Time to live in seconds of the weather information of a location
+WEATHER_CACHE_TTL = 600
+
 # Tool Implementation
 @mcp.tool()
+@cacheutils.cached(ttl=WEATHER_CACHE_TTL)
 def get_weather(location: str) -> str:
     """
     Get the current weather for a specified location
@@ -15,6 +21,7 @@ def get_weather(location: str) -> str:
 
 # Resource Implementation
 @mcp.resource("weather://{location}")
+@cacheutils.cached(ttl=WEATHER_CACHE_TTL)
 def weather_resource(location: str) -> str:
     """
     Get the weather information for a specified location from a external resource
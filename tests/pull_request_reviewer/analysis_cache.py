@@ -0,0 +1,110 @@
+import json
+
+from huggingface_mcp_course.pull_request_reviewer.analysis_cache import AnalysisCache, DiskCache
+
+
+def analysis_of_size(size: int) -> dict:
+    """
+    :param size: The size of the JSON serialization of the analysis
+    :return: An analysis whose serialization has the given size
+    """
+    analysis = {"diff": ''}
+    analysis["diff"] = 'x' * (size - len(json.dumps(analysis)))
+    return analysis
+
+
+class TestAnalysisCache:
+    """Test the size-bounded LRU cache of analyses."""
+
+    def test_get_and_put(self):
+        """Test that cached analyses are returned and counted as hits."""
+        cache = AnalysisCache(max_bytes=1000)
+        cache.put(('base', 'head', True, 500), {"diff": "content"})
+
+        assert cache.get(('base', 'head', True, 500)) == {"diff": "content"}
+        assert cache.get(('base', 'head', False, 500)) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evicts_least_recently_used(self):
+        """Test that the least recently used analyses are evicted to respect the size budget."""
+        cache = AnalysisCache(max_bytes=300)
+        cache.put('a', analysis_of_size(100))
+        cache.put('b', analysis_of_size(100))
+        cache.put('c', analysis_of_size(100))
+        cache.get('a')
+        cache.put('d', analysis_of_size(100))
+
+        assert cache.get('b') is None
+        assert all(cache.get(key) is not None for key in ['a', 'c', 'd'])
+        assert cache.size == 300
+
+    def test_skips_oversized_analysis(self):
+        """Test that an analysis larger than the budget is not cached."""
+        cache = AnalysisCache(max_bytes=50)
+        cache.put('a', analysis_of_size(100))
+
+        assert len(cache) == 0
+        assert cache.size == 0
+
+    def test_replaces_existing_entry(self):
+        """Test that putting an existing key does not count its size twice."""
+        cache = AnalysisCache(max_bytes=1000)
+        cache.put('a', analysis_of_size(100))
+        cache.put('a', analysis_of_size(200))
+
+        assert len(cache) == 1
+        assert cache.size == 200
+
+
+class TestDiskCache:
+    """Test the persistent LRU cache stored in SQLite."""
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that documents are still available after reopening the database."""
+        path = str(tmp_path / 'pr-agent' / 'cache.sqlite')
+        disk_cache = DiskCache(path)
+        disk_cache.put('analysis', 'base:head', {"diff": "content"})
+        disk_cache.close()
+
+        reopened = DiskCache(path)
+        assert reopened.get('analysis', 'base:head') == {"diff": "content"}
+        assert reopened.get('commits', 'base:head') is None
+        assert reopened.size > 0
+
+    def test_prunes_least_recently_used(self, tmp_path):
+        """Test that the least recently used documents are deleted to respect the size cap."""
+        disk_cache = DiskCache(str(tmp_path / 'cache.sqlite'))
+        disk_cache.put('analysis', 'a', 'a')
+        entry_size = disk_cache.size
+        disk_cache.max_bytes = 2 * entry_size
+        disk_cache.put('analysis', 'b', 'b')
+        disk_cache.get('analysis', 'a')
+        disk_cache.put('analysis', 'c', 'c')
+
+        assert disk_cache.get('analysis', 'b') is None
+        assert disk_cache.get('analysis', 'a') == 'a'
+        assert disk_cache.get('analysis', 'c') == 'c'
+        assert disk_cache.size == 2 * entry_size
+
+    def test_prunes_across_instances(self, tmp_path):
+        """Test that the documents stored by another connection to the database count in the size cap."""
+        path = str(tmp_path / 'cache.sqlite')
+        disk_cache, other = DiskCache(path), DiskCache(path)
+        disk_cache.put('analysis', 'a', 'a')
+        entry_size = disk_cache.size
+        disk_cache.max_bytes = other.max_bytes = 2 * entry_size
+        other.put('analysis', 'b', 'b')
+        disk_cache.put('analysis', 'c', 'c')
+
+        assert disk_cache.get('analysis', 'a') is None
+        assert other.get('analysis', 'b') == 'b'
+        assert disk_cache.size == 2 * entry_size
+
+    def test_get_many(self, tmp_path):
+        """Test that several documents of a namespace are retrieved at once, leaving out the missing keys."""
+        disk_cache = DiskCache(str(tmp_path / 'cache.sqlite'))
+        disk_cache.put_many('patch-ids', {"a": 1, "b": 2})
+        disk_cache.put('commits', 'c', 3)
+
+        assert disk_cache.get_many('patch-ids', ['a', 'b', 'c']) == {"a": 1, "b": 2}
+        assert disk_cache.get_many('patch-ids', []) == {}
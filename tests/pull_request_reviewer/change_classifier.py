@@ -0,0 +1,56 @@
+from huggingface_mcp_course.pull_request_reviewer import change_classifier
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+
+class TestVote:
+    """Test the votes of the changed files."""
+
+    def test_path_rules(self):
+        """Test that the path rules take precedence over the numstat, and that lockfiles do not vote."""
+        assert change_classifier.vote(FileChange('A', 'tests/test_app.py', additions=50)) == {"test": 1.0}
+        assert change_classifier.vote(FileChange('M', 'docs/guide.md', additions=5)) == {"docs": 1.0}
+        assert change_classifier.vote(FileChange('M', 'src/auth/login.py', additions=2))["security"] == 0.7
+        assert change_classifier.vote(FileChange('M', 'poetry.lock', additions=500)) == {}
+
+    def test_path_rules_match_words(self):
+        """Test that dependency manifests are not docs, and that keywords only match whole words of the path."""
+        assert change_classifier.vote(FileChange('M', 'requirements-dev.txt', additions=1))["security"] == 0.3
+        assert change_classifier.vote(FileChange('M', 'docs/requirements.txt', additions=1))["bug"] == 0.4
+        assert change_classifier.vote(FileChange('M', 'src/oauth_client.py', additions=2))["security"] == 0.7
+        assert change_classifier.vote(FileChange('M', 'src/cache/store.py', additions=2))["performance"] == 0.6
+        assert "security" not in change_classifier.vote(FileChange('M', 'src/author.py', additions=2))
+        assert "performance" not in change_classifier.vote(FileChange('M', 'src/whirlpool.py', additions=2))
+
+    def test_numstat_rules(self):
+        """Test that the other source files vote from their status and numstat."""
+        assert change_classifier.vote(FileChange('A', 'src/app.py', additions=50)) == {"feature": 1.0}
+        assert change_classifier.vote(FileChange('R090', 'src/app.py', 'app.py')) == {"refactor": 1.0}
+        assert change_classifier.vote(FileChange('M', 'src/app.py', additions=10, deletions=40))["refactor"] == 0.8
+        assert change_classifier.vote(FileChange('M', 'src/app.py', additions=2, deletions=1))["bug"] == 0.6
+
+
+class TestClassify:
+    """Test the classification of change sets."""
+
+    def test_ranks_probabilities(self):
+        """Test that the types are ranked by probability, over the requested types only."""
+        files = [
+            FileChange('A', 'src/feature.py', additions=120),
+            FileChange('A', 'src/helpers.py', additions=30),
+            FileChange('A', 'tests/test_feature.py', additions=40),
+            FileChange('M', 'README.md', additions=3)
+        ]
+
+        ranked = change_classifier.classify(files)
+
+        assert [change_type for change_type, _ in ranked[:3]] == ['feature', 'test', 'docs']
+        assert abs(sum(probability for _, probability in ranked) - 1) < 0.01
+        assert [change_type for change_type, _ in change_classifier.classify(files, ('docs', 'test'))] == \
+               ['test', 'docs']
+
+    def test_empty_change_set(self):
+        """Test that an empty change set gives every type the same probability."""
+        ranked = change_classifier.classify([], ('bug', 'docs'))
+
+        assert ranked == [('bug', 0.5), ('docs', 0.5)]
+        assert change_classifier.classify([], ()) == []
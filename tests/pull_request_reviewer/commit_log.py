@@ -0,0 +1,56 @@
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import commit_log
+from huggingface_mcp_course.pull_request_reviewer.analysis_cache import DiskCache
+from tests.pull_request_reviewer.patch_index import feature_repo, rev_list
+
+
+class TestReadPage:
+    """Test the structured, paginated commit log."""
+
+    @pytest.mark.asyncio
+    async def test_pages_cover_the_log(self, feature_repo):
+        """Test that following the next offsets lists every commit once, the newest first."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+        revision_range = f'{rev_list(feature_repo, "main")[0]}..{rev_list(feature_repo, "feature")[0]}'
+
+        first = await commit_log.read_page(str(feature_repo), disk_cache, revision_range, limit=2)
+        second = await commit_log.read_page(str(feature_repo), disk_cache, revision_range, first["next_offset"], 2)
+
+        assert first["next_offset"] == 2 and second["next_offset"] is None
+        assert first["commits"]["sha"] + second["commits"]["sha"] == rev_list(feature_repo, revision_range)
+        assert first["commits"]["subject"] == ['Lock', 'Rename a']
+        assert first["commits"]["author"] == ['Test', 'Test']
+        assert first["commits"]["files"] == [2, 1]
+        assert second["commits"]["additions"] == [1]
+
+    @pytest.mark.asyncio
+    async def test_reads_only_the_requested_commits(self, feature_repo):
+        """Test that git log is limited to the page, and that pages are cached."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+        revision_range = f'{rev_list(feature_repo, "main")[0]}..{rev_list(feature_repo, "feature")[0]}'
+        calls = []
+        original = commit_log.read_log
+
+        async def read_log(cwd, revision_range, offset, limit):
+            calls.append((offset, limit))
+            return await original(cwd, revision_range, offset, limit)
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(commit_log, 'read_log', read_log)
+            page = await commit_log.read_page(str(feature_repo), disk_cache, revision_range, 1, 1)
+            cached = await commit_log.read_page(str(feature_repo), disk_cache, revision_range, 1, 1)
+
+        assert calls == [(1, 2)]
+        assert page == cached
+        assert page["commits"]["subject"] == ['Rename a']
+
+    @pytest.mark.asyncio
+    async def test_unknown_range_raises(self, feature_repo):
+        """Test that git errors are reported as CalledProcessError."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+
+        with pytest.raises(subprocess.CalledProcessError):
+            await commit_log.read_page(str(feature_repo), disk_cache, 'unknown..feature')
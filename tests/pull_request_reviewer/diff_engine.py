@@ -0,0 +1,160 @@
+import asyncio
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine
+from huggingface_mcp_course.pull_request_reviewer.diff_model import Hunk
+
+# Output of `git diff --raw --numstat --patch -z --no-abbrev` for a rename, a modification and a binary file
+SAMPLE_OUTPUT = (
+    b':100644 100644 ce01362 ce01362 R100\0r.md\0README.md\0'
+    b':100644 100644 bdc955b 8835708 M\0bin.dat\0'
+    b':100644 100644 de98044 a7bc997 M\0x.py\0'
+    b'0\t0\t\0r.md\0README.md\0'
+    b'-\t-\tbin.dat\0'
+    b'2\t1\tx.py\0'
+    b'\0'
+    b'diff --git a/r.md b/README.md\n'
+    b'similarity index 100%\n'
+    b'rename from r.md\n'
+    b'rename to README.md\n'
+    b'diff --git a/bin.dat b/bin.dat\n'
+    b'index bdc955b..8835708 100644\n'
+    b'Binary files a/bin.dat and b/bin.dat differ\n'
+    b'diff --git a/x.py b/x.py\n'
+    b'--- a/x.py\n'
+    b'+++ b/x.py\n'
+    b'@@ -1,3 +1,4 @@\n'
+    b' a\n'
+    b'-b\n'
+    b'+B\n'
+    b' c\n'
+    b'+d\n'
+)
+
+
+def sample_reader(output: bytes = SAMPLE_OUTPUT) -> diff_engine.DiffReader:
+    """
+    :param output: The output of git diff to stream
+    :return: A reader over the given output
+    """
+    stream = asyncio.StreamReader()
+    stream.feed_data(output)
+    stream.feed_eof()
+    return diff_engine.DiffReader(stream)
+
+
+@pytest.fixture
+def large_repo(tmp_path):
+    """Create a git repository whose feature branch adds a large file."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    (tmp_path / 'README.md').write_text('readme\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    (tmp_path / 'large.txt').write_text(''.join(f'line {i}\n' for i in range(20000)))
+    git('add', '.')
+    git('commit', '-q', '-m', 'Add large file')
+    return tmp_path
+
+
+class TestDiffReader:
+    """Test the incremental parsing of the combined raw, numstat and patch output."""
+
+    @pytest.mark.asyncio
+    async def test_reads_files(self):
+        """Test that raw and numstat records are merged per file."""
+        files = await sample_reader().read_files()
+
+        assert [file.path for file in files] == ['README.md', 'bin.dat', 'x.py']
+        assert files[0].old_path == 'r.md'
+        assert files[0].status == 'R100'
+        assert files[1].binary is True
+        assert (files[2].additions, files[2].deletions) == (2, 1)
+
+    @pytest.mark.asyncio
+    async def test_reads_selected_patches(self):
+        """Test that the patches of the selected files are split into header and hunks."""
+        reader = sample_reader()
+        files = await reader.read_files()
+        patches = await reader.read_patches({2})
+
+        assert list(patches) == [2]
+        assert patches[2]["header"] == [b'diff --git a/x.py b/x.py\n', b'--- a/x.py\n', b'+++ b/x.py\n']
+        assert patches[2]["hunks"] == [[b'@@ -1,3 +1,4 @@\n', b' a\n', b'-b\n', b'+B\n', b' c\n', b'+d\n']]
+        assert patches[2]["complete"] is True
+        assert [file.hunks for file in files] == [[], [], [Hunk(1, 3, 1, 4)]]
+
+    @pytest.mark.asyncio
+    async def test_stops_at_byte_budget(self):
+        """Test that a hunk that does not fit in the byte budget is dropped."""
+        reader = sample_reader()
+        files = await reader.read_files()
+        patches = await reader.read_patches({2}, max_bytes=60)
+
+        assert patches[2]["hunks"] == []
+        assert patches[2]["complete"] is False
+        assert files[2].hunks is None
+
+    @pytest.mark.asyncio
+    async def test_stops_at_deadline(self):
+        """Test that the patches read before the deadline are kept when git is too slow."""
+        stream = asyncio.StreamReader()
+        stream.feed_data(SAMPLE_OUTPUT[:SAMPLE_OUTPUT.index(b' c\n')])
+        reader = diff_engine.DiffReader(stream)
+        files = await reader.read_files()
+        patches = await reader.read_patches({0, 2}, deadline=asyncio.get_running_loop().time() + 0.05)
+
+        assert reader.timed_out is True
+        assert patches[0]["complete"] is True
+        assert patches[2]["complete"] is False
+        assert patches[2]["hunks"] == []
+        assert files[2].hunks is None
+
+    @pytest.mark.asyncio
+    async def test_empty_output(self):
+        """Test that an empty diff has neither files nor patches."""
+        reader = sample_reader(b'')
+
+        assert await reader.read_files() == []
+        assert await reader.read_patches(set()) == {}
+
+
+class TestReadDiff:
+    """Test the single-pass diff against a real repository."""
+
+    @pytest.mark.asyncio
+    async def test_truncates_large_diff(self, large_repo):
+        """Test that a large diff is cut at max_lines while the total comes from numstat."""
+        diff = await diff_engine.read_diff('main...HEAD', str(large_repo), max_lines=50)
+
+        assert diff["truncated"] is True
+        assert diff["patch"].count('\n') == 50
+        assert diff["omitted"][0]["partial"] is True
+        assert diff_engine.count_changed_lines(diff["files"]) == 20000
+
+    @pytest.mark.asyncio
+    async def test_source_is_packed_before_lockfile(self, large_repo):
+        """Test that a lockfile coming first in git order does not hide the source changes."""
+        subprocess.run(['git', 'mv', 'large.txt', 'a.lock'], cwd=large_repo, check=True)
+        (large_repo / 'z.py').write_text('print("hello")\n')
+        subprocess.run(['git', 'add', '.'], cwd=large_repo, check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', 'Add source'], cwd=large_repo, check=True)
+
+        diff = await diff_engine.read_diff('main...HEAD', str(large_repo), max_lines=50)
+
+        assert diff["patch"].startswith('diff --git a/z.py b/z.py\n')
+        assert diff["patch"].endswith('+print("hello")\n')
+        assert [(file["path"], file["category"]) for file in diff["omitted"]] == [('a.lock', 'lockfile')]
+
+    @pytest.mark.asyncio
+    async def test_unknown_branch_raises(self, large_repo):
+        """Test that git errors are reported as CalledProcessError."""
+        with pytest.raises(subprocess.CalledProcessError):
+            await diff_engine.read_diff('unknown...HEAD', str(large_repo))
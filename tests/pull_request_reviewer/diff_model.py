@@ -0,0 +1,40 @@
+import json
+
+from huggingface_mcp_course.pull_request_reviewer import diff_model
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange, Hunk
+
+
+class TestHunk:
+    """Test the parsing of hunk headers."""
+
+    def test_parse(self):
+        """Test that omitted line counts default to a single line."""
+        assert Hunk.parse(b'@@ -1,3 +1,4 @@ def main():\n') == Hunk(1, 3, 1, 4)
+        assert Hunk.parse(b'@@ -5 +5 @@\n') == Hunk(5, 1, 5, 1)
+        assert Hunk.parse(b'@@@ -1,2 -1,2 +1,3 @@@\n') is None
+
+
+class TestColumns:
+    """Test the columnar serialization of the changed files."""
+
+    def test_round_trip(self):
+        """Test that the columns are JSON serializable and deserialized back."""
+        files = [
+            FileChange('R100', 'README.md', 'r.md', hunks=[]),
+            FileChange('M', 'bin.dat', binary=True),
+            FileChange('M', 'x.py', additions=2, deletions=1, hunks=[Hunk(1, 3, 1, 4), Hunk(10, 1, 11, 1)])
+        ]
+
+        columns = json.loads(json.dumps(diff_model.to_columns(files)))
+
+        assert columns["path"] == ['README.md', 'bin.dat', 'x.py']
+        assert columns["hunks"] == [[], None, [1, 3, 1, 4, 10, 1, 11, 1]]
+        parsed = diff_model.from_columns(columns)
+        assert [(file.path, file.old_path, file.binary, file.hunks) for file in parsed] == \
+               [(file.path, file.old_path, file.binary, file.hunks) for file in files]
+
+    def test_summarize(self):
+        """Test that the statistics add up the changed lines of the files."""
+        files = [FileChange('M', 'a.py', additions=2, deletions=1), FileChange('A', 'b.py', additions=5)]
+
+        assert diff_model.summarize(files) == {"files": 2, "additions": 7, "deletions": 1}
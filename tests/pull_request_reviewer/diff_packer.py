@@ -0,0 +1,83 @@
+from huggingface_mcp_course.pull_request_reviewer import diff_packer
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+
+def changed_file(path: str, changed_lines: int) -> FileChange:
+    """
+    :param path: The path of the file
+    :param changed_lines: The number of added lines
+    :return: A changed file as returned by DiffReader.read_files
+    """
+    return FileChange('M', path, additions=changed_lines)
+
+
+def file_patch(path: str, *hunk_sizes: int) -> dict:
+    """
+    :param path: The path of the file
+    :param hunk_sizes: The number of lines of each hunk
+    :return: A complete patch as returned by DiffReader.read_patches
+    """
+    return {
+        "header": [f'diff --git a/{path} b/{path}\n'.encode()],
+        "hunks": [[b'@@ -1 +1 @@\n'] + [b'+line\n'] * (size - 1) for size in hunk_sizes],
+        "complete": True
+    }
+
+
+class TestCategorize:
+    """Test the categories used to rank the files."""
+
+    def test_categories(self):
+        """Test that lockfiles, vendored and generated files are recognized."""
+        assert diff_packer.categorize('src/app.py') == diff_packer.SOURCE
+        assert diff_packer.categorize('poetry.lock') == diff_packer.LOCKFILE
+        assert diff_packer.categorize('web/package-lock.json') == diff_packer.LOCKFILE
+        assert diff_packer.categorize('vendor/github.com/lib/lib.go') == diff_packer.VENDORED
+        assert diff_packer.categorize('api/service_pb2.py') == diff_packer.GENERATED
+        assert diff_packer.categorize('static/app.min.js') == diff_packer.GENERATED
+
+
+class TestPack:
+    """Test the packing of the hunks within the budget."""
+
+    def test_source_before_lockfile(self):
+        """Test that source hunks are packed first and that the lockfile is listed in the manifest."""
+        files = [changed_file('package-lock.json', 30), changed_file('app.py', 5)]
+        patches = {0: file_patch('package-lock.json', 30), 1: file_patch('app.py', 5)}
+
+        packed, manifest = diff_packer.pack(files, patches, max_lines=20)
+
+        # The lockfile only fills the lines left by the source file, in git order
+        assert packed.endswith('diff --git a/app.py b/app.py\n@@ -1 +1 @@\n' + '+line\n' * 4)
+        assert packed.count('\n') == 20
+        assert manifest == [{"path": 'package-lock.json', "category": diff_packer.LOCKFILE, "changed_lines": 30,
+                             "omitted_hunks": 1, "partial": True}]
+
+    def test_smaller_hunks_first(self):
+        """Test that smaller hunks of the same category are preferred."""
+        files = [changed_file('a.py', 12), changed_file('b.py', 3)]
+        patches = {0: file_patch('a.py', 6, 6), 1: file_patch('b.py', 3)}
+
+        packed, manifest = diff_packer.pack(files, patches, max_lines=12)
+
+        assert packed.count('\n') == 11
+        assert manifest[0]["path"] == 'a.py'
+        assert manifest[0]["omitted_hunks"] == 1
+        assert diff_packer.summarize_manifest(manifest) == {"path": ['a.py'], "category": [diff_packer.SOURCE],
+                                                            "changed_lines": [12], "omitted_hunks": [1],
+                                                            "partial": [False], "total": 1}
+
+    def test_fits_token_budget(self):
+        """Test that the token budget is respected."""
+        files = [changed_file('a.py', 1000)]
+        patches = {0: file_patch('a.py', *([10] * 100))}
+
+        packed, _ = diff_packer.pack(files, patches, max_lines=10000, max_tokens=100)
+
+        assert diff_packer.estimate_tokens(len(packed.encode())) <= 100
+
+    def test_plan_skips_large_files(self):
+        """Test that only the files fitting in the read budget are planned."""
+        files = [changed_file('yarn.lock', 100000), changed_file('app.py', 10)]
+
+        assert diff_packer.plan_files(files) == {1}
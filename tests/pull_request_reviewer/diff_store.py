@@ -0,0 +1,150 @@
+import os
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, diff_store
+
+# Fixture shared with the diff engine tests
+from tests.pull_request_reviewer.diff_engine import large_repo
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create an empty diff store."""
+    return diff_store.DiffStore(str(tmp_path / 'diffs'))
+
+
+async def materialize(repo, store: diff_store.DiffStore, revision_range: str = 'main..HEAD') -> bytes:
+    """
+    Materialize the diff of a repository in a store
+    :param repo: The path to the repository
+    :param store: The store in which the diff is materialized
+    :param revision_range: The key of the diff in the store
+    :return: The patch printed by git diff
+    """
+    await diff_engine.read_diff('main...HEAD', str(repo), max_lines=50, store=store, store_key=revision_range)
+    await store.wait(revision_range)
+    return subprocess.run(['git', 'diff', '--no-abbrev', 'main...HEAD'], cwd=repo, check=True,
+                          capture_output=True).stdout
+
+
+class TestDiffStore:
+    """Test the materialization and pagination of whole patches."""
+
+    @pytest.mark.asyncio
+    async def test_pages_add_up_to_patch(self, large_repo, store):
+        """Test that reading the pages one after the other returns the patch printed by git."""
+        expected = await materialize(large_repo, store)
+
+        pages = []
+        offset = 0
+        while offset is not None:
+            page = store.read_page('main..HEAD', offset, max_bytes=10000)
+            assert len(page["diff"]) <= 10000
+            pages.append(page["diff"])
+            offset = page["next_offset"]
+
+        assert ''.join(pages).encode() == expected
+        assert not store.pending
+
+    @pytest.mark.asyncio
+    async def test_index_covers_files_and_hunks(self, large_repo, store):
+        """Test that the index points at the start of each file and hunk."""
+        subprocess.run(['git', 'rm', '-q', 'README.md'], cwd=large_repo, check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', 'Remove readme'], cwd=large_repo, check=True)
+        await materialize(large_repo, store)
+
+        index = store.load_index('main..HEAD')
+        assert [file["path"] for file in index["files"]] == ['README.md', 'large.txt']
+        for file in index["files"]:
+            assert store.read('main..HEAD', file["offset"], 11) == b'diff --git '
+            assert all(store.read('main..HEAD', hunk[0], 3) == b'@@ ' for hunk in file["hunks"])
+
+    @pytest.mark.asyncio
+    async def test_reads_single_file(self, large_repo, store):
+        """Test that the patch of a single file is served from its byte range."""
+        (large_repo / 'README.md').write_text('new readme\n')
+        subprocess.run(['git', 'commit', '-q', '-am', 'Update readme'], cwd=large_repo, check=True)
+        await materialize(large_repo, store)
+
+        readme = store.read_file('main..HEAD', 'README.md')
+        assert readme["diff"].startswith('diff --git a/README.md b/README.md\n')
+        assert readme["diff"].endswith('-readme\n+new readme\n')
+        assert (readme["hunks"], readme["truncated"], readme["next_offset"]) == (1, False, None)
+
+        large = store.read_file('main..HEAD', 'large.txt', max_bytes=1000)
+        assert large["truncated"] is True
+        assert large["diff"].endswith('\n')
+        assert store.read_page('main..HEAD', large["next_offset"], 100)["diff"].startswith('+line ')
+
+        assert store.read_file('main..HEAD', 'unknown.txt') is None
+
+    @pytest.mark.asyncio
+    async def test_prune_keeps_budget(self, large_repo, tmp_path):
+        """Test that patches exceeding the size budget are deleted."""
+        store = diff_store.DiffStore(str(tmp_path / 'diffs'), max_bytes=1000)
+        await materialize(large_repo, store)
+
+        assert not store.exists('main..HEAD')
+        assert store.read_page('main..HEAD', 0) is None
+
+    def test_prune_spools_and_indexes(self, tmp_path):
+        """Test that spools count in the budget, that stale ones are deleted and that kept indexes stay in memory."""
+        store = diff_store.DiffStore(str(tmp_path / 'diffs'), max_bytes=1000)
+        stale = store.create_spool()
+        stale.write(b'x' * 2000)
+        stale.close()
+        os.utime(stale.name, (0, 0))
+        spool = store.create_spool()
+        spool.write(b'x' * 600)
+        store.commit('a..b', spool, [])
+
+        assert not os.path.exists(stale.name)
+        assert store.exists('a..b')
+        assert 'a..b' in store._indexes
+
+        writing = store.create_spool()
+        writing.write(b'x' * 600)
+        writing.flush()
+        store.prune()
+        assert not store.exists('a..b')
+        assert 'a..b' not in store._indexes
+        assert os.path.exists(writing.name)
+        store.discard(writing)
+
+    @pytest.mark.asyncio
+    async def test_complete_diff_is_not_stored(self, large_repo, store):
+        """Test that a diff packed whole is not stored by the reader, but can still be materialized."""
+        (large_repo / 'README.md').write_text('new readme\n')
+        subprocess.run(['git', 'commit', '-q', '-am', 'Update readme'], cwd=large_repo, check=True)
+        diff = await diff_engine.read_diff('HEAD~1...HEAD', str(large_repo), store=store, store_key='a..b')
+        await store.wait('a..b')
+
+        assert not diff["truncated"]
+        assert not store.exists('a..b')
+
+        await diff_engine.materialize_diff('HEAD~1...HEAD', str(large_repo), store, 'a..b')
+        assert store.read_page('a..b', 0)["diff"] == diff["patch"]
+
+class TestCursor:
+    """Test the formatting and parsing of cursors."""
+
+    def test_round_trip(self):
+        """Test that a formatted cursor is parsed back."""
+        cursor = diff_store.format_cursor('abc123..def456', 42)
+
+        assert diff_store.parse_cursor(cursor) == ('abc123..def456', 42)
+
+    def test_scoped_round_trip(self):
+        """Test that the cursor of a scoped patch keeps its scope."""
+        cursor = diff_store.format_cursor(diff_store.format_range('abc123', 'def456', '0a1b2c'), 7)
+
+        assert diff_store.parse_cursor(cursor) == ('abc123..def456@0a1b2c', 7)
+
+    @pytest.mark.parametrize('cursor', ['', 'abc123:1', 'abc123..def456', 'abc..d/ef:1', 'abc..def:-1', 'abc..def@:1',
+                                        'abc..def@x/y:1'])
+    def test_invalid(self, cursor):
+        """Test that malformed cursors are rejected."""
+        with pytest.raises(ValueError):
+            diff_store.parse_cursor(cursor)
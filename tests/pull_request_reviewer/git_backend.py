@@ -0,0 +1,102 @@
+import subprocess
+
+import pytest
+import pytest_asyncio
+
+from huggingface_mcp_course.pull_request_reviewer import git_backend
+
+
+@pytest.fixture
+def merged_repo(tmp_path):
+    """Create a git repository whose feature branch merged the main branch."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    def commit(name, message):
+        (tmp_path / name).write_text(f'{name}\n')
+        git('add', '.')
+        git('commit', '-q', '-m', message)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    commit('a.txt', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    commit('b.txt', 'Add b\n\nWith a body')
+    git('checkout', '-q', 'main')
+    commit('c.txt', 'Add c\nwrapped subject')
+    git('checkout', '-q', 'feature')
+    git('merge', '-q', '-m', 'Merge main', 'main')
+    commit('d.txt', 'Add d')
+    return str(tmp_path)
+
+
+@pytest_asyncio.fixture
+async def batch_backend():
+    """Create a batch backend and stop its cat-file processes afterwards."""
+    backend = git_backend.BatchBackend()
+    yield backend
+    await backend.close()
+
+
+class TestBatchBackend:
+    """Test that the in-process walks match git."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('first, second', [('main', 'HEAD'), ('main~1', 'HEAD'), ('HEAD~1', 'main')])
+    async def test_matches_subprocess(self, merged_repo, batch_backend, first, second):
+        """Test that the merge-base and the resolved revisions are the ones computed by git."""
+        subprocess_backend = git_backend.SubprocessBackend()
+
+        merge_base = await subprocess_backend.merge_base(merged_repo, first, second)
+        head_sha = await subprocess_backend.resolve(merged_repo, 'HEAD')
+
+        assert await batch_backend.merge_base(merged_repo, first, second) == merge_base
+        assert await batch_backend.resolve(merged_repo, 'HEAD') == head_sha
+
+    @pytest.mark.asyncio
+    async def test_unknown_revision_raises(self, merged_repo, batch_backend):
+        """Test that unknown revisions are reported as CalledProcessError, like with git."""
+        with pytest.raises(subprocess.CalledProcessError):
+            await batch_backend.merge_base(merged_repo, 'unknown', 'HEAD')
+
+    @pytest.mark.asyncio
+    async def test_multiline_revision_raises(self, merged_repo, batch_backend):
+        """Test that a revision spanning several lines is rejected before reaching cat-file."""
+        head_sha = await batch_backend.resolve(merged_repo, 'HEAD')
+
+        for revision in ('HEAD\nmain', 'HEAD\0main'):
+            with pytest.raises(subprocess.CalledProcessError):
+                await batch_backend.resolve(merged_repo, revision)
+
+        # The process still answers the following requests with their own objects
+        assert await batch_backend.resolve(merged_repo, 'HEAD') == head_sha
+        assert await batch_backend.resolve(merged_repo, 'main') != head_sha
+
+    @pytest.mark.asyncio
+    async def test_stops_least_recently_used_process(self, merged_repo, batch_backend, tmp_path_factory, monkeypatch):
+        """Test that the processes of the least recently used working directories are stopped."""
+        clone = str(tmp_path_factory.mktemp('clone'))
+        subprocess.run(['git', 'clone', '-q', merged_repo, clone], check=True, capture_output=True)
+        monkeypatch.setattr(git_backend, 'CAT_FILE_PROCESSES', 1)
+
+        head_sha = await batch_backend.resolve(merged_repo, 'HEAD')
+        first = await batch_backend._process(merged_repo)
+        assert await batch_backend.resolve(clone, 'HEAD') == head_sha
+
+        assert first.process.returncode is not None
+        assert await batch_backend.resolve(merged_repo, 'HEAD') == head_sha
+
+
+class TestCommit:
+    """Test the parsing of commit objects."""
+
+    def test_parse(self):
+        """Test that the parents, committer date and subject are extracted."""
+        commit = git_backend.Commit.parse('abc', b'tree 123\nparent p1\nparent p2\n'
+                                                 b'author A <a@b> 1 +0000\ncommitter C <c@d> 42 +0200\n\n'
+                                                 b'First line\nsecond line\n\nBody\n')
+
+        assert commit.parents == ['p1', 'p2']
+        assert commit.timestamp == 42
+        assert commit.subject == 'First line second line'
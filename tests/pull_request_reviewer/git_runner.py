@@ -0,0 +1,128 @@
+import asyncio
+import os
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import git_runner
+
+
+class TestRunGit:
+    """Test the asynchronous git execution layer."""
+
+    @pytest.mark.asyncio
+    async def test_returns_completed_process(self):
+        """Test that the git output is decoded into a completed process."""
+        result = await git_runner.run_git(['--version'], os.getcwd())
+
+        assert isinstance(result, subprocess.CompletedProcess)
+        assert result.returncode == 0
+        assert result.stdout.startswith('git version')
+
+    @pytest.mark.asyncio
+    async def test_check_raises_called_process_error(self):
+        """Test that failing git commands raise when check is requested."""
+        with pytest.raises(subprocess.CalledProcessError) as error:
+            await git_runner.run_git(['rev-parse', '--verify', 'does-not-exist'], os.getcwd(), check=True)
+
+        assert error.value.returncode != 0
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded(self):
+        """Test that the number of live git processes never exceeds the limit."""
+        live = 0
+        peak = 0
+        release = asyncio.Event()
+
+        class HeldProcess:
+            """Fake git process that stays alive until the test releases it."""
+            pid = 0
+            returncode = None
+
+            async def communicate(self, input=None):
+                nonlocal live
+                await release.wait()
+                live -= 1
+                self.returncode = 0
+                return b'', b''
+
+        async def held_exec(*args, **kwargs):
+            nonlocal live, peak
+            live += 1
+            peak = max(peak, live)
+            return HeldProcess()
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(asyncio, 'create_subprocess_exec', held_exec)
+            calls = asyncio.gather(*[
+                git_runner.run_git(['--version'], os.getcwd())
+                for _ in range(git_runner.GIT_CONCURRENCY_LIMIT * 3)
+            ])
+            # The other calls wait for a slot while the first processes are held open
+            for _ in range(10):
+                await asyncio.sleep(0)
+            assert live == git_runner.GIT_CONCURRENCY_LIMIT
+
+            release.set()
+            await calls
+
+        assert live == 0
+        assert peak == git_runner.GIT_CONCURRENCY_LIMIT
+
+
+def slow_alias(pid_file) -> list[str]:
+    """
+    :param pid_file: The file in which the shell run by the alias writes its PID
+    :return: The arguments of a git command running a shell that sleeps (a child process of git)
+    """
+    return ['-c', f'alias.slow=!echo $$ > {pid_file}; sleep 30', 'slow']
+
+
+def is_running(pid_file) -> bool:
+    """
+    :param pid_file: The file in which a PID was written
+    :return: True if the process is still running, False if it exited (zombies that were not reaped yet included)
+    """
+    try:
+        with open(f'/proc/{int(pid_file.read_text())}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='Requires /proc to inspect the processes')
+class TestProcessLifetime:
+    """Test that git and its children are killed on timeout and on cancellation."""
+
+    @pytest.mark.asyncio
+    async def test_timeout_kills_process_group(self, tmp_path):
+        """Test that a timed out command raises TimeoutExpired once its whole process group is killed."""
+        pid_file = tmp_path / 'pid'
+
+        with pytest.raises(subprocess.TimeoutExpired):
+            await git_runner.run_git(slow_alias(pid_file), str(tmp_path), timeout=0.5)
+
+        await asyncio.sleep(0.1)
+        assert not is_running(pid_file)
+
+    @pytest.mark.asyncio
+    async def test_cancellation_kills_process_group(self, tmp_path):
+        """Test that cancelling the caller kills git and its children right away."""
+        pid_file = tmp_path / 'pid'
+        task = asyncio.create_task(git_runner.run_git(slow_alias(pid_file), str(tmp_path), timeout=0))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.01)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        await asyncio.sleep(0.1)
+        assert not is_running(pid_file)
+
+    @pytest.mark.asyncio
+    async def test_stream_timeout_raises(self, tmp_path):
+        """Test that a streamed command killed by its timeout is not mistaken for a complete output."""
+        with pytest.raises(subprocess.TimeoutExpired):
+            async with git_runner.stream_git(slow_alias(tmp_path / 'pid'), str(tmp_path), timeout=0.5) as process:
+                await process.stdout.read()
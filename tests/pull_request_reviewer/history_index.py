@@ -0,0 +1,87 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, history_index, repo_state
+
+
+@pytest.fixture
+def history_repo(tmp_path):
+    """Create a git repository whose main branch changes app.py in every commit."""
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True, text=True).stdout.strip()
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    for number in range(3):
+        (tmp_path / 'app.py').write_text(f'version = {number}\n')
+        if number == 1:
+            (tmp_path / 'README.md').write_text('readme\n')
+        git('add', '.')
+        git('commit', '-q', '-m', f'Commit {number}')
+    return tmp_path, git
+
+
+class TestUpdateIndex:
+    """Test the incremental updates of the history index."""
+
+    @pytest.mark.asyncio
+    async def test_updates_incrementally(self, history_repo, tmp_path_factory):
+        """Test that a fast-forwarded branch only reads its new commits, and that rewritten history is re-indexed."""
+        path, git = history_repo
+        repository = await repo_state.get_repo_state(str(path))
+        disk_cache = analysis_cache.DiskCache(str(tmp_path_factory.mktemp('cache') / 'cache.db'))
+        try:
+            index = await history_index.update_index(repository, disk_cache, 'main', git('rev-parse', 'main'))
+            assert index["commits"] == 3
+            assert history_index.file_history(index, 'app.py')[0] == 3
+            assert history_index.file_history(index, 'README.md')[0] == 1
+            assert history_index.file_history(index, 'missing.py') is None
+            assert index["owners"]["app.py"] == {"test@example.com": [3, index["time"]]}
+            assert index["codeowners"] is None
+
+            (path / 'app.py').write_text('version = 3\n')
+            git('commit', '-q', '-am', 'Commit 3')
+            tip_sha = git('rev-parse', 'main')
+            with patch.object(history_index, 'read_history', wraps=history_index.read_history) as read_history:
+                index = await history_index.update_index(repository, disk_cache, 'main', tip_sha)
+                assert read_history.call_args.args[1] == [f'{git("rev-parse", "main~1")}..{tip_sha}']
+            assert index["tip"] == tip_sha
+            assert index["commits"] == 4
+            assert history_index.file_history(index, 'app.py')[0] == 4
+
+            # The index is read from the cache when the branch did not move
+            with patch.object(history_index, 'read_history') as read_history:
+                assert await history_index.update_index(repository, disk_cache, 'main', tip_sha) == index
+                read_history.assert_not_called()
+
+            git('reset', '-q', '--hard', 'main~2')
+            (path / 'other.py').write_text('other\n')
+            git('add', '.')
+            git('commit', '-q', '-m', 'Rewritten')
+            index = await history_index.update_index(repository, disk_cache, 'main', git('rev-parse', 'main'))
+            assert index["commits"] == 3
+            assert history_index.file_history(index, 'app.py')[0] == 2
+            assert history_index.file_history(index, 'other.py')[0] == 1
+        finally:
+            disk_cache.close()
+
+    @pytest.mark.asyncio
+    async def test_keeps_large_index_in_memory(self, history_repo, tmp_path_factory, caplog):
+        """Test that an index exceeding the on-disk cache is reported and kept in memory instead of being rebuilt."""
+        path, git = history_repo
+        repository = await repo_state.get_repo_state(str(path))
+        disk_cache = analysis_cache.DiskCache(str(tmp_path_factory.mktemp('cache') / 'cache.db'), max_bytes=10)
+        try:
+            tip_sha = git('rev-parse', 'main')
+            index = await history_index.update_index(repository, disk_cache, 'main', tip_sha)
+            assert disk_cache.get(history_index.HISTORY_NAMESPACE, 'main') is None
+            assert 'exceeds the size of the on-disk cache' in caplog.text
+
+            with patch.object(history_index, 'read_history') as read_history:
+                assert await history_index.update_index(repository, disk_cache, 'main', tip_sha) is index
+                read_history.assert_not_called()
+        finally:
+            disk_cache.close()
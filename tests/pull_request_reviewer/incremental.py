@@ -0,0 +1,80 @@
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, incremental
+
+
+@pytest.fixture
+def branch_repo(tmp_path):
+    """Create a git repository whose feature branch modifies, renames and deletes files."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    for name in ('a.py', 'b.py', 'c.py', 'd.py'):
+        (tmp_path / name).write_text(''.join(f'{name} line {i}\n' for i in range(20)))
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    (tmp_path / 'a.py').write_text('changed\n')
+    git('mv', 'b.py', 'e.py')
+    git('add', '.')
+    git('commit', '-q', '-m', 'First push')
+    return tmp_path
+
+
+def snapshot(files):
+    """
+    :param files: Changed files
+    :return: The comparable attributes of the files
+    """
+    return [(file.status, file.path, file.old_path, file.additions, file.deletions) for file in files]
+
+
+def rev_parse(repo, revision):
+    """
+    :param repo: The path to the repository
+    :param revision: A revision
+    :return: The SHA of the revision
+    """
+    return subprocess.run(['git', 'rev-parse', revision], cwd=repo, check=True, capture_output=True,
+                          text=True).stdout.strip()
+
+
+class TestUpdateFiles:
+    """Test that updating the previous files matches a diff from scratch."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('push', [
+        ['rm', '-q', 'c.py'],
+        ['mv', 'e.py', 'f.py'],
+        ['checkout', 'main', '--', 'a.py'],
+    ])
+    async def test_matches_full_diff(self, branch_repo, push):
+        """Test deletions, renames of renamed files and changes reverted by the push."""
+        cwd = str(branch_repo)
+        merge_base_sha, old_head_sha = rev_parse(cwd, 'main'), rev_parse(cwd, 'HEAD')
+        previous = (await diff_engine.read_diff(f'{merge_base_sha}...{old_head_sha}', cwd, include_patch=False))["files"]
+        (branch_repo / 'd.py').write_text('rewritten\n')
+        subprocess.run(['git', *push], cwd=cwd, check=True)
+        subprocess.run(['git', 'commit', '-q', '-am', 'Second push'], cwd=cwd, check=True)
+        new_head_sha = rev_parse(cwd, 'HEAD')
+
+        updated = await incremental.update_files(cwd, previous, merge_base_sha, old_head_sha, new_head_sha)
+        full = await diff_engine.read_diff(f'{merge_base_sha}...{new_head_sha}', cwd, include_patch=False)
+
+        assert snapshot(updated) == snapshot(full["files"])
+
+    @pytest.mark.asyncio
+    async def test_pack_reads_selected_files(self, branch_repo):
+        """Test that the packed diff of known files matches the packed diff from scratch."""
+        cwd = str(branch_repo)
+        files = (await diff_engine.read_diff('main...HEAD', cwd, include_patch=False))["files"]
+
+        patch, omitted, partial = await incremental.pack_diff(cwd, files, 'main...HEAD', max_lines=500)
+        full = await diff_engine.read_diff('main...HEAD', cwd, max_lines=500)
+
+        assert (patch, omitted, partial) == (full["patch"], full["omitted"], False)
@@ -0,0 +1,77 @@
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import history_index, ownership
+
+CODEOWNERS = '''
+# Default owners
+*       @org/core
+*.md    @org/docs  # Documentation
+/src/api/ @org/api alice@example.com
+docs/**/*.rst @org/docs
+/src/api/generated/
+'''
+
+
+class TestCodeowners:
+    """Test the parsing and the matching of CODEOWNERS files."""
+
+    @pytest.mark.parametrize('path, owners', [
+        ('setup.py', ('@org/core',)),
+        ('src/README.md', ('@org/docs',)),
+        ('src/api/routes.py', ('@org/api', 'alice@example.com')),
+        ('lib/src/api/routes.py', ('@org/core',)),
+        ('docs/guide/intro.rst', ('@org/docs',)),
+        ('src/api/generated/client.py', ())
+    ])
+    def test_owners_of(self, path, owners):
+        """Test that the last matching rule gives the owners, following the .gitignore rules."""
+        assert ownership.owners_of(ownership.parse_codeowners(CODEOWNERS), path) == owners
+
+    @pytest.mark.asyncio
+    async def test_read_codeowners(self, tmp_path):
+        """Test that the CODEOWNERS file of the .github directory takes precedence."""
+        def git(*args):
+            subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+        git('init', '-q', '-b', 'main')
+        git('config', 'user.email', 'test@example.com')
+        git('config', 'user.name', 'Test')
+        (tmp_path / 'app.py').write_text('app\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'Initial commit')
+        assert await ownership.read_codeowners(str(tmp_path), 'HEAD') is None
+
+        (tmp_path / '.github').mkdir()
+        (tmp_path / '.github' / 'CODEOWNERS').write_text('* @github\n')
+        (tmp_path / 'CODEOWNERS').write_text('* @root\n')
+        git('add', '.')
+        git('commit', '-q', '-m', 'Add code owners')
+        assert await ownership.read_codeowners(str(tmp_path), 'HEAD') == '* @github\n'
+
+
+class TestSuggestReviewers:
+    """Test the ranking of the reviewers."""
+
+    def test_ranks_owners_and_authors(self):
+        """Test that the authors of the files and of their directories are ranked with the code owners."""
+        day = 86400
+        index = history_index.new_index()
+        history_index.apply_commits(index, [
+            {"sha": 'c3', "time": 400 * day, "email": 'bob@example.com', "name": 'Bob',
+             "files": [['src/api/routes.py', 5, 1]]},
+            {"sha": 'c2', "time": 300 * day, "email": 'carol@example.com', "name": 'Carol',
+             "files": [['src/api/models.py', 20, 0]]},
+            {"sha": 'c1', "time": 0, "email": 'dave@example.com', "name": 'Dave',
+             "files": [['src/api/routes.py', 100, 0]]}
+        ])
+        index["codeowners"] = CODEOWNERS
+
+        reviewers = ownership.suggest_reviewers(index, ['src/api/routes.py'], {'alice@example.com'}, limit=4)
+
+        assert [reviewer["reviewer"] for reviewer in reviewers] == \
+               ['bob@example.com', '@org/api', 'carol@example.com', 'dave@example.com']
+        assert reviewers[0]["name"] == 'Bob'
+        assert reviewers[1]["codeowner"]
+        assert index["owners"]["src/api"]["bob@example.com"] == [1, 400 * day]
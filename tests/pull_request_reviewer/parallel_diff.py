@@ -0,0 +1,116 @@
+import asyncio
+import os
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, parallel_diff
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+from huggingface_mcp_course.pull_request_reviewer.diff_store import DiffStore
+
+
+@pytest.fixture
+def wide_repo(tmp_path):
+    """Create a git repository whose feature branch modifies, adds, renames, deletes and binary-edits many files."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    for index in range(12):
+        (tmp_path / f'm{index:02}.py').write_text(''.join(f'line {line}\n' for line in range(index * 5 + 3)))
+    (tmp_path / 'old.md').write_text('a renamed file\nwith some lines\n')
+    (tmp_path / 'gone.txt').write_text('deleted\n')
+    (tmp_path / 'bin.dat').write_bytes(b'\0\1\2')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    for index in range(12):
+        with open(tmp_path / f'm{index:02}.py', 'a') as f:
+            f.write('added\n' * (index + 1))
+    (tmp_path / 'new.py').write_text('print("new")\n')
+    git('mv', 'old.md', 'z_new.md')
+    git('rm', '-q', 'gone.txt')
+    (tmp_path / 'bin.dat').write_bytes(b'\0\3\4')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Change many files')
+    return tmp_path
+
+
+class TestSplitShards:
+    """Test the sharding of the changed files."""
+
+    def test_balances_changed_lines(self):
+        """Test that shards are contiguous, cover every file and are balanced by weight."""
+        files = [FileChange('M', f'{index}.py', additions=400 if index == 0 else 0) for index in range(8)]
+
+        shards = parallel_diff.split_shards(files, workers=2, min_files=2)
+
+        assert shards == [range(0, 1), range(1, 8)]
+        assert parallel_diff.split_shards(files, workers=4, min_files=8) == [range(0, 8)]
+        assert parallel_diff.split_shards([], workers=4) == []
+
+
+class TestReadDiff:
+    """Test the parallel generation of diffs."""
+
+    @pytest.mark.asyncio
+    async def test_matches_single_pass(self, wide_repo, monkeypatch):
+        """Test that the packed and stored diffs are the same as with the single-pass engine."""
+        monkeypatch.setattr(parallel_diff, 'MIN_SHARD_FILES', 2)
+        serial_store = DiffStore(str(wide_repo / '.git' / 'serial'))
+        parallel_store = DiffStore(str(wide_repo / '.git' / 'parallel'))
+        calls = []
+        listed = []
+
+        async def on_files(files):
+            listed.append(len(files))
+
+        # The budget truncates the packed diff, so that the whole patch is stored
+        serial = await diff_engine.read_diff('main...feature', str(wide_repo), max_lines=40, store=serial_store,
+                                             store_key='a..b')
+        stream_git = diff_engine.git_runner.stream_git
+
+        def counting_stream_git(args, cwd, **kwargs):
+            calls.append((args, kwargs.get('semaphore')))
+            return stream_git(args, cwd, **kwargs)
+
+        monkeypatch.setattr(diff_engine.git_runner, 'stream_git', counting_stream_git)
+        parallel = await parallel_diff.read_diff('main...feature', str(wide_repo), max_lines=40, store=parallel_store,
+                                                 store_key='a..b', on_files=on_files, workers=4)
+        await asyncio.gather(serial_store.wait('a..b'), parallel_store.wait('a..b'))
+
+        # One listing, then one git process per shard, bounded by the semaphore of the shards
+        assert [semaphore for _, semaphore in calls] == [None] + [parallel_diff.get_shard_semaphore()] * 4
+        assert listed == [16]
+        assert serial["truncated"]
+        assert parallel["patch"] == serial["patch"]
+        assert parallel["omitted"] == serial["omitted"]
+        assert [(file.path, file.hunks) for file in parallel["files"]] == \
+               [(file.path, file.hunks) for file in serial["files"]]
+        with open(os.path.join(serial_store.directory, 'a-b.patch'), 'rb') as serial_patch, \
+                open(os.path.join(parallel_store.directory, 'a-b.patch'), 'rb') as parallel_patch:
+            assert parallel_patch.read() == serial_patch.read()
+        assert parallel_store.load_index('a..b') == serial_store.load_index('a..b')
+        assert not [name for name in os.listdir(parallel_store.directory) if name.endswith('.tmp')]
+
+    @pytest.mark.asyncio
+    async def test_falls_back_on_mismatch(self, wide_repo, monkeypatch):
+        """Test that the single-pass engine is used when a shard lists different files."""
+        monkeypatch.setattr(parallel_diff, 'MIN_SHARD_FILES', 2)
+        read_files = diff_engine.DiffReader.read_files
+
+        async def renamed_read_files(reader):
+            files = await read_files(reader)
+            files[0].path = 'unexpected'
+            return files
+
+        serial = await diff_engine.read_diff('main...feature', str(wide_repo))
+        # Only the readers of the shards list unexpected files
+        monkeypatch.setattr(parallel_diff, 'DiffReader', type('ShardReader', (diff_engine.DiffReader,),
+                                                              {"read_files": renamed_read_files}))
+
+        parallel = await parallel_diff.read_diff('main...feature', str(wide_repo), workers=4)
+
+        assert parallel["patch"] == serial["patch"]
@@ -0,0 +1,105 @@
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import patch_index
+from huggingface_mcp_course.pull_request_reviewer.analysis_cache import DiskCache
+
+
+@pytest.fixture
+def feature_repo(tmp_path):
+    """Create a git repository whose feature branch has three commits, including a rename."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    (tmp_path / 'a.py').write_text(''.join(f'a line {i}\n' for i in range(20)))
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    (tmp_path / 'b.py').write_text('b\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Add b')
+    git('mv', 'a.py', 'c.py')
+    git('commit', '-q', '-m', 'Rename a')
+    (tmp_path / 'poetry.lock').write_text('lock\n')
+    (tmp_path / 'b.py').write_text('B\nb\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Lock')
+    return tmp_path
+
+
+def rev_list(repo, revision_range):
+    """
+    :param repo: The path to the repository
+    :param revision_range: A revision range
+    :return: The SHAs of the commits of the range, the newest first
+    """
+    return subprocess.run(['git', 'rev-list', revision_range], cwd=repo, check=True, capture_output=True,
+                          text=True).stdout.split()
+
+
+class TestAnalyzeCommits:
+    """Test the per-commit changes indexed by blob pairs."""
+
+    @pytest.mark.asyncio
+    async def test_computes_commit_changes(self, feature_repo):
+        """Test the changes of each commit, the newest first."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+
+        commit_shas = rev_list(feature_repo, 'main..feature')
+        changes, reused = await patch_index.analyze_commits(str(feature_repo), disk_cache, commit_shas)
+        changes = [changes[sha] for sha in commit_shas]
+
+        assert reused == 0
+        assert [change["paths"] for change in changes] == [['b.py', 'poetry.lock'], ['c.py'], ['b.py']]
+        assert [(change["additions"], change["deletions"]) for change in changes] == [(2, 0), (0, 0), (1, 0)]
+        assert [change["categories"] for change in changes] == [['lockfile', 'source'], ['source'], ['source']]
+
+    @pytest.mark.asyncio
+    async def test_rebased_commits_are_reused(self, feature_repo):
+        """Test that the commits of a rebased branch are found by blob pairs instead of being diffed again."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+        cwd = str(feature_repo)
+        commits, _ = await patch_index.analyze_commits(cwd, disk_cache, rev_list(cwd, 'main..feature'))
+
+        subprocess.run(['git', 'checkout', '-q', 'main'], cwd=cwd, check=True)
+        (feature_repo / 'd.py').write_text('d\n')
+        subprocess.run(['git', 'add', '.'], cwd=cwd, check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', 'Advance main'], cwd=cwd, check=True)
+        subprocess.run(['git', 'rebase', '-q', 'main', 'feature'], cwd=cwd, check=True, capture_output=True)
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            computed = []
+
+            async def compute_commit_changes(cwd, commit_shas):
+                computed.extend(commit_shas)
+                return {}
+
+            monkeypatch.setattr(patch_index, 'compute_commit_changes', compute_commit_changes)
+            rebased, reused = await patch_index.analyze_commits(cwd, disk_cache, rev_list(cwd, 'main..feature'))
+
+        assert (reused, computed) == (3, [])
+        assert list(rebased) != list(commits)
+        assert list(rebased.values()) == list(commits.values())
+
+    @pytest.mark.asyncio
+    async def test_changed_blobs_are_diffed(self, feature_repo):
+        """Test that a rebased commit changing a file also changed by the base branch is diffed again."""
+        disk_cache = DiskCache(str(feature_repo / 'cache.sqlite'))
+        cwd = str(feature_repo)
+        await patch_index.analyze_commits(cwd, disk_cache, rev_list(cwd, 'main..feature'))
+
+        subprocess.run(['git', 'checkout', '-q', 'main'], cwd=cwd, check=True)
+        (feature_repo / 'a.py').write_text(''.join(f'a line {i}\n' for i in range(20)) + 'end\n')
+        subprocess.run(['git', 'commit', '-q', '-am', 'Extend a'], cwd=cwd, check=True)
+        subprocess.run(['git', 'rebase', '-q', 'main', 'feature'], cwd=cwd, check=True, capture_output=True)
+
+        commit_shas = rev_list(cwd, 'main..feature')
+        changes, reused = await patch_index.analyze_commits(cwd, disk_cache, commit_shas)
+
+        # Only the rename of a.py has other blobs
+        assert reused == 2
+        assert changes[commit_shas[1]]["paths"] == ['c.py']
@@ -0,0 +1,100 @@
+import json
+import subprocess
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_engine, path_filters
+from huggingface_mcp_course.pull_request_reviewer.path_filters import PathScope
+
+
+@pytest.fixture
+def vendored_repo(tmp_path):
+    """Create a git repository whose feature branch changes sources, a lockfile and a vendored directory."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    (tmp_path / 'README.md').write_text('readme\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / 'app.py').write_text('print("app")\n')
+    (tmp_path / 'src' / 'poetry.lock').write_text('a\nb\nc\n')
+    (tmp_path / 'vendor' / 'lib').mkdir(parents=True)
+    (tmp_path / 'vendor' / 'lib' / 'x.py').write_text('x\ny\n')
+    (tmp_path / 'vendor' / 'lib' / 'y.py').write_text('y\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Add app')
+    return tmp_path
+
+
+class TestPathScope:
+    """Test the scope of the diffs."""
+
+    @pytest.mark.asyncio
+    async def test_loads_defaults_from_config(self, vendored_repo):
+        """Test that the globs that are not given come from the configuration file."""
+        (vendored_repo / path_filters.CONFIG_FILE).write_text(json.dumps({"include": ["src"], "exclude": ["*.lock"]}))
+
+        configured = await PathScope.load(str(vendored_repo))
+        overridden = await PathScope.load(str(vendored_repo), exclude=[])
+
+        assert (configured.include, configured.exclude) == (['src'], ['*.lock'])
+        assert (overridden.include, overridden.exclude) == (['src'], [])
+        assert configured.key != overridden.key
+        assert PathScope().key == ''
+
+    @pytest.mark.asyncio
+    async def test_invalid_config_raises(self, vendored_repo):
+        """Test that globs that are not a list of strings are rejected."""
+        (vendored_repo / path_filters.CONFIG_FILE).write_text(json.dumps({"exclude": "*.lock"}))
+
+        with pytest.raises(ValueError):
+            await PathScope.load(str(vendored_repo))
+
+    @pytest.mark.asyncio
+    async def test_excluded_files_are_not_diffed(self, vendored_repo):
+        """Test that git skips the excluded paths, which are summarized per glob."""
+        scope = PathScope(exclude=['*.lock', 'vendor'])
+
+        diff = await diff_engine.read_diff('main...HEAD', str(vendored_repo), pathspecs=scope.pathspecs())
+        excluded = await path_filters.summarize_excluded(str(vendored_repo), 'main...HEAD', scope)
+
+        assert [file.path for file in diff["files"]] == ['src/app.py']
+        assert 'poetry.lock' not in diff["patch"]
+        assert excluded == {"pattern": ['*.lock', 'vendor'], "files": [1, 2], "lines": [3, 3]}
+
+    @pytest.mark.asyncio
+    async def test_excluded_files_are_within_include(self, vendored_repo):
+        """Test that the files outside of the include globs are not counted as excluded."""
+        scope = PathScope(include=['src'], exclude=['*.lock', 'vendor'])
+
+        excluded = await path_filters.summarize_excluded(str(vendored_repo), 'main...HEAD', scope)
+
+        assert excluded == {"pattern": ['*.lock', 'vendor'], "files": [1, 0], "lines": [3, 0]}
+
+    @pytest.mark.asyncio
+    async def test_summary_reuses_untouched_groups(self, vendored_repo):
+        """Test that only the groups touched by new commits are counted again."""
+        cwd = str(vendored_repo)
+        scope = PathScope(exclude=['*.lock', 'vendor'])
+        previous = await path_filters.summarize_excluded(cwd, 'main...HEAD', scope)
+        (vendored_repo / 'vendor' / 'lib' / 'y.py').write_text('y\nz\n')
+        subprocess.run(['git', 'commit', '-q', '-am', 'Update vendor'], cwd=cwd, check=True)
+        counted = []
+        original = path_filters.read_changes
+
+        async def read_changes(cwd, revision_range, globs, include=None, count_lines=True):
+            counted.append((revision_range, globs, count_lines))
+            return await original(cwd, revision_range, globs, include, count_lines)
+
+        with pytest.MonkeyPatch.context() as monkeypatch:
+            monkeypatch.setattr(path_filters, 'read_changes', read_changes)
+            updated = await path_filters.summarize_excluded(cwd, 'main...HEAD', scope, previous, 'HEAD~1..HEAD')
+
+        # The new commits are only listed, then a single numstat counts the touched groups
+        assert counted == [('HEAD~1..HEAD', ['*.lock', 'vendor'], False), ('main...HEAD', ['vendor'], True)]
+        assert updated == {"pattern": ['*.lock', 'vendor'], "files": [1, 2], "lines": [3, 4]}
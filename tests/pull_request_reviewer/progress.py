@@ -0,0 +1,58 @@
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import diff_model, progress
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+from huggingface_mcp_course.pull_request_reviewer.progress import AnalysisProgress
+
+
+def notified(ctx: MagicMock) -> list[dict]:
+    """
+    :param ctx: The mock of the context of an MCP request
+    :return: The partial payloads sent as progress notifications
+    """
+    return [json.loads(call.args[2]) for call in ctx.report_progress.await_args_list]
+
+
+class TestSplitPages:
+    """Test the pagination of the notified diffs."""
+
+    def test_splits_on_line_boundaries(self):
+        """Test that pages stay within the budget unless a single line exceeds it."""
+        assert progress.split_pages('aaaa\nbbbb\ncc\n', 10) == ['aaaa\nbbbb\n', 'cc\n']
+        assert progress.split_pages('a' * 20 + '\nb\n', 10) == ['a' * 20 + '\n', 'b\n']
+        assert progress.split_pages('') == []
+
+
+class TestAnalysisProgress:
+    """Test the progress notifications of an analysis."""
+
+    @pytest.mark.asyncio
+    async def test_notifies_stages_in_order(self):
+        """Test that the files, their statistics and the diff pages are each notified once, in order."""
+        ctx = MagicMock()
+        ctx.report_progress = AsyncMock()
+        files = [FileChange('M', 'x.py', additions=2, deletions=1)]
+        notifier = AnalysisProgress(ctx)
+
+        await notifier.files(files)
+        await notifier.files(files)
+        assert [payload["stage"] for payload in notified(ctx)] == ['files']
+        analysis = {"files": diff_model.to_columns(files), "diff": 'x' * progress.PROGRESS_PAGE_BYTES + '\ny\n'}
+        await notifier.finish(analysis, include_diff=True)
+
+        payloads = notified(ctx)
+        assert [payload["stage"] for payload in payloads] == ['files', 'statistics', 'diff', 'diff']
+        assert payloads[0]["files"]["path"] == ['x.py']
+        assert payloads[1] == {"stage": "statistics", "statistics": {"files": 1, "additions": 2, "deletions": 1},
+                               "total_diff_lines": 3}
+        assert [(payload["page"], payload["pages"]) for payload in payloads[2:]] == [(0, 2), (1, 2)]
+        assert ''.join(payload["diff"] for payload in payloads[2:]) == analysis["diff"]
+        assert [call.args[0] for call in ctx.report_progress.await_args_list] == [1, 2, 3, 4]
+
+    @pytest.mark.asyncio
+    async def test_without_context(self):
+        """Test that nothing is sent without the context of a request."""
+        await AnalysisProgress().finish({"files": diff_model.to_columns([]), "diff": 'x\n'}, include_diff=True)
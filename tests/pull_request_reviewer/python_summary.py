@@ -0,0 +1,142 @@
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import analysis_cache, python_summary
+
+OLD_MODULE = b'''
+import os
+
+
+def read(path):
+    return open(path).read()
+
+
+def unchanged(x):
+    return x
+
+
+class Reader:
+    size = 1
+
+    def load(self, path):
+        return read(path)
+
+    def close(self):
+        pass
+'''
+
+NEW_MODULE = b'''
+import os
+
+
+def unchanged(x):
+    return x
+
+
+async def read(path: str, mode: str = 'r') -> str:
+    return open(path, mode).read()
+
+
+class Reader(Base):
+    size = 1
+
+    def load(self, path):
+        return read(path).strip()
+
+    def reset(self):
+        pass
+'''
+
+
+@pytest.fixture
+def python_repo(tmp_path):
+    """Create a git repository whose feature branch changes, adds and deletes Python modules."""
+    def git(*args):
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git('init', '-q', '-b', 'main')
+    git('config', 'user.email', 'test@example.com')
+    git('config', 'user.name', 'Test')
+    (tmp_path / 'reader.py').write_bytes(OLD_MODULE)
+    (tmp_path / 'gone.py').write_text('def old():\n    pass\n')
+    (tmp_path / 'README.md').write_text('readme\n')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Initial commit')
+    git('checkout', '-q', '-b', 'feature')
+    (tmp_path / 'reader.py').write_bytes(NEW_MODULE)
+    (tmp_path / 'broken.py').write_text('def broken(:\n')
+    (tmp_path / 'README.md').write_text('readme\nmore\n')
+    git('rm', '-q', 'gone.py')
+    git('add', '.')
+    git('commit', '-q', '-m', 'Rework the reader')
+    return tmp_path
+
+
+class TestCompareSources:
+    """Test the comparison of the definitions of two versions of a module."""
+
+    def test_reports_definition_changes(self):
+        """Test that moves are ignored, and that modified definitions and signatures are reported."""
+        summary = python_summary.compare_sources(OLD_MODULE, NEW_MODULE)
+
+        assert summary == {
+            "added": ['Reader.reset'],
+            "removed": ['Reader.close'],
+            "modified": ['read', 'Reader', 'Reader.load'],
+            "signatures": [['read', 'def read(path)', "async def read(path: str, mode: str='r') -> str"],
+                           ['Reader', 'class Reader', 'class Reader(Base)']]
+        }
+
+    def test_syntax_error(self):
+        """Test that a module that cannot be parsed is reported as an error."""
+        assert "error" in python_summary.compare_sources(None, b'def broken(:\n')
+
+
+class TestSummarizeRange:
+    """Test the summary of the Python changes of a revision range."""
+
+    @pytest.mark.asyncio
+    async def test_summarizes_and_caches(self, python_repo, tmp_path_factory):
+        """Test that each Python file is summarized once, the second summary coming from the cache."""
+        disk_cache = analysis_cache.DiskCache(str(tmp_path_factory.mktemp('cache') / 'cache.db'))
+        try:
+            summary = await python_summary.summarize_range(str(python_repo), disk_cache, 'main...feature')
+
+            assert summary["errors"] == ['broken.py']
+            assert summary["omitted"] == 0
+            assert summary["files"] == [
+                {"path": 'gone.py', "removed": ['old']},
+                {"path": 'reader.py', **python_summary.compare_sources(OLD_MODULE, NEW_MODULE)}
+            ]
+
+            with patch.object(python_summary, 'read_blobs') as read_blobs:
+                assert await python_summary.summarize_range(str(python_repo), disk_cache,
+                                                            'main...feature') == summary
+                read_blobs.assert_called_once()
+                assert read_blobs.call_args.args[1] == []
+        finally:
+            disk_cache.close()
+
+    @pytest.mark.asyncio
+    async def test_large_blobs_are_not_read(self, python_repo, tmp_path_factory, monkeypatch):
+        """Test that the blobs larger than the limit are reported without being read."""
+        monkeypatch.setattr(python_summary, 'MAX_BLOB_BYTES', 200)
+        disk_cache = analysis_cache.DiskCache(str(tmp_path_factory.mktemp('cache') / 'cache.db'))
+        try:
+            with patch.object(python_summary, 'read_blobs', wraps=python_summary.read_blobs) as read_blobs:
+                summary = await python_summary.summarize_range(str(python_repo), disk_cache, 'main...feature')
+
+            assert summary["errors"] == ['broken.py', 'reader.py']
+            assert len(read_blobs.call_args.args[1]) == 2
+        finally:
+            disk_cache.close()
+
+    @pytest.mark.asyncio
+    async def test_only_python_files_within_scope(self, python_repo):
+        """Test that the include pathspecs of the scope do not widen the Python files to the other files."""
+        files = await python_summary.read_python_files(str(python_repo), 'main...feature',
+                                                       [':(top)README.md', ':(top)gone.py'])
+
+        assert [(file.status, file.path) for file in files] == [('D', 'gone.py')]
@@ -0,0 +1,70 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from huggingface_mcp_course.pull_request_reviewer import git_backend, repo_state
+
+# Fixture shared with the git backend tests
+from tests.pull_request_reviewer.git_backend import merged_repo
+
+
+@pytest.fixture(autouse=True)
+def clear_repo_states():
+    """Start every test without repository states."""
+    repo_state._repo_states.clear()
+    yield
+    repo_state._repo_states.clear()
+
+
+class TestRepoState:
+    """Test the per-repository state."""
+
+    @pytest.mark.asyncio
+    async def test_located_once(self, merged_repo):
+        """Test that the subdirectories of a repository share its state."""
+        subdirectory = os.path.join(merged_repo, 'sub')
+        os.mkdir(subdirectory)
+
+        state = await repo_state.get_repo_state(merged_repo)
+
+        assert await repo_state.get_repo_state(subdirectory) is state
+        assert state.common_dir == f'{state.toplevel}/.git'
+
+    @pytest.mark.asyncio
+    async def test_reference_cached_until_updated(self, merged_repo):
+        """Test that a branch is resolved again only once it has moved."""
+        state = await repo_state.get_repo_state(merged_repo)
+        backend = git_backend.get_git_backend()
+
+        with patch.object(backend, 'resolve', wraps=backend.resolve) as resolve:
+            main_sha = await state.resolve('main')
+            assert await state.resolve('main') == main_sha
+            assert resolve.call_count == 1
+
+            subprocess.run(['git', 'update-ref', 'refs/heads/main', 'HEAD'], cwd=merged_repo, check=True)
+            assert await state.resolve('main') != main_sha
+            assert resolve.call_count == 2
+
+            # HEAD follows the current branch
+            head_sha = await state.resolve('HEAD')
+            subprocess.run(['git', 'commit', '-q', '--allow-empty', '-m', 'Empty'], cwd=merged_repo, check=True)
+            assert await state.resolve('HEAD') != head_sha
+
+            # Revision expressions are never cached
+            await state.resolve('HEAD~1')
+            await state.resolve('HEAD~1')
+            assert resolve.call_count == 6
+
+    @pytest.mark.asyncio
+    async def test_merge_base_cached(self, merged_repo):
+        """Test that the merge-base of two commits is computed once."""
+        state = await repo_state.get_repo_state(merged_repo)
+        main_sha, head_sha = await state.resolve('main'), await state.resolve('HEAD')
+        backend = git_backend.get_git_backend()
+
+        with patch.object(backend, 'merge_base', wraps=backend.merge_base) as merge_base:
+            first = await state.merge_base(main_sha, head_sha)
+            assert await state.merge_base(main_sha, head_sha) == first
+            assert merge_base.call_count == 1
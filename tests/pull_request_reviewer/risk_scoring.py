@@ -0,0 +1,62 @@
+from huggingface_mcp_course.pull_request_reviewer import history_index, risk_scoring
+from huggingface_mcp_course.pull_request_reviewer.diff_model import FileChange
+
+
+def make_index(commits: int, files: dict[str, int]) -> dict:
+    """Create a history index with the number of commits touching each file."""
+    index = history_index.new_index()
+    index["commits"] = commits
+    index["files"] = {path: [count, 0] for path, count in files.items()}
+    return index
+
+
+class TestAssess:
+    """Test the risk and impact scoring of change sets."""
+
+    def test_low_impact(self):
+        """Test that a small tested change of a cold file has a low impact and no risks."""
+        files = [FileChange('M', 'src/app.py', additions=4, deletions=2),
+                 FileChange('M', 'tests/test_app.py', additions=6)]
+
+        assessment = risk_scoring.assess(files, make_index(100, {"src/app.py": 1}))
+
+        assert assessment["impact"] == 'Low'
+        assert assessment["risks"] == []
+        assert assessment["factors"]["tests"]["ratio"] == 1.0
+
+    def test_high_impact(self):
+        """Test that a large untested change of hot files touching CI and dependencies has a high impact."""
+        files = [FileChange('M', 'src/core.py', additions=3000, deletions=1500),
+                 FileChange('M', '.github/workflows/ci.yml', additions=10),
+                 FileChange('M', 'requirements.txt', additions=1),
+                 FileChange('M', 'poetry.lock', additions=800)]
+
+        assessment = risk_scoring.assess(files, make_index(100, {"src/core.py": 40}))
+
+        assert assessment["impact"] == 'High'
+        factors = assessment["factors"]
+        assert factors["hotness"]["hot"] == [['src/core.py', 40]]
+        assert factors["infrastructure"]["infrastructure"] == ['.github/workflows/ci.yml']
+        assert factors["infrastructure"]["dependency"] == ['requirements.txt']
+        assert factors["tests"]["score"] == 1.0
+        assert len(assessment["risks"]) == 5
+
+    def test_without_history(self):
+        """Test that an empty history index gives no hotness."""
+        files = [FileChange('A', 'docs/guide.md', additions=20)]
+
+        assessment = risk_scoring.assess(files, history_index.new_index())
+
+        assert assessment["factors"]["hotness"] == {"score": 0.0, "hot": []}
+        assert assessment["factors"]["tests"]["ratio"] is None
+
+    def test_small_history(self):
+        """Test that files are not hot in a young history, nor when a few commits touched them."""
+        files = [FileChange('M', 'src/app.py', additions=5)]
+
+        assert risk_scoring.assess(files, make_index(1, {"src/app.py": 1}))["factors"]["hotness"] == \
+               {"score": 0.0, "hot": []}
+        assert risk_scoring.assess(files, make_index(40, {"src/app.py": 4}))["factors"]["hotness"] == \
+               {"score": 0.0, "hot": []}
+        assert risk_scoring.assess(files, make_index(40, {"src/app.py": 5}))["factors"]["hotness"]["hot"] == \
+               [['src/app.py', 5]]
@@ -1,23 +1,83 @@
 import json
+import os
 import pytest
 import asyncio
+import subprocess
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from unittest.mock import patch, MagicMock
+import tempfile
+from unittest.mock import patch, AsyncMock, MagicMock
 
 # Import your implemented functions
 try:
     from huggingface_mcp_course.pull_request_reviewer.server import (
         mcp,
+        ANALYSIS_CACHE,
         analyze_file_changes,
+        analyze_many,
+        get_diff_page,
+        get_commits,
+        get_file_diff,
         get_pr_templates,
+        get_working_directory,
         suggest_pr_template
     )
 
+    from huggingface_mcp_course.pull_request_reviewer import analysis_cache, commit_log, diff_store, repo_state
+
     IMPORTS_SUCCESSFUL = True
 except ImportError as e:
     IMPORTS_SUCCESSFUL = False
     IMPORT_ERROR = str(e)
 
+# Git commands are executed through the asynchronous runner
+GIT_RUNNER = 'huggingface_mcp_course.pull_request_reviewer.git_runner'
+
+
+@contextmanager
+def mock_git(diff_output: bytes = b'', log_output: str = ''):
+    """
+    Patch the git runner so that the single-pass diff streams diff_output and git log returns log_output
+    :param diff_output: The stdout of the single-pass git diff
+    :param log_output: The stdout of git log
+    :return: The mock of the streamed git commands
+    """
+    @asynccontextmanager
+    async def stream_git(args, cwd):
+        stdout = asyncio.StreamReader()
+        stdout.feed_data(diff_output)
+        stdout.feed_eof()
+        yield MagicMock(stdout=stdout)
+
+    async def run_git(args, cwd, check=False, input=None):
+        if args[0] == "rev-parse":
+            # The repository is located once, then the revisions are resolved
+            stdout = f"{git_dir}\n{git_dir}/.git\n{git_dir}/.git\n" if "--show-toplevel" in args \
+                else {"HEAD^{commit}": "2222222\n"}.get(args[-1], "3333333\n")
+        else:
+            stdout = {"merge-base": "1111111\n", "log": log_output, "diff": ""}[args[0]]
+        return MagicMock(stdout=stdout, stderr="")
+
+    # The on-disk cache is stored in a temporary git directory
+    with tempfile.TemporaryDirectory() as git_dir, \
+            patch(f'{GIT_RUNNER}.stream_git', MagicMock(side_effect=stream_git)) as mock_stream, \
+            patch(f'{GIT_RUNNER}.run_git', AsyncMock(side_effect=run_git)):
+        try:
+            yield mock_stream
+        finally:
+            repo_state._repo_states.clear()
+            diff_store._diff_stores.pop(f'{git_dir}/.git', None)
+            disk_cache = analysis_cache._disk_caches.pop(f'{git_dir}/.git', None)
+            if disk_cache is not None:
+                disk_cache.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_analysis_cache():
+    """Start every test without cached analyses."""
+    if IMPORTS_SUCCESSFUL:
+        ANALYSIS_CACHE.clear()
+
 
 class TestImplementation:
     """Test that the required functions are implemented."""
@@ -38,29 +98,28 @@ class TestAnalyzeFileChanges:
     @pytest.mark.asyncio
     async def test_analyze_with_diff(self):
         """Test analyzing changes with full diff included."""
-        mock_result = MagicMock()
-        mock_result.stdout = "M\tfile1.py\nA\tfile2.py\n"
-        mock_result.stderr = ""
-
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = mock_result
+        diff_output = (b":100644 100644 0000000 1111111 M\0file1.py\0"
+                       b":000000 100644 0000000 2222222 A\0file2.py\0"
+                       b"1\t1\tfile1.py\0"
+                       b"1\t0\tfile2.py\0\0"
+                       b"diff --git a/file1.py b/file1.py\n")
 
+        with mock_git(diff_output):
             result = await analyze_file_changes("main", include_diff=True)
 
             assert isinstance(result, str)
             data = json.loads(result)
             assert data["base_branch"] == "main"
-            assert "files_changed" in data
-            assert "statistics" in data
+            assert data["files"]["path"] == ["file1.py", "file2.py"]
+            assert data["files"]["status"] == ["M", "A"]
+            assert data["statistics"] == {"files": 2, "additions": 2, "deletions": 1}
             assert "commits" in data
             assert "diff" in data
 
     @pytest.mark.asyncio
     async def test_returns_json_string(self):
         """Test that analyze_file_changes returns a JSON string."""
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(stdout="", stderr="")
-
+        with mock_git():
             result = await analyze_file_changes()
 
             assert isinstance(result, str), "Should return a string"
@@ -71,9 +130,7 @@ class TestAnalyzeFileChanges:
     @pytest.mark.asyncio
     async def test_includes_required_fields(self):
         """Test that the result includes expected fields."""
-        with patch('subprocess.run') as mock_run:
-            mock_run.return_value = MagicMock(stdout="M\tfile1.py\n", stderr="")
-
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0"):
             result = await analyze_file_changes()
             data = json.loads(result)
 
@@ -90,18 +147,13 @@ class TestAnalyzeFileChanges:
     @pytest.mark.asyncio
     async def test_output_limiting(self):
         """Test that large diffs are properly truncated."""
-        with patch('subprocess.run') as mock_run:
-            # Create a mock diff with many lines
-            large_diff = "\n".join([f"+ line {i}" for i in range(1000)])
-
-            # Set up mock responses
-            mock_run.side_effect = [
-                MagicMock(stdout="M\tfile1.py\n", stderr=""),  # files changed
-                MagicMock(stdout="1 file changed, 1000 insertions(+)", stderr=""),  # stats
-                MagicMock(stdout=large_diff, stderr=""),  # diff
-                MagicMock(stdout="abc123 Initial commit", stderr="")  # commits
-            ]
+        # Create a mock diff with many lines
+        large_diff = "\n".join([f"+ line {i}" for i in range(1000)])
+        diff_output = (b":100644 100644 0000000 1111111 M\0file1.py\0"  # files changed
+                       b"1000\t0\tfile1.py\0\0"  # stats
+                       + large_diff.encode())  # diff
 
+        with mock_git(diff_output, "abc123 Initial commit"):
             # Test with default limit (500 lines)
             result = await analyze_file_changes(include_diff=True)
             data = json.loads(result)
@@ -121,6 +173,261 @@ class TestAnalyzeFileChanges:
                     assert "truncated" in data["diff"].lower() or "..." in data["diff"], \
                         "Should indicate diff was truncated"
 
+            # The total is reported from the numstat records rather than from the lines read
+            assert data["total_diff_lines"] == 1000
+
+    @pytest.mark.asyncio
+    async def test_repeated_analysis_is_cached(self):
+        """Test that analyzing the same commits twice only runs the diff once."""
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0") as mock_stream:
+            first = json.loads(await analyze_file_changes("main"))
+            second = json.loads(await analyze_file_changes("main"))
+
+            assert first == second
+            assert mock_stream.call_count == 1
+            assert ANALYSIS_CACHE.hits == 1
+
+            # A different diff budget is a different analysis
+            await analyze_file_changes("main", max_diff_lines=10)
+            assert mock_stream.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_concurrent_analyses_are_coalesced(self):
+        """Test that identical concurrent analyses run the diff once."""
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0") as mock_stream:
+            first, second = await asyncio.gather(analyze_file_changes("main"), analyze_file_changes("main"))
+
+            assert first == second
+            assert mock_stream.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_analysis_survives_restart(self):
+        """Test that an analysis is served from disk once the in-memory cache is lost."""
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0", "abc123 Initial commit") as mock_stream:
+            first = json.loads(await analyze_file_changes("main"))
+            ANALYSIS_CACHE.clear()
+            second = json.loads(await analyze_file_changes("main"))
+
+            assert first == second
+            assert mock_stream.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout_is_reported(self):
+        """Test that a git timeout is returned as an error and not cached."""
+        with mock_git() as mock_stream:
+            mock_stream.side_effect = subprocess.TimeoutExpired(["git", "diff"], 120)
+            data = json.loads(await analyze_file_changes())
+
+            assert data["error"].startswith("Git timeout:")
+            assert len(ANALYSIS_CACHE) == 0
+
+    @pytest.mark.asyncio
+    async def test_exclude_is_passed_to_git(self):
+        """Test that excluded globs become pathspecs and are summarized, as a separate analysis."""
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0") as mock_stream:
+            data = json.loads(await analyze_file_changes("main", exclude=["*.lock"]))
+            await analyze_file_changes("main")
+
+            assert mock_stream.call_args_list[0].args[0][-2:] == ["--", ":(top,exclude)*.lock"]
+            assert "--" not in mock_stream.call_args_list[1].args[0]
+            assert data["excluded"] == {"pattern": ["*.lock"], "files": [0], "lines": [0]}
+
+    @pytest.mark.asyncio
+    async def test_streams_partial_results(self):
+        """Test that the files, their statistics and the diff are notified before the result, also when cached."""
+        ctx = MagicMock()
+        ctx.session.check_client_capability.return_value = False
+        ctx.report_progress = AsyncMock()
+        diff_output = (b":100644 100644 0000000 1111111 M\0file1.py\0"
+                       b"1\t1\tfile1.py\0\0"
+                       b"diff --git a/file1.py b/file1.py\n")
+
+        with mock_git(diff_output):
+            for _ in range(2):
+                ctx.report_progress.reset_mock()
+                data = json.loads(await analyze_file_changes("main", ctx=ctx))
+
+                payloads = [json.loads(call.args[2]) for call in ctx.report_progress.await_args_list]
+                assert [payload["stage"] for payload in payloads] == ["files", "statistics", "diff"]
+                assert payloads[0]["files"]["path"] == data["files"]["path"]
+                assert payloads[1]["statistics"] == data["statistics"]
+                assert payloads[2]["diff"] == data["diff"]
+
+    @pytest.mark.asyncio
+    async def test_streams_diff_before_commits(self):
+        """Test that the pages of the diff are notified as soon as it is packed, before the commit log is read."""
+        ctx = MagicMock()
+        ctx.session.check_client_capability.return_value = False
+        ctx.report_progress = AsyncMock()
+        diff_output = (b":100644 100644 0000000 1111111 M\0file1.py\0"
+                       b"1\t1\tfile1.py\0\0"
+                       b"diff --git a/file1.py b/file1.py\n")
+        read_page = commit_log.read_page
+        stages = []
+
+        async def read_page_after_diff(*args, **kwargs):
+            # The commit log is only read once the diff was notified
+            while not ctx.report_progress.await_count or \
+                    json.loads(ctx.report_progress.await_args.args[2])["stage"] != "diff":
+                await asyncio.sleep(0)
+            stages.append("commits")
+            return await read_page(*args, **kwargs)
+
+        with mock_git(diff_output), patch.object(commit_log, 'read_page', read_page_after_diff):
+            data = json.loads(await asyncio.wait_for(analyze_file_changes("main", ctx=ctx), 5))
+
+            assert stages == ["commits"]
+            assert data["diff"] == "diff --git a/file1.py b/file1.py\n"
+            assert ctx.report_progress.await_count == 3
+
+
+@pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
+class TestAnalyzeMany:
+    """Test the analyze_many tool."""
+
+    @pytest.mark.asyncio
+    async def test_reports_each_repository(self):
+        """Test that every repository is analyzed and reported, including failures."""
+        ctx = MagicMock()
+        ctx.session.check_client_capability.return_value = False
+        ctx.report_progress = AsyncMock()
+
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0", "abc123 Initial commit"):
+            results = json.loads(await analyze_many([{"path": "."}, {"path": ".", "base_branch": "develop"}], ctx))
+
+            assert sorted(result["base_branch"] for result in results) == ["develop", "main"]
+            assert all(result["files"]["path"] == ["file1.py"] for result in results)
+            assert ctx.report_progress.await_count == 2
+            assert ctx.report_progress.await_args.args[:2] == (2, 2)
+
+    @pytest.mark.asyncio
+    async def test_isolates_failures(self):
+        """Test that a repository that cannot be analyzed does not fail the others."""
+        with mock_git(b":100644 100644 0000000 1111111 M\0file1.py\0"):
+            with patch(f'{GIT_RUNNER}.run_git', AsyncMock(side_effect=subprocess.CalledProcessError(
+                    128, ["git"], stderr="fatal: not a git repository"))):
+                results = json.loads(await analyze_many([{"path": "/not/a/repository"}]))
+
+        assert results == [{"path": "/not/a/repository", "base_branch": "main",
+                            "error": "Git error: fatal: not a git repository"}]
+
+
+@pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
+class TestWorkingDirectory:
+    """Test the resolution of the working directory from the roots of the client."""
+
+    @pytest.mark.asyncio
+    async def test_uses_first_file_root(self):
+        """Test that the first file root is used as working directory."""
+        ctx = MagicMock()
+        ctx.session.check_client_capability.return_value = True
+        ctx.session.list_roots = AsyncMock(return_value=MagicMock(roots=[
+            MagicMock(uri="https://example.com/repo"), MagicMock(uri="file:///home/user/my%20repo")
+        ]))
+
+        assert await get_working_directory(ctx) == "/home/user/my repo"
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_current_directory(self):
+        """Test that the current directory is used when the client does not support roots."""
+        ctx = MagicMock()
+        ctx.session.check_client_capability.return_value = False
+
+        assert await get_working_directory(ctx) == os.getcwd()
+        assert await get_working_directory() == os.getcwd()
+
+
+@pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
+class TestGetDiffPage:
+    """Test the get_diff_page tool."""
+
+    @pytest.mark.asyncio
+    async def test_pages_through_truncated_diff(self):
+        """Test that the pages of a truncated diff add up to the whole patch."""
+        patch_text = b"diff --git a/file1.py b/file1.py\n--- a/file1.py\n+++ b/file1.py\n@@ -0,0 +1,1000 @@\n" + \
+                     b"".join(b"+ line %d\n" % i for i in range(1000))
+        diff_output = b":100644 100644 0000000 1111111 M\0file1.py\0" b"1000\t0\tfile1.py\0\0" + patch_text
+
+        with mock_git(diff_output) as mock_stream:
+            analysis = json.loads(await analyze_file_changes(max_diff_lines=50))
+            assert analysis["truncated"] is True
+
+            pages = []
+            cursor = analysis["cursor"]
+            while cursor is not None:
+                page = json.loads(await get_diff_page(cursor, max_bytes=4096))
+                assert page["files"] == ["file1.py"]
+                pages.append(page["diff"])
+                cursor = page["next_cursor"]
+
+            assert "".join(pages) == patch_text.decode()
+            assert all(page.endswith("\n") for page in pages)
+            assert mock_stream.call_count == 1
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self):
+        """Test that malformed and unknown cursors are reported as errors."""
+        with mock_git():
+            assert json.loads(await get_diff_page("not a cursor"))["error"]["code"] == 400
+            assert json.loads(await get_diff_page("1111111..2222222:0"))["error"]["code"] == 404
+
+
+@pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
+class TestGetFileDiff:
+    """Test the get_file_diff tool."""
+
+    @pytest.mark.asyncio
+    async def test_returns_single_file(self):
+        """Test that the diff of one file is served from the latest analysis."""
+        diff_output = (b":100644 100644 0000000 1111111 M\0file1.py\0"
+                       b":000000 100644 0000000 2222222 A\0file2.py\0"
+                       b"1\t1\tfile1.py\0"
+                       b"1\t0\tfile2.py\0\0"
+                       b"diff --git a/file1.py b/file1.py\n--- a/file1.py\n+++ b/file1.py\n@@ -1 +1 @@\n-a\n+b\n"
+                       b"diff --git a/file2.py b/file2.py\nnew file mode 100644\n--- /dev/null\n+++ b/file2.py\n"
+                       b"@@ -0,0 +1 @@\n+c\n")
+
+        with mock_git(diff_output) as mock_stream:
+            await analyze_file_changes()
+            data = json.loads(await get_file_diff("file2.py"))
+
+            assert data["diff"].startswith("diff --git a/file2.py b/file2.py\n")
+            assert data["diff"].endswith("+c\n")
+            assert data["hunks"] == 1
+            assert data["next_cursor"] is None
+            assert json.loads(await get_file_diff("file3.py"))["error"]["code"] == 404
+            # The diff was not truncated, so its patch was materialized once, on demand
+            assert mock_stream.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_requires_analysis(self):
+        """Test that an error is returned before any analysis."""
+        with mock_git():
+            assert json.loads(await get_file_diff("file1.py"))["error"]["code"] == 404
+
+
+@pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
+class TestGetCommits:
+    """Test the get_commits tool."""
+
+    @pytest.mark.asyncio
+    async def test_last_page(self):
+        """Test that a page of a short log has no next cursor."""
+        with mock_git():
+            data = json.loads(await analyze_file_changes())
+            assert data["commits"]["sha"] == []
+            assert data["commits_cursor"] is None
+
+            page = json.loads(await get_commits("1111111..2222222:0"))
+            assert page["commits"]["subject"] == []
+            assert page["next_cursor"] is None
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self):
+        """Test that a malformed cursor is reported as an error."""
+        with mock_git():
+            assert json.loads(await get_commits("not a cursor"))["error"]["code"] == 400
+
 
 @pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
 class TestGetPRTemplates:
@@ -214,6 +521,21 @@ class TestSuggestTemplate:
             # Starter code - just verify it's structured correctly
             assert isinstance(suggestion, dict), "Should return structured error for starter code"
 
+    @pytest.mark.asyncio
+    async def test_classifies_changes(self):
+        """Test that the type of change is classified from the changed files when it is not given."""
+        diff_output = (b":000000 100644 0000000 1111111 A\0tests/test_app.py\0"
+                       b":100644 100644 1111111 2222222 M\0docs/usage.md\0"
+                       b"40\t0\ttests/test_app.py\0"
+                       b"1\t0\tdocs/usage.md\0\0")
+
+        with mock_git(diff_output):
+            suggestion = json.loads(await suggest_pr_template())
+
+        assert suggestion["recommended_template"]["type"] == "test"
+        assert [change_type for change_type, _ in suggestion["change_types"][:2]] == ["test", "docs"]
+
+
 @pytest.mark.skipif(not IMPORTS_SUCCESSFUL, reason="Imports failed")
 class TestToolRegistration:
     """Test that tools are properly registered with FastMCP."""
@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from huggingface_mcp_course.utils import asyncutils
+
+
+class TestSingleFlight:
+    """Test the coalescing of concurrent calls."""
+
+    @pytest.mark.asyncio
+    async def test_shares_concurrent_calls(self):
+        """Test that concurrent calls with the same arguments run once, and that ignored arguments do not count."""
+        calls = []
+
+        @asyncutils.single_flight(ignore=('tag',))
+        async def work(value: int, scale: int = 1, tag: str = ''):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * scale
+
+        results = await asyncio.gather(work(1), work(1, scale=1, tag='b'), work(2))
+
+        assert results == [1, 1, 2]
+        assert sorted(calls) == [1, 2]
+        assert work.in_flight == {}
+        # A call made once the first one completed runs again
+        assert await work(1) == 1
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_shares_exceptions(self):
+        """Test that every caller receives the exception of the shared call."""
+        @asyncutils.single_flight()
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError('failed')
+
+        results = await asyncio.gather(fail(), fail(), return_exceptions=True)
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_cancellation(self):
+        """Test that a cancelled caller does not cancel the others, and that an abandoned call is cancelled."""
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        @asyncutils.single_flight()
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return 'done'
+
+        first = asyncio.create_task(work())
+        second = asyncio.create_task(work())
+        await started.wait()
+        first.cancel()
+        assert await second == 'done'
+        assert first.cancelled()
+
+        abandoned = asyncio.create_task(work())
+        await asyncio.sleep(0.01)
+        abandoned.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await abandoned
+        assert cancelled.is_set()
+        assert work.in_flight == {}
+
+    @pytest.mark.asyncio
+    async def test_fan_out(self):
+        """Test that the grouped arguments of the callers still waiting receive the calls, late ones replaying them."""
+        class Sender:
+            def __init__(self):
+                self.sent = []
+
+            async def send(self, value: int):
+                self.sent.append(value)
+
+        step = asyncio.Event()
+
+        @asyncutils.single_flight(fan_out=('sender',))
+        async def work(sender=None):
+            await sender.send(1)
+            await step.wait()
+            step.clear()
+            await sender.send(2)
+            await step.wait()
+            await sender.send(3)
+            return 'done'
+
+        first_sender, second_sender = Sender(), Sender()
+        first = asyncio.create_task(work(sender=first_sender))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(work(sender=second_sender))
+        third = asyncio.create_task(work())
+        await asyncio.sleep(0.01)
+        assert second_sender.sent == [1]
+        step.set()
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        step.set()
+
+        assert await second == 'done'
+        assert await third == 'done'
+        assert first.cancelled()
+        assert first_sender.sent == [1, 2]
+        assert second_sender.sent == [1, 2, 3]
@@ -0,0 +1,112 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import pytest
+
+from huggingface_mcp_course.utils import cacheutils
+
+
+class TestCached:
+    """Test the caching of the results of functions."""
+
+    def test_lru_and_counters(self):
+        """Test that results are cached by arguments within the size bound, and that hits and misses are counted."""
+        calls = []
+
+        @cacheutils.cached(max_entries=2)
+        def square(value: int, offset: int = 0) -> int:
+            calls.append(value)
+            return value * value + offset
+
+        assert [square(1), square(1, offset=0), square(2), square(1), square(3), square(2)] == [1, 1, 4, 1, 9, 4]
+        # 2 was the least recently used when 3 was added
+        assert calls == [1, 2, 3, 2]
+        assert square.cache_info() == {"hits": 2, "misses": 4, "entries": 2}
+
+        square.cache_clear()
+        assert square.cache_info() == {"hits": 0, "misses": 0, "entries": 0}
+
+    def test_concurrent_threads(self, monkeypatch):
+        """Test that a synchronous function can be called from several threads while its results are evicted."""
+        monotonic = time.monotonic
+
+        def switching_monotonic() -> float:
+            # Let the other threads run between the lookup of an entry and its update
+            time.sleep(0.0001)
+            return monotonic()
+
+        monkeypatch.setattr(cacheutils.time, 'monotonic', switching_monotonic)
+
+        @cacheutils.cached(ttl=60, max_entries=2)
+        def double(value: int) -> int:
+            return value * 2
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(double, [value % 4 for value in range(2000)]))
+
+        assert results == [value % 4 * 2 for value in range(2000)]
+        assert double.cache_info()["entries"] == 2
+
+    def test_ttl(self, monkeypatch):
+        """Test that expired results are computed again."""
+        now = [100.0]
+        monkeypatch.setattr(cacheutils.time, 'monotonic', lambda: now[0])
+        calls = []
+
+        @cacheutils.cached(ttl=10)
+        def value() -> int:
+            calls.append(now[0])
+            return len(calls)
+
+        assert value() == 1
+        now[0] = 109.0
+        assert value() == 1
+        now[0] = 110.0
+        assert value() == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidation_keys(self, tmp_path):
+        """Test that results are computed again when a file or a version counter changes."""
+        events = tmp_path / 'events.json'
+        counter = cacheutils.VersionCounter()
+
+        @cacheutils.cached(invalidation=cacheutils.file_version(str(events)), ignore=('ctx',))
+        async def read(ctx: object = None) -> str:
+            return events.read_text() if events.exists() else ''
+
+        @cacheutils.cached(invalidation=counter)
+        async def version() -> int:
+            return counter.version
+
+        assert await read() == ''
+        events.write_text('[1]')
+        assert await read(ctx=object()) == '[1]'
+        events.write_text('[1, 2]')
+        assert await read() == '[1, 2]'
+        assert read.cache_info()["misses"] == 3
+
+        assert await version() == 0
+        counter.bump()
+        assert await version() == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_are_not_cached(self):
+        """Test that the results rejected by the cacheability predicate are computed again."""
+        responses = ['{"error": "Events file not found"}', '[]', '{"error": "stale"}']
+
+        @cacheutils.cached(cacheable=cacheutils.without_error)
+        async def read_events() -> str:
+            return responses.pop(0)
+
+        assert await read_events() == '{"error": "Events file not found"}'
+        assert await read_events() == '[]'
+        assert await read_events() == '[]'
+        assert read_events.cache_info() == {"hits": 1, "misses": 2, "entries": 1}
+
+    def test_directory_entries(self, tmp_path):
+        """Test that adding a file to a directory changes its version."""
+        version = cacheutils.file_version(str(tmp_path))
+        before = version()
+        (tmp_path / 'bug.md').write_text('# Bug')
+
+        assert version() != before